@@ -5,27 +5,147 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 from datetime import timedelta
+from urllib.parse import urlsplit
 
 db = SQLAlchemy()
 jwt = JWTManager()
 
 
 def create_app():
+    from app.database import database_uri, engine_options, init_sqlite
+
     load_dotenv()
 
     app = Flask(__name__)
 
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri(os.getenv(
         "DATABASE_URL", "sqlite:///app.db"
-    )
+    ))
+
+    # --- database tier ---
+    # Postgres etc.: connections per gunicorn worker = pool size + overflow
+    app.config["DB_POOL_SIZE"] = int(os.getenv("DB_POOL_SIZE", 5))
+    app.config["DB_MAX_OVERFLOW"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    app.config["DB_POOL_TIMEOUT"] = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    app.config["DB_POOL_RECYCLE"] = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    app.config["DB_POOL_PRE_PING"] = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+
+    # SQLite
+    app.config["SQLITE_JOURNAL_MODE"] = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    app.config["SQLITE_SYNCHRONOUS"] = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 10000))
+    app.config["SQLITE_CACHE_SIZE_KB"] = int(os.getenv("SQLITE_CACHE_SIZE_KB", 20000))
     app.config["JWT_SECRET_KEY"] = os.getenv(
         "JWT_SECRET_KEY", "dev-key"
     )
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=8)
 
+    # --- OSRM response cache ---
+    app.config["OSRM_CACHE_PATH"] = os.getenv(
+        "OSRM_CACHE_PATH", os.path.join(app.instance_path, "osrm_cache.db")
+    )
+    app.config["OSRM_CACHE_TTL"] = int(os.getenv("OSRM_CACHE_TTL", 7 * 24 * 3600))
+    app.config["OSRM_CACHE_MAX_ENTRIES"] = int(
+        os.getenv("OSRM_CACHE_MAX_ENTRIES", 10000)
+    )
+    app.config["OSRM_CACHE_PRECISION"] = int(os.getenv("OSRM_CACHE_PRECISION", 5))
+
+    # public OSRM rejects more coordinates than this per request; larger
+    # tables are fetched in tiles, longer routes in chunks
+    app.config["OSRM_MAX_TABLE_COORDS"] = int(os.getenv("OSRM_MAX_TABLE_COORDS", 100))
+    app.config["OSRM_MAX_ROUTE_COORDS"] = int(os.getenv("OSRM_MAX_ROUTE_COORDS", 100))
+    app.config["OSRM_TILE_CONCURRENCY"] = int(os.getenv("OSRM_TILE_CONCURRENCY", 4))
+
+    # --- Google traffic ETA ---
+    # legs are cached until their departure bucket ends; each Directions
+    # request carries at most GOOGLE_MAX_WAYPOINTS intermediate points and
+    # counts against GOOGLE_DAILY_QUOTA (0 = unlimited)
+    app.config["GOOGLE_ETA_BUCKET_SECONDS"] = max(1, int(os.getenv("GOOGLE_ETA_BUCKET_SECONDS", 900)))
+    app.config["GOOGLE_MAX_WAYPOINTS"] = max(1, int(os.getenv("GOOGLE_MAX_WAYPOINTS", 25)))
+    app.config["GOOGLE_DAILY_QUOTA"] = int(os.getenv("GOOGLE_DAILY_QUOTA", 0))
+    app.config["GOOGLE_CONCURRENCY"] = max(1, int(os.getenv("GOOGLE_CONCURRENCY", 4)))
+
+    # --- routing backend: "osrm" (HTTP) or "offline" (in-process graph) ---
+    app.config["ROUTING_BACKEND"] = os.getenv("ROUTING_BACKEND", "osrm").lower()
+    app.config["OFFLINE_GRAPH_PATH"] = os.getenv(
+        "OFFLINE_GRAPH_PATH",
+        os.path.join(os.path.dirname(__file__), "data", "riga_sample_edges.csv"),
+    )
+
+    # --- outbound HTTP (OSRM, Google) ---
+    app.config["HTTP_POOL_SIZE"] = int(os.getenv("HTTP_POOL_SIZE", 10))
+    app.config["HTTP_RETRIES"] = int(os.getenv("HTTP_RETRIES", 2))
+    app.config["HTTP_BACKOFF"] = float(os.getenv("HTTP_BACKOFF", 0.3))
+    app.config["HTTP_BACKOFF_JITTER"] = float(os.getenv("HTTP_BACKOFF_JITTER", 0.2))
+    app.config["HTTP_CONNECT_TIMEOUT"] = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+    app.config["HTTP_DEFAULT_TIMEOUT"] = float(os.getenv("HTTP_DEFAULT_TIMEOUT", 12))
+    # keyed on the hosts routes_api calls (same URLs and defaults), so a
+    # self-hosted OSRM or a Google proxy keeps its timeout
+    osrm_url = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
+    google_url = os.getenv(
+        "GOOGLE_DIRECTIONS_URL", "https://maps.googleapis.com/maps/api/directions/json"
+    )
+    app.config["HTTP_HOST_TIMEOUTS"] = {
+        urlsplit(osrm_url).hostname: float(os.getenv("OSRM_TIMEOUT", 12)),
+        urlsplit(google_url).hostname: float(os.getenv("GOOGLE_TIMEOUT", 12)),
+    }
+
+    app.config["HTTP_BREAKER_THRESHOLD"] = int(os.getenv("HTTP_BREAKER_THRESHOLD", 5))
+    app.config["HTTP_BREAKER_RESET"] = float(os.getenv("HTTP_BREAKER_RESET", 30))
+
+    # --- degraded mode: haversine estimate while OSRM is unavailable ---
+    app.config["DEGRADED_MODE"] = os.getenv("DEGRADED_MODE", "1").lower() in ("1", "true", "yes")
+    app.config["ESTIMATE_DETOUR_FACTOR"] = float(os.getenv("ESTIMATE_DETOUR_FACTOR", 1.3))
+    app.config["ESTIMATE_SPEED_KMH"] = float(os.getenv("ESTIMATE_SPEED_KMH", 35))
+
+    # --- map geometry: stored road paths, simplified per zoom level ---
+    app.config["GEOMETRY_ZOOM_LEVELS"] = [
+        int(z) for z in os.getenv("GEOMETRY_ZOOM_LEVELS", "10,12,14,16").split(",") if z.strip()
+    ]
+    app.config["GEOMETRY_TOLERANCE_PX"] = float(os.getenv("GEOMETRY_TOLERANCE_PX", 1.0))
+    # seconds a browser may reuse a response without revalidating (ETag);
+    # 0 because a re-optimized route keeps its geometry URL
+    app.config["GEOMETRY_MAX_AGE"] = int(os.getenv("GEOMETRY_MAX_AGE", 0))
+
+    # --- optimizer ---
+    app.config["OPTIMIZE_MAX_WORKERS"] = int(os.getenv("OPTIMIZE_MAX_WORKERS", 4))
+    app.config["OPTIMIZE_TIME_LIMIT"] = float(os.getenv("OPTIMIZE_TIME_LIMIT", 10))
+    # polish budget when a single stop is added to / removed from a route
+    app.config["INCREMENTAL_TIME_LIMIT"] = float(os.getenv("INCREMENTAL_TIME_LIMIT", 1))
+
+    app.config["BATCH_MAX_ROUTES"] = int(os.getenv("BATCH_MAX_ROUTES", 200))
+    app.config["BATCH_PROCESSES"] = int(os.getenv("BATCH_PROCESSES", os.cpu_count() or 1))
+
+    # --- bulk import / export ---
+    app.config["IMPORT_BATCH_SIZE"] = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+    app.config["IMPORT_MAX_ERRORS"] = int(os.getenv("IMPORT_MAX_ERRORS", 100))
+    app.config["EXPORT_BATCH_SIZE"] = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+    # --- background jobs ---
+    app.config["JOB_WORKERS"] = int(os.getenv("JOB_WORKERS", 2))
+    app.config["JOB_STALE_SECONDS"] = int(os.getenv("JOB_STALE_SECONDS", 600))
+
+    # --- instrumentation: /metrics and the Server-Timing header ---
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+    app.config["SERVER_TIMING"] = os.getenv("SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+    # "off", "log" or "raise" when a view exceeds its query_budget or repeats
+    # one statement more than QUERY_REPEAT_LIMIT times (N+1)
+    app.config["QUERY_BUDGET_MODE"] = os.getenv("QUERY_BUDGET_MODE", "off").lower()
+    app.config["QUERY_REPEAT_LIMIT"] = int(os.getenv("QUERY_REPEAT_LIMIT", 10))
+
     db.init_app(app)
+    init_sqlite(app, db)
     jwt.init_app(app)
 
+    from app.osrm_cache import osrm_cache
+    from app.http_client import http_client
+    from app.offline_router import offline_router
+
+    osrm_cache.init_app(app)
+    http_client.init_app(app)
+    offline_router.init_app(app)
+
     # --- CORS configuration ---
     frontend_url = os.getenv("FRONTEND_URL")
 
@@ -47,8 +167,20 @@ def create_app():
 
     from app.auth import auth_bp
     from app.routes_api import routes_bp
+    from app.bulk_api import bulk_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(routes_bp, url_prefix="/api/routes")
+    app.register_blueprint(bulk_bp, url_prefix="/api/routes")
+
+    from app.jobs import job_runner
+
+    job_runner.init_app(app)
+
+    # last, so per-process startup work in earlier before_request hooks
+    # (job recovery) is not timed as part of the first request
+    from app.instrumentation import instrumentation
+
+    instrumentation.init_app(app)
 
     return app
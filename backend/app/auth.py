@@ -2,10 +2,12 @@ from flask import Blueprint, request
 from flask_jwt_extended import create_access_token
 from . import db
 from .models import User
+from .instrumentation import query_budget
 
 auth_bp = Blueprint("auth", __name__)
 
 @auth_bp.post("/register")
+@query_budget(3)
 def register():
     payload = request.get_json() or {}
 
@@ -31,6 +33,7 @@ def register():
 
 
 @auth_bp.post("/login")
+@query_budget(1)
 def login():
     payload = request.get_json() or {}
 
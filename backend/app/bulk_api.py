@@ -0,0 +1,371 @@
+"""
+Streaming bulk import / export of routes and their clients (stops).
+
+Imports read the request body incrementally (NDJSON, one object per line,
+or CSV with a header row) and insert in transactions of IMPORT_BATCH_SIZE
+rows; invalid rows are reported by line and skipped. Exports stream rows
+from a server-side cursor. Neither holds more than one batch in memory,
+however many stops a user has.
+
+Row fields, also the export columns:
+    route_id, route, client_id, name, lat, lon, time_window_from,
+    time_window_to, demand
+"""
+import csv
+import io
+import json
+import math
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy import insert
+
+from . import db
+from .instrumentation import query_budget
+from .models import Client, Route
+from .vrp import parse_clock
+
+bulk_bp = Blueprint("bulk", __name__)
+
+EXPORT_COLUMNS = (
+    "route_id",
+    "route",
+    "client_id",
+    "name",
+    "lat",
+    "lon",
+    "time_window_from",
+    "time_window_to",
+    "demand",
+)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+READ_BUFFER_SIZE = 64 * 1024
+
+
+class RowError(ValueError):
+    """A single import row is invalid; the import continues."""
+
+
+class HeaderError(ValueError):
+    """The CSV header lacks required columns; nothing is imported."""
+
+
+def _format(default="ndjson"):
+    fmt = (request.args.get("format") or "").lower()
+    if not fmt:
+        fmt = "csv" if request.mimetype in ("text/csv", "application/csv") else default
+    return fmt if fmt in FORMATS else None
+
+
+def _body():
+    """
+    The request body, buffered: werkzeug's input stream is unbuffered, and
+    reading it line by line would go through it a byte at a time.
+    """
+    return io.BufferedReader(request.stream, buffer_size=READ_BUFFER_SIZE)
+
+
+def _read_rows(fmt, required):
+    """Yields (line number, dict or RowError) from the request body."""
+    body = _body()
+    if fmt == "csv":
+        text = io.TextIOWrapper(body, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        missing = [c for c in required if c not in (reader.fieldnames or [])]
+        if missing:
+            raise HeaderError(f"CSV header lacks: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line, raw in enumerate(body, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            yield line, RowError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line, RowError("expected a JSON object")
+            continue
+        yield line, row
+
+
+def _value(row, key):
+    """Field value with CSV's empty strings as None."""
+    v = row.get(key)
+    if isinstance(v, str):
+        v = v.strip()
+        if not v:
+            return None
+    return v
+
+
+def _client_values(row, route_id):
+    """Validated clients row (as in create_route) or RowError."""
+    lat, lon = _value(row, "lat"), _value(row, "lon")
+    if lat is None or lon is None:
+        raise RowError("lat/lon required")
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise RowError("lat/lon must be numbers")
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        raise RowError("lat/lon out of range")
+
+    demand = _value(row, "demand")
+    if demand is not None:
+        try:
+            demand = float(demand)
+        except (TypeError, ValueError):
+            raise RowError("demand must be a number")
+        if not math.isfinite(demand):
+            raise RowError("demand must be a finite number")
+
+    windows = {}
+    for key in ("time_window_from", "time_window_to"):
+        v = _value(row, key)
+        if v is not None and parse_clock(v) is None:
+            raise RowError(f"{key} must be HH:MM")
+        windows[key] = str(v) if v is not None else None
+
+    name = _value(row, "name")
+    return {
+        "name": str(name)[:255] if name is not None else "Client",
+        "lat": lat,
+        "lon": lon,
+        "demand": demand,
+        "route_id": route_id,
+        **windows,
+    }
+
+
+class _Importer:
+    """Collects valid rows into batched INSERTs and invalid ones into errors."""
+
+    def __init__(self):
+        self.batch_size = max(1, int(current_app.config.get("IMPORT_BATCH_SIZE", 1000)))
+        self.max_errors = int(current_app.config.get("IMPORT_MAX_ERRORS", 100))
+        self.rows = []
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add(self, values):
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def flush(self):
+        if self.rows:
+            db.session.execute(insert(Client), self.rows)
+        db.session.commit()
+        self.imported += len(self.rows)
+        self.rows = []
+
+    def result(self, **extra):
+        return {
+            **extra,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _run_import(rows, importer, resolve_route):
+    """
+    Feeds `rows` through the importer; resolve_route(row) returns the
+    route id for a row or raises RowError. Returns (body, status).
+    """
+    try:
+        for line, row in rows:
+            if isinstance(row, RowError):
+                importer.error(line, str(row))
+                continue
+            try:
+                route_id = resolve_route(row)
+                if route_id is not None:
+                    importer.add(_client_values(row, route_id))
+            except RowError as e:
+                importer.error(line, str(e))
+        importer.flush()
+    except HeaderError as e:
+        db.session.rollback()
+        return {"error": str(e)}, 400
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        importer.error(None, f"unreadable input: {e}")
+        return importer.result(), 400
+    except Exception as e:
+        db.session.rollback()
+        return {**importer.result(), "error": f"Import failed: {str(e)}"}, 500
+
+    return importer.result(), 200
+
+
+@bulk_bp.post("/import")
+@query_budget(None)
+@jwt_required()
+def import_routes():
+    """
+    Creates routes with their clients. Rows with the same `route` name go
+    to one new route; a row without lat/lon/name only creates its route.
+    """
+    uid = get_jwt_identity()
+    fmt = _format()
+    if fmt is None:
+        return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400
+
+    importer = _Importer()
+    routes = {}
+
+    def resolve_route(row):
+        name = _value(row, "route")
+        if name is None:
+            raise RowError("route name required")
+        name = str(name)[:255]
+
+        only_route = all(_value(row, k) is None for k in ("name", "lat", "lon"))
+        if not only_route:
+            # an invalid client row must not leave its route behind
+            _client_values(row, None)
+
+        route_id = routes.get(name)
+        if route_id is None:
+            r = Route(name=name, parameters={}, user_id=uid)
+            db.session.add(r)
+            db.session.flush()
+            route_id = routes[name] = r.id
+
+        return None if only_route else route_id
+
+    body, status = _run_import(_read_rows(fmt, ("route", "lat", "lon")), importer, resolve_route)
+    if status < 500:
+        body["routes_created"] = len(routes)
+    return body, status
+
+
+@bulk_bp.post("/<int:route_id>/clients/import")
+@query_budget(None)
+@jwt_required()
+def import_clients(route_id):
+    """Appends clients to one route; `route`/`route_id` fields are ignored."""
+    uid = get_jwt_identity()
+    r = Route.query.filter_by(id=route_id, user_id=uid).first()
+    if not r:
+        return {"error": "route not found"}, 404
+
+    if getattr(r, "is_deleted", False):
+        return {"error": "route is archived"}, 400
+
+    fmt = _format()
+    if fmt is None:
+        return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400
+
+    return _run_import(_read_rows(fmt, ("lat", "lon")), _Importer(), lambda row: route_id)
+
+
+def _export_query(uid):
+    return (
+        db.session.query(
+            Route.id,
+            Route.name,
+            Client.id,
+            Client.name,
+            Client.lat,
+            Client.lon,
+            Client.time_window_from,
+            Client.time_window_to,
+            Client.demand,
+        )
+        .select_from(Route)
+        .outerjoin(Client, Client.route_id == Route.id)
+        .filter(Route.user_id == uid)
+        .order_by(Route.id, Client.id)
+    )
+
+
+def _stream(query, fmt, filename):
+    """
+    Response streaming `query` rows in chunks of EXPORT_BATCH_SIZE. The
+    query is executed here, inside the view, so the view's query_budget
+    counts it; the generator only fetches rows from the open cursor.
+    """
+    batch = max(1, int(current_app.config.get("EXPORT_BATCH_SIZE", 1000)))
+    rows = db.session.execute(query.statement, execution_options={"yield_per": batch})
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf) if fmt == "csv" else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+
+        n = 0
+        for row in rows:
+            if writer:
+                writer.writerow(["" if v is None else v for v in row])
+            else:
+                buf.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))))
+                buf.write("\n")
+            n += 1
+            if n % batch == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    mimetype, ext = FORMATS[fmt]
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{ext}"'},
+    )
+
+
+@bulk_bp.get("/export")
+@query_budget(1)
+@jwt_required()
+def export_routes():
+    """
+    Query args:
+      format=ndjson|csv    default ndjson
+      include_deleted=1    also export archived routes
+    One row per client; routes without clients get one row without them.
+    """
+    uid = get_jwt_identity()
+    fmt = _format()
+    if fmt is None:
+        return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400
+
+    q = _export_query(uid)
+    if request.args.get("include_deleted", "0") != "1":
+        q = q.filter(Route.is_deleted == False)  # noqa: E712
+
+    return _stream(q, fmt, "routes")
+
+
+@bulk_bp.get("/<int:route_id>/clients/export")
+@query_budget(2)
+@jwt_required()
+def export_clients(route_id):
+    uid = get_jwt_identity()
+    r = Route.query.filter_by(id=route_id, user_id=uid).first()
+    if not r:
+        return {"error": "route not found"}, 404
+
+    fmt = _format()
+    if fmt is None:
+        return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400
+
+    return _stream(_export_query(uid).filter(Route.id == route_id), fmt, f"route-{route_id}")
@@ -0,0 +1,61 @@
+"""
+Engine setup for SQLite (single host) and Postgres (multi-worker) deployments.
+"""
+from sqlalchemy import event
+
+
+def database_uri(uri):
+    """Accepts the postgres:// scheme Heroku-style providers hand out."""
+    if uri.startswith("postgres://"):
+        return "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def is_sqlite(uri):
+    return uri.startswith("sqlite")
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database. Server databases
+    get a sized pool per worker process with pre-ping and recycling, so
+    connections dropped by the server or a proxy are replaced instead of
+    failing a request; SQLite keeps SQLAlchemy's defaults.
+    """
+    if is_sqlite(config["SQLALCHEMY_DATABASE_URI"]):
+        return {}
+
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+
+
+def init_sqlite(app, db):
+    """
+    Sets the SQLite pragmas on every new connection: WAL lets readers run
+    while one worker writes, synchronous=NORMAL is durable in WAL mode
+    without an fsync per commit, and busy_timeout makes a writer wait for
+    the lock instead of failing with "database is locked".
+    """
+    if not is_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        return
+
+    pragmas = [
+        ("journal_mode", app.config["SQLITE_JOURNAL_MODE"]),
+        ("synchronous", app.config["SQLITE_SYNCHRONOUS"]),
+        ("busy_timeout", int(app.config["SQLITE_BUSY_TIMEOUT_MS"])),
+        ("cache_size", int(app.config["SQLITE_CACHE_SIZE_KB"]) * -1),
+    ]
+
+    def on_connect(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, "connect", on_connect)
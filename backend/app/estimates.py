@@ -0,0 +1,47 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def _radians(points):
+    coords = np.radians(np.array([[p["lat"], p["lng"]] for p in points], dtype=np.float64))
+    return coords[:, 0], coords[:, 1]
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    """Great-circle meters between broadcastable arrays of radians."""
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine_matrix(points):
+    """
+    points: list of {"lat":..,"lng":..}
+    Returns: NxN ndarray of great-circle distances in meters.
+    """
+    lat, lng = _radians(points)
+    return _haversine(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+
+
+def estimate_matrices(points, detour_factor=1.3, speed_kmh=35.0):
+    """
+    Road estimate used while the routing upstream is unavailable:
+    great-circle distance x detour factor at a constant speed.
+    Same shape as _osrm_matrices: {"durations": [N][N], "distances": [N][N]}
+    """
+    distances = haversine_matrix(points) * float(detour_factor)
+    durations = distances / (float(speed_kmh) / 3.6)
+    return {"durations": durations.tolist(), "distances": distances.tolist()}
+
+
+def estimate_route_metrics(points, detour_factor=1.3, speed_kmh=35.0):
+    """Open route 0->1->2->... estimated like estimate_matrices."""
+    if not points or len(points) < 2:
+        return {"distance": 0.0, "duration": 0.0}
+
+    lat, lng = _radians(points)
+    distance = float(_haversine(lat[:-1], lng[:-1], lat[1:], lng[1:]).sum()) * float(detour_factor)
+    return {"distance": distance, "duration": distance / (float(speed_kmh) / 3.6)}
@@ -0,0 +1,121 @@
+"""
+Route geometry for the map: Google encoded polylines and Douglas-Peucker
+simplification per zoom level.
+
+A road path from the routing backend has thousands of vertices, most of
+which are invisible at city zoom. significance() runs Douglas-Peucker once
+and gives every vertex the largest tolerance at which it survives, so the
+simplification for any zoom is a threshold on that array instead of another
+pass. Distances are in Web Mercator meters, where one screen pixel at zoom
+z is a fixed length anywhere on the map.
+"""
+import numpy as np
+
+PRECISION = 5  # decimal places; what OSRM and Google use
+
+# Web Mercator meters per 256px tile pixel at zoom 0
+MERCATOR_M_PER_PX = 156543.03392
+_EARTH_RADIUS_M = 6378137.0
+
+
+def encode_polyline(coords, precision=PRECISION):
+    """coords: [(lat, lon), ...] -> encoded polyline string."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        lat_i, lon_i = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            v = ~(delta << 1) if delta < 0 else delta << 1
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1F)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(out)
+
+
+def decode_polyline(text, precision=PRECISION):
+    """Inverse of encode_polyline: [(lat, lon), ...]."""
+    factor = 10 ** precision
+    coords = []
+    values = []
+    shift = result = 0
+    for ch in text:
+        b = ord(ch) - 63
+        result |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            shift = result = 0
+
+    lat = lon = 0
+    for dlat, dlon in zip(values[0::2], values[1::2]):
+        lat += dlat
+        lon += dlon
+        coords.append((lat / factor, lon / factor))
+    return coords
+
+
+def _project(coords):
+    """Web Mercator x/y in meters for [(lat, lon), ...]."""
+    a = np.radians(np.asarray(coords, dtype=np.float64))
+    lat = np.clip(a[:, 0], -1.4844, 1.4844)  # +-85.05 degrees
+    return _EARTH_RADIUS_M * a[:, 1], _EARTH_RADIUS_M * np.log(np.tan(np.pi / 4 + lat / 2))
+
+
+def significance(coords):
+    """
+    Per vertex, the largest Douglas-Peucker tolerance (Mercator meters) at
+    which it is kept; the end points are always kept (inf). A vertex never
+    outranks the vertex whose split exposed it, so keeping `sig > tol` is
+    exactly the Douglas-Peucker result for `tol`.
+    """
+    n = len(coords)
+    sig = np.zeros(n)
+    if n == 0:
+        return sig
+    sig[0] = sig[-1] = np.inf
+    if n < 3:
+        return sig
+
+    x, y = _project(coords)
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, cap = stack.pop()
+        if last - first < 2:
+            continue
+
+        px, py = x[first + 1 : last], y[first + 1 : last]
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        length2 = dx * dx + dy * dy
+        if length2 > 0:
+            t = np.clip(((px - x[first]) * dx + (py - y[first]) * dy) / length2, 0.0, 1.0)
+        else:
+            t = 0.0
+        dist = np.hypot(px - (x[first] + t * dx), py - (y[first] + t * dy))
+
+        k = int(np.argmax(dist))
+        mid = first + 1 + k
+        sig[mid] = min(float(dist[k]), cap)
+        stack.append((first, mid, sig[mid]))
+        stack.append((mid, last, sig[mid]))
+    return sig
+
+
+def tolerance_for_zoom(zoom, tolerance_px=1.0):
+    """Mercator meters covered by `tolerance_px` screen pixels at `zoom`."""
+    return MERCATOR_M_PER_PX / (2 ** zoom) * tolerance_px
+
+
+def simplify_levels(coords, zooms, tolerance_px=1.0):
+    """
+    Encoded polyline of `coords` simplified for each zoom level:
+    {zoom: polyline}. One Douglas-Peucker pass for all levels.
+    """
+    sig = significance(coords)
+    pts = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    return {
+        zoom: encode_polyline(pts[sig > tolerance_for_zoom(zoom, tolerance_px)].tolist())
+        for zoom in zooms
+    }
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without a network call while a host's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker: opens after `threshold` consecutive failures, fails
+    fast for `reset_after` seconds, then lets a single probe through
+    (half-open). A successful probe closes it again.
+    """
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """
+    Shared outbound HTTP client for the routing upstreams (OSRM, Google).
+
+    Keeps one keep-alive `requests.Session` per process with a sized
+    connection pool, retries 429/5xx responses with jittered exponential
+    backoff and applies per-host timeouts from the app config.
+
+    Every host also gets a circuit breaker, so a dead upstream costs one
+    CircuitOpenError instead of a full timeout per request. Callbacks
+    registered with on_success(host) run after every successful response.
+    """
+
+    def __init__(self, app=None):
+        self.pool_size = 10
+        self.retries = 2
+        self.backoff = 0.3
+        self.backoff_jitter = 0.2
+        self.connect_timeout = 3.05
+        self.default_timeout = 12.0
+        self.host_timeouts = {}
+        self.breaker_threshold = 5
+        self.breaker_reset = 30.0
+
+        self._breakers = {}
+        self._success_callbacks = []
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.pool_size = int(app.config.get("HTTP_POOL_SIZE", 10))
+        self.retries = int(app.config.get("HTTP_RETRIES", 2))
+        self.backoff = float(app.config.get("HTTP_BACKOFF", 0.3))
+        self.backoff_jitter = float(app.config.get("HTTP_BACKOFF_JITTER", 0.2))
+        self.connect_timeout = float(app.config.get("HTTP_CONNECT_TIMEOUT", 3.05))
+        self.default_timeout = float(app.config.get("HTTP_DEFAULT_TIMEOUT", 12.0))
+        self.host_timeouts = dict(app.config.get("HTTP_HOST_TIMEOUTS") or {})
+        self.breaker_threshold = int(app.config.get("HTTP_BREAKER_THRESHOLD", 5))
+        self.breaker_reset = float(app.config.get("HTTP_BREAKER_RESET", 30))
+
+        with self._lock:
+            self._breakers = {}
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    def _build_session(self):
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff,
+            backoff_jitter=self.backoff_jitter,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @property
+    def session(self):
+        # gunicorn forks workers after import, so never share a pool across pids
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def timeout_for(self, url):
+        host = urlsplit(url).hostname or ""
+        read_timeout = float(self.host_timeouts.get(host, self.default_timeout))
+        return (min(self.connect_timeout, read_timeout), read_timeout)
+
+    def breaker(self, host):
+        b = self._breakers.get(host)
+        if b is None:
+            with self._lock:
+                b = self._breakers.setdefault(
+                    host, CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+                )
+        return b
+
+    def on_success(self, callback):
+        """
+        callback(host) runs after every response that is not a 5xx/429,
+        whether or not the host's circuit was open; keep it cheap.
+        """
+        self._success_callbacks.append(callback)
+
+    def get(self, url, params=None, timeout=None):
+        """
+        GET through the pooled session.
+        timeout: seconds; defaults to the configured per-host timeout.
+        Raises CircuitOpenError while the host's circuit is open.
+        """
+        host = urlsplit(url).hostname or ""
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for {host}")
+
+        if timeout is None:
+            timeout = self.timeout_for(url)
+        try:
+            r = self.session.get(url, params=params, timeout=timeout)
+        except requests.RequestException:
+            breaker.failure()
+            raise
+
+        if r.status_code >= 500 or r.status_code == 429:
+            breaker.failure()
+        else:
+            breaker.success()
+            for callback in list(self._success_callbacks):
+                callback(host)
+        return r
+
+
+http_client = HttpClient()
@@ -0,0 +1,368 @@
+"""
+Request timing, spans and Prometheus metrics.
+
+With METRICS_ENABLED every request is timed and broken down into spans
+(OSRM, Google, solver; see `timed` / `span`) and SQL time and query
+count (engine events). The numbers are kept as histograms and served in
+the Prometheus text format on /metrics; SERVER_TIMING adds them to each
+response as a `Server-Timing` header as well.
+
+QUERY_BUDGET_MODE=log|raise checks every request against the budget its
+view declares with `query_budget(n)` and flags same-shape statements run
+more than QUERY_REPEAT_LIMIT times (N+1 lazy loads): "log" warns, "raise"
+raises QueryBudgetExceeded, which is meant for tests and load runs.
+
+Disabled (the default), no engine listeners are installed and a timed
+function costs one attribute check per call.
+
+Work handed to a thread pool must go through `submit` / `map_in_context`:
+the request's timer (and the Flask app context) live in context variables,
+which pool threads do not inherit.
+
+Histograms live in the worker process: with several gunicorn workers each
+scrape sees one worker, so scrape them per worker or run one worker per
+container.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar, copy_context
+from functools import wraps
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+SQL_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+# spans of the request being served; pool workers see it through submit()
+_current = ContextVar("instrumentation_request", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more SQL statements than its view's budget allows."""
+
+
+def query_budget(n):
+    """
+    Declares that a view runs at most `n` SQL statements per request,
+    independent of how many rows it returns. Put it below the route
+    decorator. `None` marks a view whose statements grow with its input by
+    design (batched imports); it is exempt from both checks.
+    """
+
+    def decorator(view):
+        view.query_budget = n
+        return view
+
+    return decorator
+
+
+class Histogram:
+    """Prometheus histogram with a fixed label set, safe across threads."""
+
+    def __init__(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+
+        for labels, s in series:
+            pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), s):
+                cumulative += n
+                le = bound if bound == "+Inf" else repr(float(bound))
+                bucket = ",".join(pairs + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket}}} {cumulative}")
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {s[-2]:.6f}")
+            lines.append(f"{self.name}_count{suffix} {s[-1]}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestTimer:
+    """
+    Per-request accumulator: span name -> seconds, plus SQL totals and,
+    while budgets are checked, statement text -> executions. Updated under
+    `lock`, since pool workers of the request add to it concurrently.
+    """
+
+    __slots__ = ("lock", "start", "spans", "db_time", "db_queries", "statements")
+
+    def __init__(self, statements=False):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.statements = {} if statements else None
+
+
+class Instrumentation:
+    """
+    Flask extension holding the histograms; init_app installs the request
+    hooks, the SQL listeners and the /metrics view when enabled.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.server_timing = False
+        self.budget_mode = "off"
+        self.repeat_limit = 10
+        self.active = False
+
+        self.requests = Histogram(
+            "http_request_duration_seconds",
+            "Request latency.",
+            ("method", "endpoint", "status"),
+        )
+        self.request_spans = Histogram(
+            "http_request_span_seconds",
+            "Time a request spent in each span.",
+            ("endpoint", "span"),
+        )
+        self.request_db = Histogram(
+            "http_request_db_seconds", "SQL time per request.", ("endpoint",)
+        )
+        self.request_queries = Histogram(
+            "http_request_db_queries",
+            "SQL statements per request.",
+            ("endpoint",),
+            buckets=COUNT_BUCKETS,
+        )
+        self.spans = Histogram(
+            "span_duration_seconds",
+            "Duration of each span call, including background jobs.",
+            ("span",),
+        )
+        self.queries = Histogram(
+            "db_query_duration_seconds",
+            "SQL statement duration.",
+            ("operation",),
+            buckets=QUERY_BUCKETS,
+        )
+        self.histograms = [
+            self.requests,
+            self.request_spans,
+            self.request_db,
+            self.request_queries,
+            self.spans,
+            self.queries,
+        ]
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get("METRICS_ENABLED"))
+        self.server_timing = self.enabled and bool(app.config.get("SERVER_TIMING"))
+        self.budget_mode = (app.config.get("QUERY_BUDGET_MODE") or "off").lower()
+        self.repeat_limit = int(app.config.get("QUERY_REPEAT_LIMIT", 10))
+        self.active = self.enabled or self.budget_mode in ("log", "raise")
+        if not self.active:
+            return
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if self.enabled:
+            app.add_url_rule("/metrics", "metrics", self.render_response)
+
+    # --- request lifecycle ---
+
+    def _before_request(self):
+        timer = RequestTimer(statements=self.budget_mode != "off")
+        g._instrumentation_token = _current.set(timer)
+
+    def _after_request(self, response):
+        timer = _current.get()
+        if timer is None:
+            return response
+
+        elapsed = time.perf_counter() - timer.start
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        if endpoint == "/metrics":
+            return response
+
+        if self.enabled:
+            self.requests.observe(elapsed, request.method, endpoint, str(response.status_code))
+            self.request_db.observe(timer.db_time, endpoint)
+            self.request_queries.observe(timer.db_queries, endpoint)
+            for name, seconds in timer.spans.items():
+                self.request_spans.observe(seconds, endpoint, name)
+
+        if self.server_timing:
+            response.headers["Server-Timing"] = _server_timing(timer, elapsed)
+        if timer.statements is not None:
+            self._check_budget(timer, endpoint)
+        return response
+
+    def _check_budget(self, timer, endpoint):
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, "query_budget", None)
+        if budget is None and hasattr(view, "query_budget"):
+            return
+
+        problems = []
+        if budget is not None and timer.db_queries > budget:
+            problems.append(f"{timer.db_queries} queries, budget {budget}")
+        repeated = sorted(
+            ((n, stmt) for stmt, n in timer.statements.items() if n > self.repeat_limit),
+            reverse=True,
+        )
+        if repeated:
+            problems.append(
+                "repeated statements (N+1?): "
+                + "; ".join(f"{n}x {' '.join(stmt.split())[:160]}" for n, stmt in repeated[:3])
+            )
+        if not problems:
+            return
+
+        message = f"{request.method} {endpoint}: " + ", ".join(problems)
+        if self.budget_mode == "raise":
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning("query budget: %s", message)
+
+    def _teardown_request(self, exc):
+        token = g.pop("_instrumentation_token", None)
+        if token is not None:
+            _current.reset(token)
+
+    # --- spans ---
+
+    def record(self, name, seconds):
+        self.spans.observe(seconds, name)
+        timer = _current.get()
+        if timer is not None:
+            with timer.lock:
+                timer.spans[name] = timer.spans.get(name, 0.0) + seconds
+
+    def render(self):
+        return "\n".join(h.render() for h in self.histograms) + "\n"
+
+    def render_response(self):
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _server_timing(timer, elapsed):
+    parts = [f"app;dur={elapsed * 1000:.1f}"]
+    if timer.db_queries:
+        parts.append(f'db;dur={timer.db_time * 1000:.1f};desc="{timer.db_queries} queries"')
+    parts.extend(f"{name};dur={s * 1000:.1f}" for name, s in timer.spans.items())
+    return ", ".join(parts)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if instrumentation.active and context is not None:
+        context._instrumentation_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_instrumentation_start", None)
+    if start is None:
+        return
+
+    elapsed = time.perf_counter() - start
+    operation = statement.lstrip()[:6].upper()
+    instrumentation.queries.observe(
+        elapsed, operation if operation in SQL_OPERATIONS else "OTHER"
+    )
+
+    timer = _current.get()
+    if timer is not None:
+        with timer.lock:
+            timer.db_time += elapsed
+            timer.db_queries += 1
+            if timer.statements is not None:
+                timer.statements[statement] = timer.statements.get(statement, 0) + 1
+
+
+class span:
+    """
+    Context manager timing a block as span `name`:
+
+        with span("solve"):
+            ...
+    """
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if instrumentation.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            instrumentation.record(self.name, time.perf_counter() - self.start)
+
+
+def timed(name):
+    """Decorator: every call of the function is a span `name`."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                instrumentation.record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def submit(pool, fn, *args, **kwargs):
+    """
+    pool.submit running `fn` in a copy of the caller's context, so its
+    spans and SQL count toward the current request and current_app works.
+    """
+    return pool.submit(copy_context().run, fn, *args, **kwargs)
+
+
+def map_in_context(pool, fn, items):
+    """pool.map through `submit`; results in input order."""
+    futures = [submit(pool, fn, item) for item in items]
+    for f in futures:
+        yield f.result()
+
+
+instrumentation = Instrumentation()
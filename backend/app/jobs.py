@@ -0,0 +1,222 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Job
+
+
+class JobRunner:
+    """
+    Background runner for slow route computations.
+
+    Jobs are rows in the `jobs` table, so their state survives restarts;
+    the work runs on a bounded per-process thread pool. Handlers are
+    registered by kind and return the same (body, status_code) pair the
+    synchronous endpoint would have returned.
+
+    Every worker claims a job with a conditional UPDATE, so several
+    gunicorn processes can recover the same queue without running a job
+    twice.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_workers = 2
+        self.stale_after = 600
+        self.handlers = {}
+        # set once a deferred job is committed in this process, cleared when
+        # release_deferred() runs: lets callers skip the jobs query
+        self.has_deferred = False
+
+        self._executor = None
+        self._pid = None
+        self._recovered_pid = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = int(app.config.get("JOB_WORKERS", 2))
+        self.stale_after = int(app.config.get("JOB_STALE_SECONDS", 600))
+
+        # recover once per process, after gunicorn has forked the worker
+        app.before_request(self._recover_once)
+        if not event.contains(Session, "after_commit", self._after_commit):
+            event.listen(Session, "after_commit", self._after_commit)
+
+    def _after_commit(self, session):
+        if session.info.pop("deferred_jobs", False):
+            self.has_deferred = True
+
+    def register(self, kind, handler):
+        """handler(job) -> (body, status_code); runs inside an app context."""
+        self.handlers[kind] = handler
+
+    @property
+    def executor(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="job"
+                    )
+                    self._pid = pid
+        return self._executor
+
+    def enqueue(self, kind, user_id, route_id=None):
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status="queued",
+            user_id=user_id,
+            route_id=route_id,
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self.executor.submit(self._run, job.id)
+        return job
+
+    def defer(self, kind, user_id, route_id):
+        """
+        Parks a recomputation until release_deferred() (e.g. a result that
+        was estimated while the routing upstream was down). At most one
+        deferred job per (kind, route). The caller commits.
+        """
+        return self.defer_many(kind, user_id, [route_id])[0]
+
+    def defer_many(self, kind, user_id, route_ids):
+        """defer() for several routes with one lookup; returns their jobs."""
+        existing = {
+            j.route_id: j
+            for j in Job.query.filter(
+                Job.kind == kind, Job.status == "deferred", Job.route_id.in_(route_ids)
+            ).all()
+        }
+
+        jobs = []
+        for route_id in route_ids:
+            job = existing.get(route_id)
+            if job is None:
+                job = existing[route_id] = Job(
+                    id=uuid.uuid4().hex,
+                    kind=kind,
+                    status="deferred",
+                    user_id=user_id,
+                    route_id=route_id,
+                )
+                db.session.add(job)
+            jobs.append(job)
+        db.session.info["deferred_jobs"] = True
+        return jobs
+
+    def release_deferred(self):
+        """Re-runs every deferred job; safe to call from any thread."""
+        self.has_deferred = False
+        self.executor.submit(self._release_deferred)
+
+    def _release_deferred(self):
+        with self.app.app_context():
+            try:
+                pending = [j.id for j in Job.query.filter_by(status="deferred").all()]
+                Job.query.filter(Job.id.in_(pending)).update(
+                    {"status": "queued"}, synchronize_session=False
+                )
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                self.has_deferred = True
+                return
+            finally:
+                db.session.remove()
+
+        # one after another: a recovering upstream is not hit by a burst, and
+        # baseline/optimize of the same route never overwrite each other
+        for job_id in pending:
+            self._run(job_id)
+
+    def _claim(self, job_id):
+        now = datetime.now(timezone.utc)
+        claimed = (
+            Job.query.filter_by(id=job_id, status="queued")
+            .update({"status": "running", "started_at": now}, synchronize_session=False)
+        )
+        db.session.commit()
+        return claimed == 1
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+
+                job = db.session.get(Job, job_id)
+                handler = self.handlers.get(job.kind)
+                if handler is None:
+                    raise ValueError(f"unknown job kind: {job.kind}")
+
+                body, status_code = handler(job)
+
+                job = db.session.get(Job, job_id)
+                job.result = body
+                job.status_code = status_code
+                job.status = "done" if status_code < 400 else "failed"
+                job.error = body.get("error") if status_code >= 400 else None
+                job.finished_at = datetime.now(timezone.utc)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(Job, job_id)
+                if job is not None:
+                    job.status = "failed"
+                    job.status_code = 500
+                    job.error = str(e)
+                    job.finished_at = datetime.now(timezone.utc)
+                    db.session.commit()
+            finally:
+                db.session.remove()
+
+    def _recover_once(self):
+        pid = os.getpid()
+        if self._recovered_pid == pid:
+            return
+        self._recovered_pid = pid
+        self.recover()
+
+    def recover(self):
+        """
+        Re-queues jobs left behind by a previous process: queued and
+        deferred jobs are resubmitted and running jobs older than
+        `stale_after` are reset.
+        """
+        try:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+            Job.query.filter(
+                Job.status == "running", Job.started_at < cutoff
+            ).update({"status": "queued"}, synchronize_session=False)
+            Job.query.filter_by(status="deferred").update(
+                {"status": "queued"}, synchronize_session=False
+            )
+            db.session.commit()
+
+            pending = [j.id for j in Job.query.filter_by(status="queued").all()]
+        except SQLAlchemyError:
+            # jobs table not created yet (create_db.py not run)
+            db.session.rollback()
+            return
+
+        for job_id in pending:
+            self.executor.submit(self._run, job_id)
+
+
+job_runner = JobRunner()
@@ -0,0 +1,216 @@
+import hashlib
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import insert
+
+from . import db
+from .models import RouteMatrix
+
+# header: magic, dtype code, rows, cols
+_HEADER = struct.Struct("<4sBII")
+_MAGIC = b"QRM1"
+_DTYPES = {1: np.float32, 2: np.int32}
+
+
+def encode_matrix(matrix, dtype=np.float32):
+    """
+    matrix: nested list, None = unreachable
+    Returns header + little-endian row-major values. float32 stores None as
+    NaN; a 300x300 matrix is ~360 KB instead of ~1.5 MB of JSON.
+    """
+    a = np.array(
+        [[np.nan if v is None else v for v in row] for row in matrix], dtype=np.float64
+    )
+    if a.ndim != 2:
+        raise ValueError("matrix must be 2-dimensional")
+
+    code = next(k for k, v in _DTYPES.items() if v == dtype)
+    if dtype == np.int32:
+        a = np.where(np.isnan(a), -1, np.rint(a))
+
+    header = _HEADER.pack(_MAGIC, code, a.shape[0], a.shape[1])
+    return header + a.astype(dtype).astype(np.dtype(dtype).newbyteorder("<")).tobytes()
+
+
+def decode_array(blob):
+    """Returns a float64 ndarray with NaN for unreachable cells."""
+    magic, code, rows, cols = _HEADER.unpack_from(blob)
+    if magic != _MAGIC or code not in _DTYPES:
+        raise ValueError("not an encoded matrix")
+
+    dtype = np.dtype(_DTYPES[code]).newbyteorder("<")
+    a = np.frombuffer(blob, dtype=dtype, offset=_HEADER.size, count=rows * cols)
+    a = a.reshape(rows, cols).astype(np.float64)
+    if code == 2:
+        a[a < 0] = np.nan
+    return a
+
+
+def decode_matrix(blob):
+    """Inverse of encode_matrix: nested list with None for unreachable."""
+    a = decode_array(blob)
+    return [[None if np.isnan(v) else float(v) for v in row] for row in a]
+
+
+def points_hash(points, precision=5):
+    """points: list of {"lat":..,"lng":..} in matrix row order."""
+    key = ";".join(
+        f'{round(float(p["lat"]), precision)},{round(float(p["lng"]), precision)}'
+        for p in points
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _matrix_values(matrix, points, source):
+    return {
+        "source": source,
+        "created_at": datetime.now(timezone.utc),
+        "rows": len(matrix),
+        "cols": len(matrix[0]) if matrix else 0,
+        "points_hash": points_hash(points) if points is not None else None,
+        "data": encode_matrix(matrix),
+    }
+
+
+def save_route_matrix(route_id, kind, matrix, points, source, keep_uploads=False):
+    """
+    Replaces the route's matrix of this kind; caller commits.
+    keep_uploads: do not overwrite a user-uploaded matrix (returns None).
+    """
+    row = RouteMatrix.query.filter_by(route_id=route_id, kind=kind).first()
+    if row is not None and keep_uploads and row.source == "upload":
+        return None
+
+    values = _matrix_values(matrix, points, source)
+    if row is None:
+        row = RouteMatrix(route_id=route_id, kind=kind)
+        db.session.add(row)
+
+    for key, value in values.items():
+        setattr(row, key, value)
+    return row
+
+
+def save_route_matrices(entries, source, keep_uploads=False):
+    """
+    save_route_matrix for many (route_id, kind, matrix, points) entries, at
+    most one per (route_id, kind): one lookup of the existing rows and one
+    executemany INSERT for the new ones (the ORM would insert one by one to
+    get their ids back). Caller commits.
+    """
+    route_ids = {route_id for route_id, _, _, _ in entries}
+    existing = {
+        (row.route_id, row.kind): row
+        for row in RouteMatrix.query.filter(RouteMatrix.route_id.in_(route_ids)).all()
+    }
+
+    new = []
+    for route_id, kind, matrix, points in entries:
+        row = existing.get((route_id, kind))
+        if row is not None and keep_uploads and row.source == "upload":
+            continue
+
+        values = _matrix_values(matrix, points, source)
+        if row is None:
+            new.append({"route_id": route_id, "kind": kind, **values})
+            continue
+        for key, value in values.items():
+            setattr(row, key, value)
+
+    if new:
+        db.session.execute(insert(RouteMatrix), new)
+
+
+def _age(row, now):
+    if row.created_at is None:
+        return float("inf")
+    return (now - row.created_at.replace(tzinfo=None)).total_seconds()
+
+
+def load_route_matrices(route_id, points, max_osrm_age=None, depots=0, complete=None):
+    """
+    Returns ({kind: nested list}, source) for stored matrices whose rows
+    match `points`, or ({}, None). OSRM-fetched matrices older than
+    `max_osrm_age` seconds are ignored. Blobs are only read once the
+    metadata matches. See load_route_matrices_many for depots/complete.
+    """
+    return load_route_matrices_many(
+        {route_id: points}, max_osrm_age, depots=depots, complete=complete
+    )[route_id]
+
+
+def load_route_matrices_many(points_by_route, max_osrm_age=None, depots=0, complete=None):
+    """
+    load_route_matrices for {route_id: points} in two queries: the
+    metadata of every route's matrices, then the blobs that match.
+    Returns {route_id: ({kind: nested list}, source)}.
+
+    An upload may leave out the first `depots` points (the warehouses) and
+    cover only the clients. Such a matrix is passed to
+    complete(points, kind, matrix), which returns (full matrix, final) or
+    None; a final matrix replaces the upload's rows so later loads match it
+    directly (caller commits).
+    """
+    wanted = {route_id: points_hash(points) for route_id, points in points_by_route.items()}
+    partial = {}
+    if depots and complete is not None:
+        partial = {
+            route_id: points_hash(points[depots:]) for route_id, points in points_by_route.items()
+        }
+    rows = RouteMatrix.query.filter(RouteMatrix.route_id.in_(wanted)).all()
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    full = [
+        row
+        for row in rows
+        if row.points_hash == wanted[row.route_id]
+        and (max_osrm_age is None or row.source != "osrm" or _age(row, now) <= max_osrm_age)
+    ]
+    have = {(row.route_id, row.kind) for row in full}
+    clients_only = [
+        row
+        for row in rows
+        if row.source == "upload"
+        and row.points_hash == partial.get(row.route_id)
+        and (row.route_id, row.kind) not in have
+    ]
+
+    blobs = {}
+    if full or clients_only:
+        blobs = dict(
+            db.session.query(RouteMatrix.id, RouteMatrix.data)
+            .filter(RouteMatrix.id.in_([row.id for row in full + clients_only]))
+            .all()
+        )
+
+    by_route = {route_id: {} for route_id in wanted}
+    sources = {route_id: set() for route_id in wanted}
+    for row in full:
+        by_route[row.route_id][row.kind] = decode_matrix(blobs[row.id])
+        sources[row.route_id].add(row.source)
+
+    for row in clients_only:
+        points = points_by_route[row.route_id]
+        completed = complete(points, row.kind, decode_matrix(blobs[row.id]))
+        if completed is None:
+            continue
+        matrix, final = completed
+        if final:
+            values = _matrix_values(matrix, points, "upload")
+            del values["created_at"]  # still the upload's
+            for key, value in values.items():
+                setattr(row, key, value)
+        by_route[row.route_id][row.kind] = matrix
+        sources[row.route_id].add("upload")
+
+    result = {}
+    for route_id, matrices in by_route.items():
+        if not matrices:
+            result[route_id] = ({}, None)
+            continue
+        found = sources[route_id]
+        source = "upload" if "upload" in found else next(iter(found))
+        result[route_id] = (matrices, source)
+    return result
@@ -0,0 +1,391 @@
+"""
+Versioned schema migrations.
+
+Applied versions are recorded in `schema_migrations`; `upgrade()` runs the
+missing ones in order, each in its own transaction. Steps are written to be
+idempotent (checkfirst / IF NOT EXISTS), so databases created earlier with
+create_db.py's create_all upgrade cleanly. Tables and data changes are
+Core definitions and statements of the schema as it was at that version,
+not the ORM models.
+
+Run it as a deploy step (`python migrate.py`), not from every gunicorn
+worker. New migrations are appended to MIGRATIONS; never edit or reorder
+an applied one.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    bindparam,
+    cast,
+    column,
+    inspect,
+    select,
+    table,
+    text,
+)
+
+from . import db
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _jobs_table(meta, name="jobs", route_fk=None):
+    """The jobs table; `route_fk` is the ForeignKey of route_id."""
+    return Table(
+        name,
+        meta,
+        Column("id", String(36), primary_key=True),
+        Column("kind", String(32), nullable=False),
+        Column("status", String(16), nullable=False),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("route_id", Integer, route_fk or ForeignKey("routes.id"), nullable=True),
+        Column("result", JSON, nullable=True),
+        Column("status_code", Integer, nullable=True),
+        Column("error", Text, nullable=True),
+        Column("created_at", DateTime),
+        Column("started_at", DateTime, nullable=True),
+        Column("finished_at", DateTime, nullable=True),
+    )
+
+
+def _initial_schema(conn):
+    """
+    Tables that do not exist yet, as they were before versioned migrations:
+    later steps add the metric columns, lookup indexes and the rest.
+    """
+    meta = MetaData()
+    Table(
+        "users",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("email", String(255), nullable=False),
+        Column("password_hash", String(255), nullable=False),
+        Column("created_at", DateTime),
+        Column("name", String(120), nullable=False),
+        Index("ix_users_email", "email", unique=True),
+    )
+    Table(
+        "routes",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(255), nullable=False),
+        Column("parameters", JSON, nullable=True),
+        Column("created_at", DateTime),
+        Column("is_deleted", Boolean, nullable=False),
+        Column("deleted_at", DateTime, nullable=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    )
+    Table(
+        "clients",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(255), nullable=False),
+        Column("lat", Float, nullable=False),
+        Column("lon", Float, nullable=False),
+        Column("time_window_from", String(16), nullable=True),
+        Column("time_window_to", String(16), nullable=True),
+        Column("demand", Float, nullable=True),
+        Column("route_id", Integer, ForeignKey("routes.id"), nullable=False),
+    )
+    Table(
+        "route_matrices",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("route_id", Integer, ForeignKey("routes.id"), nullable=False),
+        Column("kind", String(16), nullable=False),
+        Column("source", String(16), nullable=False),
+        Column("rows", Integer, nullable=False),
+        Column("cols", Integer, nullable=False),
+        Column("points_hash", String(40), nullable=True),
+        Column("created_at", DateTime),
+        Column("data", LargeBinary, nullable=False),
+        UniqueConstraint("route_id", "kind", name="uq_route_matrices_route_kind"),
+        Index("ix_route_matrices_route_id", "route_id"),
+    )
+    jobs = _jobs_table(meta)
+    Index("ix_jobs_status", jobs.c.status)
+    meta.create_all(conn, checkfirst=True)
+
+
+def _route_metric_columns(conn):
+    """Typed baseline/optimized metric columns on routes, backfilled."""
+    columns = [
+        "baseline_distance",
+        "baseline_duration",
+        "baseline_time",
+        "optimized_distance",
+        "optimized_duration",
+        "optimized_time",
+    ]
+    existing = {c["name"] for c in inspect(conn).get_columns("routes")}
+    missing = [name for name in columns if name not in existing]
+    for name in missing:
+        conn.execute(text(f"ALTER TABLE routes ADD COLUMN {name} FLOAT"))
+    _create_indexes(
+        conn, "routes", lambda ix: ix.name.startswith(("ix_routes_baseline", "ix_routes_optimized"))
+    )
+    if not missing:
+        return
+
+    # the routes table as of this version, not the current model
+    routes = table("routes", column("id"), column("parameters", JSON), *map(column, columns))
+    backfill = (
+        routes.update()
+        .where(routes.c.id == bindparam("route_id"))
+        .values({name: bindparam(name) for name in columns})
+    )
+    rows = conn.execute(select(routes.c.id, routes.c.parameters)).all()
+    for i in range(0, len(rows), 500):
+        conn.execute(
+            backfill,
+            [
+                {"route_id": route_id, **_backfilled_metrics(params)}
+                for route_id, params in rows[i : i + 500]
+            ],
+        )
+
+
+def _backfilled_metrics(params):
+    """Route.sync_metrics as of migration 002, for a parameters dict."""
+
+    def number(x):
+        try:
+            return float(x)
+        except (TypeError, ValueError):
+            return None
+
+    values = {}
+    for key in ("baseline", "optimized"):
+        obj = (params or {}).get(key) or None
+        distance = number(obj.get("distance")) if obj else None
+        duration = number(obj.get("duration")) if obj else None
+
+        time = None
+        if obj:
+            traffic = number((obj.get("traffic") or {}).get("traffic_duration"))
+            if traffic is not None and traffic > 0:
+                time = traffic
+            elif duration is not None and duration > 0:
+                time = duration
+
+        values[f"{key}_distance"] = distance
+        values[f"{key}_duration"] = duration
+        values[f"{key}_time"] = time
+    return values
+
+
+def _lookup_indexes(conn):
+    """
+    (user_id, is_deleted, created_at, id) for the route list/stats queries
+    and their keyset pagination; clients.route_id and jobs.route_id for the
+    per-route lookups.
+    """
+    _create_indexes(conn, "routes", lambda ix: ix.name == "ix_routes_user_deleted_created")
+    _create_indexes(conn, "clients", lambda ix: ix.name == "ix_clients_route_id")
+    _create_indexes(conn, "jobs", lambda ix: ix.name == "ix_jobs_route_id")
+
+
+def _route_geometries(conn):
+    """Stored road geometry per route order (models.RouteGeometry)."""
+    meta = MetaData()
+    Table("routes", meta, Column("id", Integer, primary_key=True))
+    Table(
+        "route_geometries",
+        meta,
+        Column("id", Integer, primary_key=True),
+        Column("route_id", Integer, ForeignKey("routes.id"), nullable=False),
+        Column("kind", String(16), nullable=False),
+        Column("points_hash", String(40), nullable=False),
+        Column("distance", Float, nullable=True),
+        Column("duration", Float, nullable=True),
+        Column("created_at", DateTime),
+        Column("paths", JSON, nullable=False),
+        Column("levels", JSON, nullable=False),
+        UniqueConstraint("route_id", "kind", name="uq_route_geometries_route_kind"),
+        Index("ix_route_geometries_route_id", "route_id"),
+    ).create(conn, checkfirst=True)
+
+
+# routes_api.WAREHOUSES as of migration 005, in id order
+_WAREHOUSES = [
+    (56.969109, 24.112366),
+    (56.939166, 24.055983),
+    (56.952044, 24.158705),
+]
+
+
+def _legacy_matrix_uploads(conn):
+    """
+    Matrices uploaded before route_matrices existed, kept in
+    routes.parameters["distance_matrix"], moved into route_matrices as
+    distance uploads. Only square numeric matrices sized for the route's
+    clients (or the warehouses and clients) can be placed; others stay in
+    parameters.
+    """
+    from .matrix_store import encode_matrix, points_hash
+
+    routes = table("routes", column("id"), column("parameters", JSON))
+    clients = table("clients", column("id"), column("route_id"), column("lat"), column("lon"))
+    matrices = table(
+        "route_matrices",
+        column("route_id"),
+        column("kind"),
+        column("source"),
+        column("rows"),
+        column("cols"),
+        column("points_hash"),
+        column("created_at"),
+        column("data"),
+    )
+
+    for route_id, params in conn.execute(
+        select(routes.c.id, routes.c.parameters).where(
+            cast(routes.c.parameters, Text).like('%"distance_matrix"%')
+        )
+    ).all():
+        matrix = (params or {}).get("distance_matrix")
+        if not isinstance(matrix, list) or not matrix:
+            continue
+        n = len(matrix)
+        if any(not isinstance(row, list) or len(row) != n for row in matrix):
+            continue
+        if any(v is not None and not isinstance(v, (int, float)) for row in matrix for v in row):
+            continue
+
+        points = [
+            {"lat": lat, "lng": lon}
+            for lat, lon in conn.execute(
+                select(clients.c.lat, clients.c.lon)
+                .where(clients.c.route_id == route_id)
+                .order_by(clients.c.id)
+            )
+        ]
+        if n == len(_WAREHOUSES) + len(points):
+            points = [{"lat": lat, "lng": lng} for lat, lng in _WAREHOUSES] + points
+        elif n != len(points):
+            continue
+
+        taken = conn.execute(
+            select(matrices.c.route_id).where(
+                matrices.c.route_id == route_id, matrices.c.kind == "distance"
+            )
+        ).first()
+        if taken is None:
+            conn.execute(
+                matrices.insert().values(
+                    route_id=route_id,
+                    kind="distance",
+                    source="upload",
+                    rows=n,
+                    cols=n,
+                    points_hash=points_hash(points),
+                    created_at=datetime.now(timezone.utc),
+                    data=encode_matrix(matrix),
+                )
+            )
+
+        params = dict(params)
+        del params["distance_matrix"]
+        conn.execute(routes.update().where(routes.c.id == route_id).values(parameters=params))
+
+
+def _job_route_cascade(conn):
+    """
+    jobs.route_id ON DELETE CASCADE, so permanently deleting a route with
+    jobs does not violate the foreign key. SQLite cannot alter a
+    constraint, so there the table is rebuilt.
+    """
+    fks = inspect(conn).get_foreign_keys("jobs")
+    fk = next((fk for fk in fks if fk["constrained_columns"] == ["route_id"]), None)
+    if fk and (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+        return
+
+    if conn.dialect.name != "sqlite":
+        if fk and fk.get("name"):
+            conn.execute(text(f"ALTER TABLE jobs DROP CONSTRAINT {fk['name']}"))
+        conn.execute(
+            text(
+                "ALTER TABLE jobs ADD CONSTRAINT jobs_route_id_fkey FOREIGN KEY (route_id) "
+                "REFERENCES routes (id) ON DELETE CASCADE"
+            )
+        )
+        return
+
+    meta = MetaData()
+    Table("users", meta, Column("id", Integer, primary_key=True))
+    Table("routes", meta, Column("id", Integer, primary_key=True))
+    rebuilt = _jobs_table(meta, "jobs_rebuild", ForeignKey("routes.id", ondelete="CASCADE"))
+    rebuilt.create(conn)
+    names = ", ".join(c.name for c in rebuilt.columns)
+    conn.execute(text(f"INSERT INTO jobs_rebuild ({names}) SELECT {names} FROM jobs"))
+    conn.execute(text("DROP TABLE jobs"))
+    conn.execute(text("ALTER TABLE jobs_rebuild RENAME TO jobs"))
+    conn.execute(text("CREATE INDEX ix_jobs_status ON jobs (status)"))
+    conn.execute(text("CREATE INDEX ix_jobs_route_id ON jobs (route_id)"))
+
+
+def _create_indexes(conn, table, wanted):
+    for ix in db.metadata.tables[table].indexes:
+        if wanted(ix):
+            ix.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "route metric columns", _route_metric_columns),
+    (3, "lookup indexes", _lookup_indexes),
+    (4, "route geometries", _route_geometries),
+    (5, "legacy matrix uploads", _legacy_matrix_uploads),
+    (6, "job route cascade", _job_route_cascade),
+]
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def pending(engine):
+    done = applied_versions(engine)
+    return [(v, name) for v, name, _ in MIGRATIONS if v not in done]
+
+
+def upgrade(engine, log=print):
+    """Applies every pending migration; returns the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(
+                schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.now(timezone.utc)
+                )
+            )
+        log(f"+ {version:03d} {name}")
+        applied.append(version)
+    return applied
@@ -4,6 +4,13 @@ from sqlalchemy.ext.mutable import MutableDict  # ✅ NEW
 from . import db
 
 
+def _to_float(x):
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
 class User(db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
@@ -23,6 +30,11 @@ class User(db.Model):
 
 class Route(db.Model):
     __tablename__ = "routes"
+    # every list/stats query filters by owner and archive flag and pages by
+    # (created_at, id); see migrations.py for existing databases
+    __table_args__ = (
+        db.Index("ix_routes_user_deleted_created", "user_id", "is_deleted", "created_at", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
 
@@ -35,10 +47,47 @@ class Route(db.Model):
 
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
+    # typed copies of parameters["baseline"/"optimized"] for SQL stats/sorting;
+    # *_time is Google traffic duration, falling back to the OSRM duration
+    baseline_distance = db.Column(db.Float, nullable=True, index=True)
+    baseline_duration = db.Column(db.Float, nullable=True)
+    baseline_time = db.Column(db.Float, nullable=True, index=True)
+    optimized_distance = db.Column(db.Float, nullable=True, index=True)
+    optimized_duration = db.Column(db.Float, nullable=True)
+    optimized_time = db.Column(db.Float, nullable=True, index=True)
+
+    # id order: matrix rows, the baseline path and its geometry hash
+    # depend on it
     clients = db.relationship(
-        "Client", backref="route", cascade="all, delete-orphan", lazy=True
+        "Client", backref="route", cascade="all, delete-orphan", lazy=True, order_by="Client.id"
+    )
+    matrices = db.relationship(
+        "RouteMatrix", backref="route", cascade="all, delete-orphan", lazy=True
+    )
+    geometries = db.relationship(
+        "RouteGeometry", backref="route", cascade="all, delete-orphan", lazy=True
     )
 
+    def sync_metrics(self):
+        """Copies baseline/optimized metrics from `parameters` into the columns."""
+        params = self.parameters or {}
+        for key in ("baseline", "optimized"):
+            obj = params.get(key) or None
+            distance = _to_float(obj.get("distance")) if obj else None
+            duration = _to_float(obj.get("duration")) if obj else None
+
+            time = None
+            if obj:
+                traffic = _to_float((obj.get("traffic") or {}).get("traffic_duration"))
+                if traffic is not None and traffic > 0:
+                    time = traffic
+                elif duration is not None and duration > 0:
+                    time = duration
+
+            setattr(self, f"{key}_distance", distance)
+            setattr(self, f"{key}_duration", duration)
+            setattr(self, f"{key}_time", time)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -61,7 +110,7 @@ class Client(db.Model):
     time_window_to = db.Column(db.String(16), nullable=True)
     demand = db.Column(db.Float, nullable=True)
 
-    route_id = db.Column(db.Integer, db.ForeignKey("routes.id"), nullable=False)
+    route_id = db.Column(db.Integer, db.ForeignKey("routes.id"), nullable=False, index=True)
 
     def to_dict(self):
         return {
@@ -73,3 +122,92 @@ class Client(db.Model):
             "time_window_to": self.time_window_to,
             "demand": self.demand,
         }
+
+
+class RouteMatrix(db.Model):
+    """
+    Uploaded or OSRM-fetched matrix for a route, stored as a compact
+    binary blob (see app.matrix_store). `points_hash` identifies the
+    warehouse+client coordinates the rows/columns refer to.
+    """
+
+    __tablename__ = "route_matrices"
+    id = db.Column(db.Integer, primary_key=True)
+    route_id = db.Column(db.Integer, db.ForeignKey("routes.id"), nullable=False, index=True)
+    kind = db.Column(db.String(16), nullable=False)  # "duration" / "distance"
+    source = db.Column(db.String(16), nullable=False)  # "upload" / "osrm"
+    rows = db.Column(db.Integer, nullable=False)
+    cols = db.Column(db.Integer, nullable=False)
+    points_hash = db.Column(db.String(40), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+
+    __table_args__ = (db.UniqueConstraint("route_id", "kind", name="uq_route_matrices_route_kind"),)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "source": self.source,
+            "rows": self.rows,
+            "cols": self.cols,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class RouteGeometry(db.Model):
+    """
+    Road geometry of a route's baseline or optimized order, fetched once
+    from the routing backend (see app.geometry). `paths` holds one encoded
+    polyline per vehicle at full detail, `levels` the same paths simplified
+    per zoom level ({"14": [...]}). `points_hash` identifies the ordered
+    stops it was fetched for; a different order means a refetch.
+    """
+
+    __tablename__ = "route_geometries"
+    id = db.Column(db.Integer, primary_key=True)
+    route_id = db.Column(db.Integer, db.ForeignKey("routes.id"), nullable=False, index=True)
+    kind = db.Column(db.String(16), nullable=False)  # "baseline" / "optimized"
+    points_hash = db.Column(db.String(40), nullable=False)
+    distance = db.Column(db.Float, nullable=True)
+    duration = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    paths = db.deferred(db.Column(db.JSON, nullable=False))
+    levels = db.deferred(db.Column(db.JSON, nullable=False))
+
+    __table_args__ = (db.UniqueConstraint("route_id", "kind", name="uq_route_geometries_route_kind"),)
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="queued", index=True)
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    route_id = db.Column(
+        db.Integer, db.ForeignKey("routes.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+
+    result = db.Column(db.JSON, nullable=True)
+    status_code = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "route_id": self.route_id,
+            "result": self.result,
+            "status_code": self.status_code,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,489 @@
+import csv
+import heapq
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+DEFAULT_SPEED_KMH = 40.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def _truthy(v):
+    return str(v).strip().lower() in ("1", "true", "yes", "-1")
+
+
+class _GraphBuilder:
+    """Collects nodes (deduplicated by coordinate) and directed edges."""
+
+    def __init__(self):
+        self.node_ids = {}
+        self.lat = []
+        self.lon = []
+        self.edges = {}
+
+    def node(self, lat, lon):
+        key = (round(float(lat), 6), round(float(lon), 6))
+        nid = self.node_ids.get(key)
+        if nid is None:
+            nid = len(self.lat)
+            self.node_ids[key] = nid
+            self.lat.append(key[0])
+            self.lon.append(key[1])
+        return nid
+
+    def edge(self, a, b, duration, distance, oneway=False):
+        if a == b:
+            return
+        for u, v in ((a, b),) if oneway else ((a, b), (b, a)):
+            old = self.edges.get((u, v))
+            if old is None or duration < old[0]:
+                self.edges[(u, v)] = (float(duration), float(distance))
+
+
+def load_edges_csv(path):
+    """
+    CSV with a header row:
+      from_lat,from_lon,to_lat,to_lon[,distance_m][,duration_s][,speed_kmh][,oneway]
+    Missing distance is the great-circle length, missing duration comes from
+    speed_kmh (default 40 km/h).
+    """
+    g = _GraphBuilder()
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            a = g.node(row["from_lat"], row["from_lon"])
+            b = g.node(row["to_lat"], row["to_lon"])
+            distance = row.get("distance_m") or None
+            distance = float(distance) if distance else haversine_m(
+                g.lat[a], g.lon[a], g.lat[b], g.lon[b]
+            )
+            duration = row.get("duration_s") or None
+            if duration:
+                duration = float(duration)
+            else:
+                speed = float(row.get("speed_kmh") or DEFAULT_SPEED_KMH)
+                duration = distance / (speed / 3.6)
+            g.edge(a, b, duration, distance, oneway=_truthy(row.get("oneway", "0")))
+    return g
+
+
+def load_edges_geojson(path):
+    """
+    FeatureCollection of LineStrings (e.g. an OSM highway export); each
+    coordinate pair becomes an edge. Properties: oneway, maxspeed/speed_kmh.
+    """
+    g = _GraphBuilder()
+    with open(path) as f:
+        data = json.load(f)
+
+    for feature in data.get("features") or []:
+        geom = feature.get("geometry") or {}
+        props = feature.get("properties") or {}
+        if geom.get("type") == "LineString":
+            lines = [geom.get("coordinates") or []]
+        elif geom.get("type") == "MultiLineString":
+            lines = geom.get("coordinates") or []
+        else:
+            continue
+
+        try:
+            speed = float(props.get("speed_kmh") or props.get("maxspeed") or DEFAULT_SPEED_KMH)
+        except (TypeError, ValueError):
+            speed = DEFAULT_SPEED_KMH
+        oneway = _truthy(props.get("oneway", "0"))
+
+        for line in lines:
+            for (lon1, lat1, *_), (lon2, lat2, *_) in zip(line, line[1:]):
+                a = g.node(lat1, lon1)
+                b = g.node(lat2, lon2)
+                distance = haversine_m(g.lat[a], g.lon[a], g.lat[b], g.lon[b])
+                g.edge(a, b, distance / (speed / 3.6), distance, oneway=oneway)
+    return g
+
+
+def _witness_search(out_adj, source, skip, targets, limit, max_settled):
+    """
+    Bounded Dijkstra from `source` ignoring `skip`; returns the settled
+    distances of `targets` that are within `limit`.
+    """
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    found = {}
+    remaining = set(targets)
+
+    while heap and remaining and settled < max_settled:
+        d, u = heapq.heappop(heap)
+        if d > limit:
+            break
+        if d > dist.get(u, math.inf):
+            continue
+        settled += 1
+        if u in remaining:
+            found[u] = d
+            remaining.discard(u)
+        for w, (dur, _, _) in out_adj[u].items():
+            if w == skip:
+                continue
+            nd = d + dur
+            if nd < dist.get(w, math.inf):
+                dist[w] = nd
+                heapq.heappush(heap, (nd, w))
+    return found
+
+
+class ContractedGraph:
+    """
+    Contraction-hierarchy road graph in flat NumPy arrays.
+
+    Upward forward edges (CSR: fwd_ptr/fwd_to/fwd_dur/fwd_dist) and upward
+    backward edges (bwd_ptr/bwd_from/...) answer table and route queries
+    with small bidirectional searches. Shortcut middle nodes are kept so
+    paths can be unpacked to road geometry.
+    """
+
+    ARRAYS = (
+        "lat", "lon", "rank",
+        "fwd_ptr", "fwd_to", "fwd_dur", "fwd_dist",
+        "bwd_ptr", "bwd_from", "bwd_dur", "bwd_dist",
+        "edge_from", "edge_to", "edge_mid",
+    )
+
+    def __init__(self, **arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n = len(self.lat)
+        self._prepare()
+
+    def _prepare(self):
+        # python-side views of the arrays; scalar access on lists is much
+        # faster than on ndarrays inside the search loops
+        def csr(ptr, to, dur, dist):
+            ptr, to, dur, dist = ptr.tolist(), to.tolist(), dur.tolist(), dist.tolist()
+            return [
+                list(zip(to[ptr[v]:ptr[v + 1]], dur[ptr[v]:ptr[v + 1]], dist[ptr[v]:ptr[v + 1]]))
+                for v in range(self.n)
+            ]
+
+        self._up = csr(self.fwd_ptr, self.fwd_to, self.fwd_dur, self.fwd_dist)
+        self._down = csr(self.bwd_ptr, self.bwd_from, self.bwd_dur, self.bwd_dist)
+        self._mid = {
+            (a, b): m
+            for a, b, m in zip(self.edge_from.tolist(), self.edge_to.tolist(), self.edge_mid.tolist())
+        }
+        self._coords = np.radians(np.stack([self.lat, self.lon], axis=1))
+
+    @classmethod
+    def build(cls, g, max_settled=500):
+        """Contracts a _GraphBuilder graph (edge-difference node order)."""
+        n = len(g.lat)
+        out_adj = [dict() for _ in range(n)]
+        in_adj = [dict() for _ in range(n)]
+        for (a, b), (dur, dist) in g.edges.items():
+            out_adj[a][b] = (dur, dist, -1)
+            in_adj[b][a] = (dur, dist, -1)
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+        level = [0] * n
+        rank = np.zeros(n, dtype=np.int32)
+        up_fwd = [[] for _ in range(n)]
+        up_bwd = [[] for _ in range(n)]
+        all_edges = {k: -1 for k in g.edges}
+
+        def shortcuts_for(v):
+            result = []
+            outs = [(w, e) for w, e in out_adj[v].items() if not contracted[w]]
+            for u, (d1, l1, _) in in_adj[v].items():
+                if contracted[u]:
+                    continue
+                targets = {w: d1 + d2 for w, (d2, _, _) in outs if w != u}
+                if not targets:
+                    continue
+                found = _witness_search(
+                    out_adj, u, v, targets, max(targets.values()), max_settled
+                )
+                for w, (d2, l2, _) in outs:
+                    if w == u:
+                        continue
+                    if found.get(w, math.inf) <= d1 + d2:
+                        continue
+                    result.append((u, w, d1 + d2, l1 + l2))
+            return result
+
+        def priority(v, shortcuts):
+            # edge difference + contracted neighbours + hierarchy depth keeps
+            # the contraction spread evenly over the graph
+            degree = len(in_adj[v]) + len(out_adj[v])
+            return 2 * len(shortcuts) - degree + deleted_neighbors[v] + level[v]
+
+        heap = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        order = 0
+
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # lazy update: re-evaluate and postpone if no longer the minimum
+            shortcuts = shortcuts_for(v)
+            p = priority(v, shortcuts)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            for u, w, dur, dist in shortcuts:
+                old = out_adj[u].get(w)
+                if old is None or dur < old[0]:
+                    out_adj[u][w] = (dur, dist, v)
+                    in_adj[w][u] = (dur, dist, v)
+                    all_edges[(u, w)] = v
+
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+            for w, (dur, dist, _) in out_adj[v].items():
+                if not contracted[w]:
+                    up_fwd[v].append((w, dur, dist))
+                    del in_adj[w][v]
+                    deleted_neighbors[w] += 1
+                    level[w] = max(level[w], level[v] + 1)
+            for u, (dur, dist, _) in in_adj[v].items():
+                if not contracted[u]:
+                    up_bwd[v].append((u, dur, dist))
+                    del out_adj[u][v]
+                    deleted_neighbors[u] += 1
+                    level[u] = max(level[u], level[v] + 1)
+
+        def to_csr(lists):
+            ptr = np.zeros(n + 1, dtype=np.int64)
+            ptr[1:] = np.cumsum([len(x) for x in lists])
+            flat = [e for x in lists for e in x]
+            to = np.array([e[0] for e in flat], dtype=np.int32)
+            dur = np.array([e[1] for e in flat], dtype=np.float32)
+            dist = np.array([e[2] for e in flat], dtype=np.float32)
+            return ptr, to, dur, dist
+
+        fwd_ptr, fwd_to, fwd_dur, fwd_dist = to_csr(up_fwd)
+        bwd_ptr, bwd_from, bwd_dur, bwd_dist = to_csr(up_bwd)
+        keys = list(all_edges.items())
+
+        return cls(
+            lat=np.array(g.lat, dtype=np.float64),
+            lon=np.array(g.lon, dtype=np.float64),
+            rank=rank,
+            fwd_ptr=fwd_ptr, fwd_to=fwd_to, fwd_dur=fwd_dur, fwd_dist=fwd_dist,
+            bwd_ptr=bwd_ptr, bwd_from=bwd_from, bwd_dur=bwd_dur, bwd_dist=bwd_dist,
+            edge_from=np.array([k[0] for k, _ in keys], dtype=np.int32),
+            edge_to=np.array([k[1] for k, _ in keys], dtype=np.int32),
+            edge_mid=np.array([m for _, m in keys], dtype=np.int32),
+        )
+
+    def save(self, path):
+        np.savez_compressed(path, **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.ARRAYS})
+
+    def snap(self, points):
+        """Nearest graph node for every {"lat","lng"} point (vectorized)."""
+        if not points:
+            return []
+        q = np.radians(np.array([[p["lat"], p["lng"]] for p in points], dtype=np.float64))
+        lat, lon = self._coords[:, 0], self._coords[:, 1]
+        nodes = []
+        for qlat, qlon in q:
+            x = (lon - qlon) * np.cos((lat + qlat) / 2)
+            y = lat - qlat
+            nodes.append(int(np.argmin(x * x + y * y)))
+        return nodes
+
+    def _search(self, source, adj):
+        """Full upward Dijkstra; returns {node: (duration, distance, parent)}."""
+        best = {source: (0.0, 0.0, -1)}
+        heap = [(0.0, source)]
+        done = set()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            _, l, _ = best[u]
+            for w, dur, dist in adj[u]:
+                nd = d + dur
+                if w not in best or nd < best[w][0]:
+                    best[w] = (nd, l + dist, u)
+                    heapq.heappush(heap, (nd, w))
+        return best
+
+    def table(self, sources, targets):
+        """
+        Many-to-many on node ids via bucket scanning.
+        Returns (durations, distances) as nested lists, None = unreachable.
+        """
+        buckets = {}
+        for j, t in enumerate(targets):
+            for v, (d, l, _) in self._search(t, self._down).items():
+                buckets.setdefault(v, []).append((j, d, l))
+
+        durations = []
+        distances = []
+        for s in sources:
+            row_d = [math.inf] * len(targets)
+            row_l = [None] * len(targets)
+            for v, (d, l, _) in self._search(s, self._up).items():
+                for j, d2, l2 in buckets.get(v, ()):
+                    if d + d2 < row_d[j]:
+                        row_d[j] = d + d2
+                        row_l[j] = l + l2
+            durations.append([None if x == math.inf else x for x in row_d])
+            distances.append(row_l)
+        return durations, distances
+
+    def _unpack(self, a, b, out):
+        mid = self._mid.get((a, b), -1)
+        if mid < 0:
+            out.append(b)
+            return
+        self._unpack(a, mid, out)
+        self._unpack(mid, b, out)
+
+    def path(self, s, t):
+        """
+        Shortest path s -> t.
+        Returns (duration, distance, [node, ...]) or None if unreachable.
+        """
+        if s == t:
+            return 0.0, 0.0, [s]
+
+        fwd = self._search(s, self._up)
+        bwd = self._search(t, self._down)
+
+        meet = None
+        best = math.inf
+        for v, (d, _, _) in fwd.items():
+            if v in bwd and d + bwd[v][0] < best:
+                best = d + bwd[v][0]
+                meet = v
+        if meet is None:
+            return None
+
+        up = [meet]
+        while fwd[up[-1]][2] >= 0:
+            up.append(fwd[up[-1]][2])
+        up.reverse()
+        down = [meet]
+        while bwd[down[-1]][2] >= 0:
+            down.append(bwd[down[-1]][2])
+
+        hops = up + down[1:]
+        nodes = [hops[0]]
+        for a, b in zip(hops, hops[1:]):
+            self._unpack(a, b, nodes)
+
+        return best, fwd[meet][1] + bwd[meet][1], nodes
+
+
+class OfflineRouter:
+    """
+    In-process replacement for the OSRM table/route helpers, selected with
+    ROUTING_BACKEND=offline. The graph (OFFLINE_GRAPH_PATH, .csv or
+    .geojson) is contracted on first use; the result is cached next to it
+    as .ch.npz so later processes start instantly.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.path = None
+        self.graph = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("ROUTING_BACKEND", "osrm") == "offline"
+        self.path = app.config.get("OFFLINE_GRAPH_PATH")
+        self.graph = None
+
+    def _graph(self):
+        if self.graph is None:
+            with self._lock:
+                if self.graph is None:
+                    self.graph = self._load()
+        return self.graph
+
+    def _load(self):
+        if not self.path:
+            raise ValueError("OFFLINE_GRAPH_PATH not set")
+
+        cache = os.path.splitext(self.path)[0] + ".ch.npz"
+        if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(self.path):
+            return ContractedGraph.load(cache)
+
+        if self.path.lower().endswith((".geojson", ".json")):
+            builder = load_edges_geojson(self.path)
+        else:
+            builder = load_edges_csv(self.path)
+
+        graph = ContractedGraph.build(builder)
+        try:
+            graph.save(cache)
+        except OSError:
+            pass
+        return graph
+
+    def table(self, points, sources=None, destinations=None):
+        """
+        Same shape as _osrm_matrices: {"durations": .., "distances": ..};
+        sources/destinations select rows/columns like the OSRM parameters.
+        """
+        g = self._graph()
+        nodes = g.snap(points)
+        src = nodes if sources is None else [nodes[i] for i in sources]
+        dst = nodes if destinations is None else [nodes[i] for i in destinations]
+        durations, distances = g.table(src, dst)
+        return {"durations": durations, "distances": distances}
+
+    def route(self, points, geometry=False):
+        """
+        Open route through `points`, same shape as _osrm_route_metrics;
+        geometry=True adds a GeoJSON LineString of the road path.
+        """
+        g = self._graph()
+        nodes = g.snap(points)
+        duration = 0.0
+        distance = 0.0
+        path_nodes = [nodes[0]] if nodes else []
+
+        for a, b in zip(nodes, nodes[1:]):
+            leg = g.path(a, b)
+            if leg is None:
+                raise ValueError("offline router: no route between points")
+            duration += leg[0]
+            distance += leg[1]
+            path_nodes.extend(leg[2][1:])
+
+        result = {"distance": float(distance), "duration": float(duration)}
+        if geometry:
+            result["geometry"] = {
+                "type": "LineString",
+                "coordinates": [[float(g.lon[v]), float(g.lat[v])] for v in path_nodes],
+            }
+        return result
+
+
+offline_router = OfflineRouter()
@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# a hit refreshes last_used only once it is this fraction of the TTL old;
+# LRU order is exact to that resolution and most hits write nothing
+TOUCH_FRACTION = 0.1
+# eviction trims to this fraction of max_entries, so it runs once per
+# (1 - EVICT_TO) * max_entries new entries instead of on every write
+EVICT_TO = 0.9
+
+
+class OsrmCache:
+    """
+    Persistent cache for OSRM table/route responses.
+
+    Entries live in a local SQLite file and are keyed on the request kind,
+    the profile and the coordinates rounded to `precision` decimals, so
+    repeated optimizations of the same stops cost no network round-trips.
+    Expired entries (TTL) are dropped on read, and the least recently used
+    entries are evicted once `max_entries` is exceeded. Both are amortized:
+    see TOUCH_FRACTION and EVICT_TO.
+
+    Google traffic legs live in their own `traffic_legs` table: they expire
+    with their departure bucket, are read and written in batches, and never
+    evict OSRM responses or count towards the hit ratio.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.ttl = 0
+        self.max_entries = 0
+        self.precision = 5
+        self.hits = 0
+        self.misses = 0
+        self._counters = {}
+        self._conn = None
+        # entries in the file as far as this process knows: exact after an
+        # eviction, then counted up per write (other workers' writes are
+        # caught by their own counts)
+        self._size = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get("OSRM_CACHE_PATH")
+        self.ttl = int(app.config.get("OSRM_CACHE_TTL", 7 * 24 * 3600))
+        self.max_entries = int(app.config.get("OSRM_CACHE_MAX_ENTRIES", 10000))
+        self.precision = int(app.config.get("OSRM_CACHE_PRECISION", 5))
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._size = None
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.ttl > 0 and self.max_entries > 0
+
+    def _connect(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS osrm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_osrm_cache_last_used "
+                "ON osrm_cache (last_used)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS traffic_legs (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def make_key(self, kind, profile, points, **extra):
+        """
+        kind: "table" / "route"
+        points: list of {"lat":..,"lng":..}
+        Returns a string key; coordinates are rounded to the cache precision.
+        """
+        coords = ";".join(
+            f'{round(float(p["lng"]), self.precision)},'
+            f'{round(float(p["lat"]), self.precision)}'
+            for p in points
+        )
+        suffix = "&".join(f"{k}={extra[k]}" for k in sorted(extra))
+        return f"{kind}|{profile}|{coords}|{suffix}"
+
+    def get(self, key):
+        """Returns the cached value or None on a miss."""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created_at, last_used FROM osrm_cache WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is None:
+                    self.misses += 1
+                    return None
+
+                value, created_at, last_used = row
+                if created_at + self.ttl < now:
+                    conn.execute("DELETE FROM osrm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    self.misses += 1
+                    return None
+
+                if now - last_used > self.ttl * TOUCH_FRACTION:
+                    conn.execute(
+                        "UPDATE osrm_cache SET last_used = ? WHERE key = ?", (now, key)
+                    )
+                    conn.commit()
+            except sqlite3.Error:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        return json.loads(value)
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO osrm_cache (key, value, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                if self._size is not None:
+                    self._size += 1
+                if self._size is None or self._size > self.max_entries:
+                    self._size = self._evict(conn)
+                conn.commit()
+            except sqlite3.Error:
+                # cache is best-effort, never fail the request because of it
+                pass
+
+    def _evict(self, conn):
+        """
+        Drops the least recently used entries beyond EVICT_TO * max_entries
+        once the file holds more than max_entries; returns the entry count.
+        """
+        size = conn.execute("SELECT COUNT(*) FROM osrm_cache").fetchone()[0]
+        if size <= self.max_entries:
+            return size
+
+        keep = max(1, int(self.max_entries * EVICT_TO))
+        conn.execute(
+            "DELETE FROM osrm_cache WHERE key IN ("
+            "SELECT key FROM osrm_cache ORDER BY last_used DESC "
+            "LIMIT -1 OFFSET ?)",
+            (keep,),
+        )
+        return keep
+
+    def get_legs(self, keys):
+        """Unexpired traffic legs for `keys` in one query: {key: value}."""
+        if not self.enabled or not keys:
+            return {}
+
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            try:
+                rows = self._connect().execute(
+                    f"SELECT key, value FROM traffic_legs "
+                    f"WHERE key IN ({','.join('?' * len(keys))}) AND expires_at > ?",
+                    (*keys, time.time()),
+                ).fetchall()
+            except sqlite3.Error:
+                return {}
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_legs(self, values, expires_at):
+        """
+        values: {key: leg}, kept until `expires_at` (epoch seconds), in one
+        transaction that also drops the expired legs.
+        """
+        if not self.enabled or not values:
+            return
+
+        with self._lock:
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.execute("DELETE FROM traffic_legs WHERE expires_at <= ?", (time.time(),))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO traffic_legs (key, value, expires_at) "
+                        "VALUES (?, ?, ?)",
+                        [(key, json.dumps(value), expires_at) for key, value in values.items()],
+                    )
+            except sqlite3.Error:
+                pass
+
+    def consume(self, name, amount, limit):
+        """
+        Adds `amount` to counter `name` unless that would exceed `limit`.
+        Returns True if the amount was granted. The counter lives in the
+        cache file so every worker process shares it (in-process if the
+        cache is disabled).
+        """
+        with self._lock:
+            if self.enabled:
+                try:
+                    conn = self._connect()
+                    conn.execute(
+                        "INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,)
+                    )
+                    granted = conn.execute(
+                        "UPDATE counters SET value = value + ? WHERE name = ? AND value + ? <= ?",
+                        (amount, name, amount, limit),
+                    ).rowcount == 1
+                    conn.commit()
+                    return granted
+                except sqlite3.Error:
+                    pass
+
+            used = self._counters.get(name, 0)
+            if used + amount > limit:
+                return False
+            self._counters[name] = used + amount
+            return True
+
+    def clear(self):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM osrm_cache")
+            conn.execute("DELETE FROM traffic_legs")
+            conn.commit()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        size = 0
+        if self.enabled:
+            with self._lock:
+                try:
+                    size = self._connect().execute(
+                        "SELECT COUNT(*) FROM osrm_cache"
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    size = 0
+
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else None,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "precision": self.precision,
+        }
+
+
+osrm_cache = OsrmCache()
@@ -1,10 +1,40 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, current_app, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import and_, case, delete, func, insert, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload, undefer
 from . import db
-from .models import Route, Client
-
+from .models import Route, Client, Job, RouteGeometry, RouteMatrix
+from .matrix_store import (
+    decode_matrix,
+    load_route_matrices,
+    load_route_matrices_many,
+    points_hash,
+    save_route_matrices,
+    save_route_matrix,
+)
+from .geometry import decode_polyline, encode_polyline, simplify_levels
+from .osrm_cache import osrm_cache
+from .http_client import http_client
+from .offline_router import offline_router
+from .estimates import estimate_matrices, estimate_route_metrics
+from .jobs import job_runner
+from .instrumentation import map_in_context, query_budget, span, submit, timed
+from .solver import cheapest_insertion, improve_open_path, solve_open_path
+from .vrp import solve_vrp, parse_clock, format_clock
+
+import base64
+import hashlib
+import json
+import math
 import os
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import numpy as np
 import requests
 
 routes_bp = Blueprint("routes", __name__)
@@ -15,29 +45,86 @@ WAREHOUSES = [
     {"id": 3, "name": "Warehouse 3", "lat": 56.952044, "lng": 24.158705},
 ]
 
-OSRM_BASE = "https://router.project-osrm.org"
-GOOGLE_DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+OSRM_BASE = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
+GOOGLE_DIRECTIONS_URL = os.getenv(
+    "GOOGLE_DIRECTIONS_URL", "https://maps.googleapis.com/maps/api/directions/json"
+)
 
 
-def _osrm_route_metrics(points, profile="driving", timeout=12):
+@timed("osrm_route")
+def _osrm_route_metrics(points, profile="driving", timeout=None, geometry=False):
     """
     points: list of {"lat":..,"lng":..}
     Open route: 0->1->2->... (no return)
-    Returns: {"distance": meters, "duration": seconds}
+    Returns: {"distance": meters, "duration": seconds}; geometry=True adds
+    the road path as a GeoJSON LineString under "geometry".
+    Routes over OSRM_MAX_ROUTE_COORDS are fetched as overlapping chunks
+    (sharing their end points) and summed.
     """
     if not points or len(points) < 2:
-        return {"distance": 0.0, "duration": 0.0}
+        result = {"distance": 0.0, "duration": 0.0}
+        if geometry:
+            result["geometry"] = _line_string(points)
+        return result
+
+    if offline_router.enabled:
+        return offline_router.route(points, geometry=geometry)
+
+    limit = max(2, int(current_app.config.get("OSRM_MAX_ROUTE_COORDS", 100)))
+    if len(points) > limit:
+        chunks = [points[i : i + limit] for i in range(0, len(points) - 1, limit - 1)]
+        workers = max(1, int(current_app.config.get("OSRM_TILE_CONCURRENCY", 4)))
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            parts = list(
+                map_in_context(
+                    pool, lambda c: _osrm_route_request(c, profile, timeout, geometry), chunks
+                )
+            )
+        result = {
+            "distance": sum(m["distance"] for m in parts),
+            "duration": sum(m["duration"] for m in parts),
+        }
+        if geometry:
+            coords = parts[0]["geometry"]["coordinates"][:]
+            for m in parts[1:]:
+                coords.extend(m["geometry"]["coordinates"][1:])
+            result["geometry"] = {"type": "LineString", "coordinates": coords}
+        return result
+
+    return _osrm_route_request(points, profile, timeout, geometry)
+
+
+def _line_string(points):
+    return {"type": "LineString", "coordinates": [[p["lng"], p["lat"]] for p in points]}
+
+
+def _osrm_route_request(points, profile, timeout, geometry=False):
+    """
+    One OSRM /route call; see _osrm_route_metrics. Metrics are cached,
+    geometries are stored per route by the caller (RouteGeometry).
+    """
+    if len(points) < 2:
+        result = {"distance": 0.0, "duration": 0.0}
+        if geometry:
+            result["geometry"] = _line_string(points)
+        return result
+
+    cache_key = osrm_cache.make_key("route", profile, points)
+    if not geometry:
+        cached = osrm_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     coords = ";".join([f'{p["lng"]},{p["lat"]}' for p in points])
 
     url = f"{OSRM_BASE}/route/v1/{profile}/{coords}"
     params = {
-        "overview": "false",
+        "overview": "full" if geometry else "false",
         "geometries": "geojson",
         "steps": "false",
     }
 
-    r = requests.get(url, params=params, timeout=timeout)
+    r = http_client.get(url, params=params, timeout=timeout)
     r.raise_for_status()
     data = r.json()
 
@@ -45,41 +132,220 @@ def _osrm_route_metrics(points, profile="driving", timeout=12):
     if not route:
         raise ValueError("OSRM returned no routes")
 
-    return {
+    metrics = {
         "distance": float(route.get("distance") or 0.0),
         "duration": float(route.get("duration") or 0.0),
     }
+    osrm_cache.set(cache_key, metrics)
+    if geometry:
+        line = route.get("geometry") or {}
+        if not line.get("coordinates"):
+            raise ValueError("OSRM returned no route geometry")
+        return {**metrics, "geometry": line}
+    return metrics
 
 
-def _osrm_table(points, profile="driving", timeout=12):
+@timed("osrm_table")
+def _osrm_matrices(points, profile="driving", annotations=("duration", "distance"), timeout=None):
     """
     points: list of {"lat":..,"lng":..}
-    Returns: durations matrix [N][N] in seconds
+    Returns: {"durations": [N][N] seconds, "distances": [N][N] meters}
+    (only the requested annotations are present)
+    More than OSRM_MAX_TABLE_COORDS points are fetched in tiles, see
+    _osrm_matrices_tiled.
     """
     if not points or len(points) < 2:
-        return [[0.0]]
+        return {f"{a}s": [[0.0]] for a in annotations}
+
+    if offline_router.enabled:
+        matrices = offline_router.table(points)
+        return {f"{a}s": matrices[f"{a}s"] for a in annotations}
+
+    limit = int(current_app.config.get("OSRM_MAX_TABLE_COORDS", 100))
+    if len(points) > limit:
+        return _osrm_matrices_tiled(
+            points,
+            profile,
+            annotations,
+            tile=max(1, limit // 2),
+            workers=max(1, int(current_app.config.get("OSRM_TILE_CONCURRENCY", 4))),
+            timeout=timeout,
+        )
+
+    return _osrm_table_request(points, profile, annotations, timeout=timeout)
+
+
+def _osrm_table_request(points, profile, annotations, sources=None, destinations=None,
+                        timeout=None):
+    """
+    One cached OSRM /table call. sources/destinations: indices into
+    `points`; the result is then len(sources) x len(destinations).
+    """
+    params = {"annotations": ",".join(annotations)}
+    if sources is not None:
+        params["sources"] = ";".join(str(i) for i in sources)
+    if destinations is not None:
+        params["destinations"] = ";".join(str(i) for i in destinations)
+
+    cache_key = osrm_cache.make_key("table", profile, points, **params)
+    cached = osrm_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     coords = ";".join([f'{p["lng"]},{p["lat"]}' for p in points])
     url = f"{OSRM_BASE}/table/v1/{profile}/{coords}"
-    params = {"annotations": "duration"}
 
-    r = requests.get(url, params=params, timeout=timeout)
+    r = http_client.get(url, params=params, timeout=timeout)
     r.raise_for_status()
     data = r.json()
 
-    durations = data.get("durations")
-    if not durations:
-        raise ValueError("OSRM table returned no durations")
+    matrices = {}
+    for a in annotations:
+        m = data.get(f"{a}s")
+        if not m:
+            raise ValueError(f"OSRM table returned no {a}s")
+        matrices[f"{a}s"] = m
 
-    return durations
+    osrm_cache.set(cache_key, matrices)
+    return matrices
 
 
-def _google_traffic_eta(points, timeout=12):
+def _osrm_matrices_tiled(points, profile, annotations, tile, workers, timeout=None):
+    """
+    Full NxN matrices from (tile x tile) blocks. Each request carries the
+    union of one source block and one destination block (at most 2*tile
+    coordinates) and selects the block with sources/destinations. Blocks
+    are fetched concurrently (`workers`) into preallocated arrays; every
+    block is cached on its own, so a retry after a failed tile only
+    fetches what is missing.
+    """
+    n = len(points)
+    blocks = [list(range(i, min(i + tile, n))) for i in range(0, n, tile)]
+    out = {a: np.full((n, n), np.nan) for a in annotations}
+
+    def fetch(pair):
+        src, dst = pair
+        idx = src if src is dst else src + dst
+        sub = [points[i] for i in idx]
+        res = _osrm_table_request(
+            sub,
+            profile,
+            annotations,
+            sources=list(range(len(src))),
+            destinations=list(range(len(idx) - len(dst), len(idx))),
+            timeout=timeout,
+        )
+        return src, dst, res
+
+    pairs = [(src, dst) for src in blocks for dst in blocks]
+    with ThreadPoolExecutor(max_workers=min(workers, len(pairs))) as pool:
+        for src, dst, res in map_in_context(pool, fetch, pairs):
+            for a in annotations:
+                block = np.array(res[f"{a}s"], dtype=float)  # None -> nan
+                out[a][src[0] : src[-1] + 1, dst[0] : dst[-1] + 1] = block
+
+    matrices = {}
+    for a in annotations:
+        m = out[a].astype(object)
+        m[np.isnan(out[a])] = None
+        matrices[f"{a}s"] = m.tolist()
+    return matrices
+
+
+@timed("osrm_table")
+def _osrm_row_col(points, k, profile="driving", annotations=("duration", "distance")):
+    """
+    Row and column of point k against every point, via sources/destinations
+    (chunked to OSRM_MAX_TABLE_COORDS) instead of a full table.
+    Returns {"durations": (row, col), ...} with row[k] = col[k] = 0.
+    """
+    n = len(points)
+    others = [i for i in range(n) if i != k]
+    out = {f"{a}s": ([0.0] * n, [0.0] * n) for a in annotations}
+
+    if offline_router.enabled:
+        row = offline_router.table(points, sources=[k], destinations=others)
+        col = offline_router.table(points, sources=others, destinations=[k])
+        chunks = [(others, row, col)]
+    else:
+        size = max(1, int(current_app.config.get("OSRM_MAX_TABLE_COORDS", 100)) - 1)
+        chunks = []
+        for i in range(0, len(others), size):
+            chunk = others[i : i + size]
+            sub = [points[j] for j in chunk] + [points[k]]
+            m = len(chunk)
+            row = _osrm_table_request(sub, profile, annotations, sources=[m], destinations=list(range(m)))
+            col = _osrm_table_request(sub, profile, annotations, sources=list(range(m)), destinations=[m])
+            chunks.append((chunk, row, col))
+
+    for chunk, row, col in chunks:
+        for a in annotations:
+            key = f"{a}s"
+            for j, v in zip(chunk, row[key][0]):
+                out[key][0][j] = v
+            for j, v in zip(chunk, col[key]):
+                out[key][1][j] = v[0]
+    return out
+
+
+def _osrm_table(points, profile="driving", timeout=None):
+    """
+    points: list of {"lat":..,"lng":..}
+    Returns: durations matrix [N][N] in seconds
+    """
+    return _osrm_matrices(
+        points, profile=profile, annotations=("duration",), timeout=timeout
+    )["durations"]
+
+
+def _estimate_settings():
+    return {
+        "detour_factor": float(current_app.config.get("ESTIMATE_DETOUR_FACTOR", 1.3)),
+        "speed_kmh": float(current_app.config.get("ESTIMATE_SPEED_KMH", 35)),
+    }
+
+
+def _matrices_or_estimate(points):
+    """
+    OSRM matrices, or the haversine estimate when OSRM fails (or its
+    circuit is open) and DEGRADED_MODE is on.
+    Returns (matrices, estimated).
+    """
+    try:
+        return _osrm_matrices(points, profile="driving"), False
+    except requests.RequestException:
+        if not current_app.config.get("DEGRADED_MODE", True):
+            raise
+        return estimate_matrices(points, **_estimate_settings()), True
+
+
+def _route_metrics_or_estimate(points):
+    """Like _matrices_or_estimate for an open route. Returns (metrics, estimated)."""
+    try:
+        return _osrm_route_metrics(points, profile="driving"), False
+    except requests.RequestException:
+        if not current_app.config.get("DEGRADED_MODE", True):
+            raise
+        return estimate_route_metrics(points, **_estimate_settings()), True
+
+
+def _submatrix(matrix, idx):
+    """Rows/columns `idx` of a square matrix, in that order."""
+    return [[matrix[a][b] for b in idx] for a in idx]
+
+
+@timed("google_eta")
+def _google_traffic_eta(points, timeout=None):
     """
     points: list of {"lat":..,"lng":..} in route order
     Returns:
       {"traffic_duration": seconds, "duration": seconds, "distance": meters}
     On failure returns: {"error": "..."}
+
+    Legs are cached per coordinate pair until their departure bucket
+    (GOOGLE_ETA_BUCKET_SECONDS) ends. Missing legs are fetched in segments of
+    at most GOOGLE_MAX_WAYPOINTS waypoints, concurrently, and every
+    request counts against the GOOGLE_DAILY_QUOTA (0 = unlimited).
     """
     api_key = os.getenv("GOOGLE_MAPS_API_KEY")
     if not api_key:
@@ -88,14 +354,78 @@ def _google_traffic_eta(points, timeout=12):
     if not points or len(points) < 2:
         return {"error": "Need at least 2 points"}
 
-    origin = f'{points[0]["lat"]},{points[0]["lng"]}'
-    destination = f'{points[-1]["lat"]},{points[-1]["lng"]}'
+    now = datetime.now(timezone.utc)
+    bucket_size = current_app.config["GOOGLE_ETA_BUCKET_SECONDS"]
+    bucket = int(now.timestamp()) // bucket_size * bucket_size
+
+    keys = [
+        osrm_cache.make_key("traffic_leg", "driving", points[i : i + 2], bucket=bucket)
+        for i in range(len(points) - 1)
+    ]
+    cached = osrm_cache.get_legs(keys)
+    legs = [cached.get(k) for k in keys]
+
+    # contiguous runs of uncached legs, cut into requests of at most
+    # max_waypoints intermediate points (= max_waypoints + 1 legs)
+    max_legs = current_app.config["GOOGLE_MAX_WAYPOINTS"] + 1
+    segments = []
+    i = 0
+    while i < len(legs):
+        if legs[i] is not None:
+            i += 1
+            continue
+        j = i
+        while j < len(legs) and legs[j] is None and j - i < max_legs:
+            j += 1
+        segments.append((i, j))
+        i = j
+
+    if segments:
+        quota = current_app.config["GOOGLE_DAILY_QUOTA"]
+        if quota > 0 and not osrm_cache.consume(
+            f"google_directions:{now.date().isoformat()}", len(segments), quota
+        ):
+            return {"error": "Google daily quota exhausted"}
+
+        workers = current_app.config["GOOGLE_CONCURRENCY"]
+        with ThreadPoolExecutor(max_workers=min(workers, len(segments))) as pool:
+            fetched = list(
+                map_in_context(
+                    pool,
+                    lambda seg: _google_directions_legs(
+                        points[seg[0] : seg[1] + 1], api_key, timeout
+                    ),
+                    segments,
+                )
+            )
+
+        new = {}
+        for (a, b), result in zip(segments, fetched):
+            if "error" in result:
+                return result
+            for k, leg in zip(range(a, b), result["legs"]):
+                legs[k] = leg
+                new[keys[k]] = leg
+        osrm_cache.set_legs(new, expires_at=bucket + bucket_size)
+
+    traffic_s = sum(leg["traffic_duration"] for leg in legs)
+    normal_s = sum(leg["duration"] for leg in legs)
+    dist_m = sum(leg["distance"] for leg in legs)
+
+    return {"traffic_duration": traffic_s, "duration": normal_s, "distance": dist_m}
+
 
+def _google_directions_legs(points, api_key, timeout=None):
+    """
+    One Directions request through `points` (first/last = origin/destination).
+    Returns {"legs": [{"traffic_duration", "duration", "distance"}, ...]}
+    or {"error": "..."}.
+    """
     params = {
-        "origin": origin,
-        "destination": destination,
+        "origin": f'{points[0]["lat"]},{points[0]["lng"]}',
+        "destination": f'{points[-1]["lat"]},{points[-1]["lng"]}',
         "mode": "driving",
-        "departure_time": "now",  
+        "departure_time": "now",
         "key": api_key,
     }
 
@@ -104,7 +434,7 @@ def _google_traffic_eta(points, timeout=12):
             [f'{p["lat"]},{p["lng"]}' for p in points[1:-1]]
         )
 
-    r = requests.get(GOOGLE_DIRECTIONS_URL, params=params, timeout=timeout)
+    r = http_client.get(GOOGLE_DIRECTIONS_URL, params=params, timeout=timeout)
     r.raise_for_status()
     data = r.json()
 
@@ -113,22 +443,20 @@ def _google_traffic_eta(points, timeout=12):
             "error": f'Google status={data.get("status")} msg={data.get("error_message")}'
         }
 
-    route = data["routes"][0]
-    legs = route.get("legs") or []
-
-    traffic_s = 0
-    normal_s = 0
-    dist_m = 0
-
-    for leg in legs:
-        dist_m += int((leg.get("distance") or {}).get("value") or 0)
-        normal_s += int((leg.get("duration") or {}).get("value") or 0)
-        traffic_s += int((leg.get("duration_in_traffic") or {}).get("value") or 0)
+    legs = []
+    for leg in data["routes"][0].get("legs") or []:
+        normal_s = int((leg.get("duration") or {}).get("value") or 0)
+        traffic_s = int((leg.get("duration_in_traffic") or {}).get("value") or 0)
+        legs.append({
+            "traffic_duration": traffic_s or normal_s,
+            "duration": normal_s,
+            "distance": int((leg.get("distance") or {}).get("value") or 0),
+        })
 
-    if traffic_s == 0:
-        traffic_s = normal_s
+    if len(legs) != len(points) - 1:
+        return {"error": "Google returned an unexpected number of legs"}
 
-    return {"traffic_duration": traffic_s, "duration": normal_s, "distance": dist_m}
+    return {"legs": legs}
 
 
 def _nearest_neighbor_order(durations):
@@ -197,12 +525,172 @@ def _two_opt(order, durations, max_iters=50):
 
     return best
 
-def route_to_dict(r: Route):
+def _vrp_settings(params, stops):
+    """
+    Multi-vehicle settings from Route.parameters, or None for the classic
+    single open path. VRP mode is used when there is more than one courier,
+    a vehicle capacity, or any client time window.
+      couriers: vehicle count (default 1)
+      capacity: per-vehicle capacity in Client.demand units
+      start_time: "HH:MM" departure from the depot (default "08:00")
+      service_time: seconds spent at every stop (default 0)
+    """
+    params = params or {}
+    couriers = _finite_float(params.get("couriers"))
+    vehicles = int(min(max(couriers or 1, 1), max(len(stops), 1)))
+    capacity = _finite_float(params.get("capacity"))
+    has_windows = any(s["tw_from"] is not None or s["tw_to"] is not None for s in stops)
+
+    if vehicles <= 1 and not capacity and not has_windows:
+        return None
+
+    start = parse_clock(params.get("start_time"))
+    return {
+        "vehicles": vehicles,
+        "capacity": capacity if capacity and capacity > 0 else None,
+        "start": start if start is not None else 8 * 3600,
+        "service": max(_finite_float(params.get("service_time")) or 0.0, 0.0),
+    }
+
+
+def _evaluate_warehouse(wh, durations, distances, stops, time_limit=None, vrp=None):
+    """
+    Solves the open path wh -> stops for one depot (or the multi-vehicle
+    problem when `vrp` settings are given).
+    durations/distances: (1+N)x(1+N) with the depot at index 0.
+    Returns (candidate, None) or (None, (error_body, status_code)).
+    """
+    if vrp is not None:
+        return _evaluate_warehouse_vrp(wh, durations, distances, stops, time_limit, vrp)
+
+    order_nodes = solve_open_path(durations, time_limit=time_limit)
+
+    duration = _order_cost(order_nodes, durations)
+    distance = _order_cost(order_nodes, distances)
+    if duration == float("inf") or distance == float("inf"):
+        return None, ({"error": "some stops are unreachable from this warehouse"}, 500)
+
+    return {
+        "warehouse_id": wh["id"],
+        "warehouse_name": wh["name"],
+        "order": [stops[i - 1]["id"] for i in order_nodes if i != 0],
+        "distance": distance,
+        "duration": duration,
+    }, None
+
+
+def _evaluate_warehouse_vrp(wh, durations, distances, stops, time_limit, vrp):
+    demands = [0.0] + [s["demand"] for s in stops]
+    windows = [(None, None)] + [(s["tw_from"], s["tw_to"]) for s in stops]
+
+    solution = solve_vrp(
+        durations,
+        demands,
+        windows,
+        vehicles=vrp["vehicles"],
+        capacity=vrp["capacity"],
+        start=vrp["start"],
+        service=vrp["service"],
+        time_limit=time_limit,
+    )
+
+    vehicles = []
+    for v, route in enumerate(solution["routes"], start=1):
+        nodes = [0] + route
+        vehicles.append(
+            {
+                "vehicle": v,
+                "order": [stops[i - 1]["id"] for i in route],
+                "load": solution["loads"][v - 1],
+                "distance": _order_cost(nodes, distances),
+                "duration": solution["durations"][v - 1],
+                "etas": [
+                    {
+                        "client_id": stops[i - 1]["id"],
+                        "arrival_s": t,
+                        "arrival": format_clock(t),
+                    }
+                    for i, t in zip(route, solution["etas"][v - 1])
+                ],
+            }
+        )
+
+    if not vehicles:
+        return None, ({"error": "no stop can be served from this warehouse"}, 500)
+
+    return {
+        "warehouse_id": wh["id"],
+        "warehouse_name": wh["name"],
+        "order": [cid for v in vehicles for cid in v["order"]],
+        "distance": sum(v["distance"] for v in vehicles),
+        "duration": sum(v["duration"] for v in vehicles),
+        "vehicles": vehicles,
+        "unassigned": [stops[i - 1]["id"] for i in solution["unassigned"]],
+    }, None
+
+
+def _candidate_key(candidate):
+    """Serve as many stops as possible first, then the shortest duration."""
+    return (len(candidate.get("unassigned") or []), candidate["duration"])
+
+
+def _evaluate_warehouses(stops, durations, distances, max_workers=4, time_limit=None,
+                         vrp=None):
+    """
+    durations/distances: combined (W+N)x(W+N) matrices, WAREHOUSES first.
+    Slices the per-depot submatrix and runs _evaluate_warehouse for every
+    depot on a bounded thread pool.
+    Returns [(wh, candidate, error)] in WAREHOUSES order, so the reduction
+    to the best candidate does not depend on completion order.
+    """
+    w = len(WAREHOUSES)
+    stop_idx = list(range(w, w + len(stops)))
+
+    def run(k):
+        idx = [k] + stop_idx
+        return _evaluate_warehouse(
+            WAREHOUSES[k],
+            _submatrix(durations, idx),
+            _submatrix(distances, idx),
+            stops,
+            time_limit=time_limit,
+            vrp=vrp,
+        )
+
+    workers = max(1, min(max_workers, w))
+
+    if workers == 1:
+        results = [run(k) for k in range(w)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(map_in_context(pool, run, range(w)))
+
+    return [(wh, cand, err) for wh, (cand, err) in zip(WAREHOUSES, results)]
+
+
+ROUTE_FIELDS = (
+    "id",
+    "name",
+    "parameters",
+    "created_at",
+    "baseline",
+    "optimized",
+    "is_deleted",
+    "deleted_at",
+    "clients",
+)
+
+
+def route_to_dict(r: Route, fields=None):
+    """
+    fields: optional subset of ROUTE_FIELDS; clients are only touched
+    (and lazily loaded) when requested.
+    """
     params = r.parameters or {}
     baseline = params.get("baseline")
     optimized = params.get("optimized")
 
-    return {
+    d = {
         "id": r.id,
         "name": r.name,
         "parameters": params,
@@ -213,7 +701,10 @@ def route_to_dict(r: Route):
         "deleted_at": r.deleted_at.isoformat()
         if getattr(r, "deleted_at", None)
         else None,
-        "clients": [
+    }
+
+    if fields is None or "clients" in fields:
+        d["clients"] = [
             {
                 "id": c.id,
                 "name": c.name,
@@ -224,9 +715,58 @@ def route_to_dict(r: Route):
                 "demand": c.demand,
             }
             for c in r.clients
-        ],
+        ]
+
+    if fields is not None:
+        d = {k: v for k, v in d.items() if k in fields}
+
+    return d
+
+
+def _metrics_summary(obj):
+    if not obj:
+        return None
+    return {
+        "warehouse_id": obj.get("warehouse_id"),
+        "distance": _safe_float(obj.get("distance")),
+        "duration": _safe_float(obj.get("duration")),
+        "traffic_duration": _get_traffic_seconds(obj),
+    }
+
+
+def route_summary(r: Route, stops):
+    """Compact list-view row: no clients, no raw parameters."""
+    params = r.parameters or {}
+    return {
+        "id": r.id,
+        "name": r.name,
+        "created_at": r.created_at.isoformat(),
+        "is_deleted": bool(getattr(r, "is_deleted", False)),
+        "deleted_at": r.deleted_at.isoformat()
+        if getattr(r, "deleted_at", None)
+        else None,
+        "stops": stops,
+        "couriers": params.get("couriers"),
+        "baseline": _metrics_summary(params.get("baseline")),
+        "optimized": _metrics_summary(params.get("optimized")),
     }
 
+
+def _encode_cursor(r: Route):
+    raw = json.dumps([r.created_at.isoformat(), r.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """Returns (created_at, id) or None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, rid = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(rid)
+    except (ValueError, TypeError):
+        return None
+
+
 def _safe_float(x):
     try:
         return float(x)
@@ -234,6 +774,12 @@ def _safe_float(x):
         return None
 
 
+def _finite_float(x):
+    """_safe_float, with inf/NaN (e.g. from user parameters) as None."""
+    v = _safe_float(x)
+    return v if v is not None and math.isfinite(v) else None
+
+
 def _get_traffic_seconds(obj):
     """
     obj: baseline/optimized dict
@@ -251,7 +797,71 @@ def _get_traffic_seconds(obj):
     return None
 
 
+def _traffic_for_candidate(best, stops):
+    """
+    Google traffic ETA for the chosen order; multi-vehicle plans get one
+    request per vehicle and the legs are summed.
+    """
+    wh_best = next(w for w in WAREHOUSES if w["id"] == best["warehouse_id"])
+    id_to_stop = {s["id"]: s for s in stops}
+    orders = [v["order"] for v in best["vehicles"]] if best.get("vehicles") else [best["order"]]
+
+    total = {"traffic_duration": 0, "duration": 0, "distance": 0}
+    for order in orders:
+        points = [{"lat": wh_best["lat"], "lng": wh_best["lng"]}] + [
+            {"lat": id_to_stop[cid]["lat"], "lng": id_to_stop[cid]["lng"]}
+            for cid in order
+        ]
+        traffic = _google_traffic_eta(points)
+        if "error" in traffic:
+            return traffic
+        for k in total:
+            total[k] += traffic[k]
+
+    return total
+
+
+def _positive(expr):
+    """NULL unless expr > 0, mirroring the `x is not None and x > 0` checks."""
+    return case((expr > 0, expr), else_=None)
+
+
+def _stats_columns():
+    """Per-route stats columns computed in the database."""
+    stops = (
+        db.session.query(Client.route_id, func.count(Client.id).label("n"))
+        .group_by(Client.route_id)
+        .subquery()
+    )
+
+    columns = [
+        Route.id.label("id"),
+        Route.name.label("name"),
+        Route.is_deleted.label("is_deleted"),
+        Route.deleted_at.label("deleted_at"),
+        func.coalesce(stops.c.n, 0).label("stops"),
+        Route.baseline_distance.isnot(None).label("has_baseline"),
+        Route.optimized_distance.isnot(None).label("has_optimized"),
+        Route.baseline_distance.label("bd"),
+        Route.optimized_distance.label("od"),
+        Route.baseline_time.label("bt"),
+        Route.optimized_time.label("ot"),
+    ]
+    return columns, stops
+
+
+STATS_SORTS = {
+    "id": Route.id.asc(),
+    "created_at": Route.created_at.desc(),
+    "time_saved": (Route.baseline_time - Route.optimized_time).desc().nulls_last(),
+    "distance_saved": (Route.baseline_distance - Route.optimized_distance)
+    .desc()
+    .nulls_last(),
+}
+
+
 @routes_bp.get("/stats")
+@query_budget(2)
 @jwt_required()
 def routes_stats():
     uid = get_jwt_identity()
@@ -259,74 +869,84 @@ def routes_stats():
     scope = request.args.get("scope", "all").lower()
     include_deleted = scope == "all"
 
-    q = Route.query.filter_by(user_id=uid)
+    try:
+        limit = min(max(int(request.args.get("limit", 500)), 1), 1000)
+        offset = max(int(request.args.get("offset", 0)), 0)
+    except ValueError:
+        return {"error": "limit/offset must be integers"}, 400
+
+    sort = request.args.get("sort", "id")
+    if sort not in STATS_SORTS:
+        return {"error": f"sort must be one of: {', '.join(STATS_SORTS)}"}, 400
+
+    columns, stops = _stats_columns()
+    per_route = (
+        db.session.query(*columns)
+        .outerjoin(stops, stops.c.route_id == Route.id)
+        .filter(Route.user_id == uid)
+    )
     if not include_deleted:
-        q = q.filter(Route.is_deleted == False)  
-
-    routes = q.all()
+        per_route = per_route.filter(Route.is_deleted == False)  # noqa: E712
+
+    pr = per_route.subquery()
+    comparable = and_(pr.c.has_baseline, pr.c.has_optimized, pr.c.bt.isnot(None), pr.c.ot.isnot(None))
+
+    agg = db.session.query(
+        func.count(pr.c.id),
+        func.sum(case((pr.c.is_deleted == False, 1), else_=0)),  # noqa: E712
+        func.sum(case((pr.c.is_deleted == True, 1), else_=0)),  # noqa: E712
+        func.sum(pr.c.stops),
+        func.sum(_positive(pr.c.bd)),
+        func.sum(_positive(pr.c.od)),
+        func.sum(pr.c.bt),
+        func.sum(pr.c.ot),
+        func.sum(case((pr.c.has_baseline, 1), else_=0)),
+        func.sum(case((pr.c.has_optimized, 1), else_=0)),
+        func.sum(case((comparable, 1), else_=0)),
+    ).one()
 
     totals = {
-        "routes_total": len(routes),
-        "routes_active": sum(1 for r in routes if not getattr(r, "is_deleted", False)),
-        "routes_archived": sum(1 for r in routes if getattr(r, "is_deleted", False)),
-        "stops_total": sum(len(r.clients or []) for r in routes),
-        "baseline_distance_m": 0.0,
-        "optimized_distance_m": 0.0,
-        "baseline_time_s": 0.0,   
-        "optimized_time_s": 0.0,  
-        "routes_with_baseline": 0,
-        "routes_with_optimized": 0,
-        "routes_comparable": 0,
+        "routes_total": int(agg[0] or 0),
+        "routes_active": int(agg[1] or 0),
+        "routes_archived": int(agg[2] or 0),
+        "stops_total": int(agg[3] or 0),
+        "baseline_distance_m": float(agg[4] or 0.0),
+        "optimized_distance_m": float(agg[5] or 0.0),
+        "baseline_time_s": float(agg[6] or 0.0),
+        "optimized_time_s": float(agg[7] or 0.0),
+        "routes_with_baseline": int(agg[8] or 0),
+        "routes_with_optimized": int(agg[9] or 0),
+        "routes_comparable": int(agg[10] or 0),
     }
 
-    items = []
-
-    for r in routes:
-        params = r.parameters or {}
-        b = params.get("baseline") or None
-        o = params.get("optimized") or None
+    rows = (
+        per_route.order_by(STATS_SORTS[sort], Route.id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
 
-        if b:
-            totals["routes_with_baseline"] += 1
-        if o:
-            totals["routes_with_optimized"] += 1
-
-        bd = _safe_float(b.get("distance")) if b else None
-        od = _safe_float(o.get("distance")) if o else None
-
-        bt = _get_traffic_seconds(b) if b else None
-        ot = _get_traffic_seconds(o) if o else None
-
-        if bd is not None and bd > 0:
-            totals["baseline_distance_m"] += bd
-        if od is not None and od > 0:
-            totals["optimized_distance_m"] += od
-
-        if bt is not None and bt > 0:
-            totals["baseline_time_s"] += bt
-        if ot is not None and ot > 0:
-            totals["optimized_time_s"] += ot
-
-        comparable = bool(b and o and bt and ot)
-        if comparable:
-            totals["routes_comparable"] += 1
+    items = []
+    for row in rows:
+        bd = row.bd if row.has_baseline else None
+        od = row.od if row.has_optimized else None
+        bt = row.bt if row.has_baseline else None
+        ot = row.ot if row.has_optimized else None
 
         items.append(
             {
-                "id": r.id,
-                "name": r.name,
-                "is_deleted": bool(getattr(r, "is_deleted", False)),
-                "deleted_at": r.deleted_at.isoformat()
-                if getattr(r, "deleted_at", None)
-                else None,
-                "stops": len(r.clients or []),
+                "id": row.id,
+                "name": row.name,
+                "is_deleted": bool(row.is_deleted),
+                "deleted_at": row.deleted_at.isoformat() if row.deleted_at else None,
+                "stops": int(row.stops),
                 "baseline_distance_m": bd,
                 "optimized_distance_m": od,
                 "baseline_time_s": bt,
                 "optimized_time_s": ot,
-                "has_baseline": bool(b),
-                "has_optimized": bool(o),
-                "comparable": comparable,
+                "has_baseline": bool(row.has_baseline),
+                "has_optimized": bool(row.has_optimized),
+                "comparable": bool(row.has_baseline and row.has_optimized and bt and ot),
             }
         )
 
@@ -348,31 +968,103 @@ def routes_stats():
         "time_saved_s": time_saved_s,
         "time_saved_pct": _pct_saved(totals["baseline_time_s"], totals["optimized_time_s"]),
         "items": items,
+        "limit": limit,
+        "offset": offset,
+        "items_total": totals["routes_total"],
     }
 
 
+@routes_bp.get("/cache/stats")
+@query_budget(0)
+@jwt_required()
+def osrm_cache_stats():
+    return osrm_cache.stats()
+
+
 @routes_bp.get("/warehouses")
+@query_budget(0)
 @jwt_required()
 def list_warehouses():
     return {"items": WAREHOUSES}
 
 
 @routes_bp.get("/")
+@query_budget(2)
 @jwt_required()
 def list_routes():
+    """
+    Query args:
+      include_deleted=1   also list archived routes
+      limit=N, cursor=..  keyset pagination on (created_at, id), newest first;
+                          `next_cursor` is returned while more rows exist
+      fields=a,b,..       project route_to_dict to these keys
+      view=summary        compact rows (stop count, metric summaries)
+    Without limit/cursor every route is returned, as before.
+    """
     uid = get_jwt_identity()
 
     include_deleted = request.args.get("include_deleted", "0") == "1"
+    view = request.args.get("view", "full").lower()
+
+    fields = None
+    if request.args.get("fields"):
+        fields = {f.strip() for f in request.args["fields"].split(",") if f.strip()}
+        unknown = fields - set(ROUTE_FIELDS)
+        if unknown:
+            return {"error": f"unknown fields: {', '.join(sorted(unknown))}"}, 400
 
     q = Route.query.filter_by(user_id=uid)
     if not include_deleted:
         q = q.filter(Route.is_deleted == False)  # noqa: E712
 
-    q = q.order_by(Route.created_at.desc())
-    return {"items": [route_to_dict(r) for r in q.all()]}
+    cursor = request.args.get("cursor")
+    if cursor:
+        decoded = _decode_cursor(cursor)
+        if decoded is None:
+            return {"error": "invalid cursor"}, 400
+        created_at, rid = decoded
+        q = q.filter(
+            or_(
+                Route.created_at < created_at,
+                and_(Route.created_at == created_at, Route.id < rid),
+            )
+        )
+
+    limit = None
+    if request.args.get("limit") or cursor:
+        try:
+            limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+        except ValueError:
+            return {"error": "limit must be an integer"}, 400
+
+    q = q.order_by(Route.created_at.desc(), Route.id.desc())
+
+    if view != "summary" and (fields is None or "clients" in fields):
+        q = q.options(selectinload(Route.clients))
+
+    rows = q.limit(limit + 1).all() if limit else q.all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1])
+
+    if view == "summary":
+        counts = dict(
+            db.session.query(Client.route_id, func.count(Client.id))
+            .filter(Client.route_id.in_([r.id for r in rows]))
+            .group_by(Client.route_id)
+            .all()
+        ) if rows else {}
+        items = [route_summary(r, counts.get(r.id, 0)) for r in rows]
+    else:
+        items = [route_to_dict(r, fields) for r in rows]
+
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @routes_bp.post("/")
+@query_budget(4)
 @jwt_required()
 def create_route():
     uid = get_jwt_identity()
@@ -385,26 +1077,80 @@ def create_route():
         return {"error": "name is required"}, 400
 
     r = Route(name=name, parameters=parameters, user_id=uid)
+    r.sync_metrics()
     db.session.add(r)
     db.session.flush()
 
-    for c in clients:
-        client = Client(
-            name=c.get("name", "Client"),
-            lat=float(c["lat"]),
-            lon=float(c["lon"]),
-            time_window_from=c.get("time_window_from"),
-            time_window_to=c.get("time_window_to"),
-            demand=c.get("demand"),
-            route_id=r.id,
-        )
-        db.session.add(client)
+    rows = [_client_row(c, r.id) for c in clients]
+    if rows:
+        db.session.execute(insert(Client), rows)
 
     db.session.commit()
     return route_to_dict(r), 201
 
 
+CLIENT_COLUMNS = ("name", "lat", "lon", "time_window_from", "time_window_to", "demand")
+
+
+def _client_row(c, route_id):
+    return {
+        "name": c.get("name", "Client"),
+        "lat": float(c["lat"]),
+        "lon": float(c["lon"]),
+        "time_window_from": c.get("time_window_from"),
+        "time_window_to": c.get("time_window_to"),
+        "demand": c.get("demand"),
+        "route_id": route_id,
+    }
+
+
+def _sync_clients(r, incoming):
+    """
+    Diffs `incoming` against the stored clients of `r` by id and applies
+    the result as batched INSERT / UPDATE / DELETE statements. Unchanged
+    rows are not touched, so their ids (and any stored optimized.order)
+    stay valid. Clients without a known id are inserted.
+    """
+    existing = {
+        row.id: row
+        for row in db.session.query(Client.id, *[getattr(Client, k) for k in CLIENT_COLUMNS])
+        .filter(Client.route_id == r.id)
+        .all()
+    }
+
+    inserts = []
+    updates = []
+    keep = set()
+    for c in incoming:
+        row = _client_row(c, r.id)
+        cid = c.get("id")
+        old = existing.get(cid) if cid is not None else None
+
+        if old is None:
+            inserts.append(row)
+            continue
+
+        keep.add(old.id)
+        if any(getattr(old, k) != row[k] for k in CLIENT_COLUMNS):
+            updates.append({"id": old.id, **{k: row[k] for k in CLIENT_COLUMNS}})
+
+    deletes = [cid for cid in existing if cid not in keep]
+
+    if deletes:
+        db.session.execute(
+            delete(Client).where(Client.id.in_(deletes)),
+            execution_options={"synchronize_session": False},
+        )
+    if updates:
+        db.session.execute(update(Client), updates)
+    if inserts:
+        db.session.execute(insert(Client), inserts)
+
+    db.session.expire(r, ["clients"])
+
+
 @routes_bp.put("/<int:route_id>")
+@query_budget(8)
 @jwt_required()
 def update_route(route_id):
     uid = get_jwt_identity()
@@ -420,28 +1166,17 @@ def update_route(route_id):
         r.name = (data.get("name") or r.name).strip()
     if "parameters" in data:
         r.parameters = data.get("parameters") or r.parameters
+        r.sync_metrics()
 
     if "clients" in data:
-        for c in r.clients:
-            db.session.delete(c)
-        for c in data["clients"] or []:
-            db.session.add(
-                Client(
-                    name=c.get("name", "Client"),
-                    lat=float(c["lat"]),
-                    lon=float(c["lon"]),
-                    time_window_from=c.get("time_window_from"),
-                    time_window_to=c.get("time_window_to"),
-                    demand=c.get("demand"),
-                    route_id=r.id,
-                )
-            )
+        _sync_clients(r, data["clients"] or [])
 
     db.session.commit()
     return route_to_dict(r)
 
 
 @routes_bp.delete("/<int:route_id>")
+@query_budget(2)
 @jwt_required()
 def delete_route(route_id):
     uid = get_jwt_identity()
@@ -460,6 +1195,7 @@ def delete_route(route_id):
 
 
 @routes_bp.delete("/<int:route_id>/permanent")
+@query_budget(8)
 @jwt_required()
 def delete_route_permanently(route_id):
     uid = get_jwt_identity()
@@ -470,11 +1206,14 @@ def delete_route_permanently(route_id):
     if not getattr(r, "is_deleted", False):
         return {"error": "route must be archived before permanent delete"}, 400
 
+    # jobs.route_id cascades in the database too; SQLite does not enforce it
+    Job.query.filter_by(route_id=r.id).delete(synchronize_session=False)
     db.session.delete(r)
     db.session.commit()
     return {"message": "permanently deleted"}
 
 @routes_bp.post("/<int:route_id>/clients")
+@query_budget(16)
 @jwt_required()
 def add_client(route_id):
     uid = get_jwt_identity()
@@ -493,17 +1232,22 @@ def add_client(route_id):
     if lat is None or lon is None:
         return {"error": "lat/lon required"}, 400
 
+    old_stops = _route_stops(r)
     c = Client(name=name, lat=float(lat), lon=float(lon), route_id=r.id)
     db.session.add(c)
     db.session.commit()
 
+    reoptimized = _reoptimize_incremental(r, old_stops, old_stops + _client_stops([c]))
+
     return {
         "message": "client added",
         "client": {"id": c.id, "name": c.name, "lat": c.lat, "lon": c.lon},
+        "reoptimized": reoptimized,
     }, 201
 
 
 @routes_bp.delete("/<int:route_id>/clients/<int:client_id>")
+@query_budget(15)
 @jwt_required()
 def delete_client(route_id, client_id):
     uid = get_jwt_identity()
@@ -516,12 +1260,129 @@ def delete_client(route_id, client_id):
     if getattr(c.route, "is_deleted", False):
         return {"error": "route is archived"}, 400
 
+    r = c.route
+    old_stops = _route_stops(r)
     db.session.delete(c)
     db.session.commit()
-    return {"message": "deleted"}
+
+    reoptimized = _reoptimize_incremental(
+        r, old_stops, [s for s in old_stops if s["id"] != client_id]
+    )
+    return {"message": "deleted", "reoptimized": reoptimized}
+
+
+def _insert_row_col(matrix, k, row, col):
+    """Square nested list with a new point at index k (row/col include k)."""
+    out = [r[:k] + [c] + r[k:] for r, c in zip(matrix, col[:k] + col[k + 1 :])]
+    out.insert(k, list(row))
+    return out
+
+
+def _drop_row_col(matrix, k):
+    return [r[:k] + r[k + 1 :] for i, r in enumerate(matrix) if i != k]
+
+
+def _reoptimize_incremental(r, old_stops, stops):
+    """
+    Updates parameters["optimized"] after one stop was added or removed,
+    instead of a full /optimize: the stored matrices of `old_stops` get
+    one new row/column (or lose one), the stop is spliced into (or out of)
+    the current order and the path gets a short local-search polish.
+    Returns True if the stored result was updated. Multi-vehicle plans,
+    estimated results and uploaded matrices still need a full /optimize.
+    """
+    best = (r.parameters or {}).get("optimized")
+    if not best or best.get("vehicles") or best.get("estimated"):
+        return False
+    if best.get("cost_metric") == "distance" or not stops:
+        return False
+
+    if _vrp_settings(r.parameters, stops) is not None:
+        return False
+
+    w = len(WAREHOUSES)
+    depots = [{"lat": wh["lat"], "lng": wh["lng"]} for wh in WAREHOUSES]
+    old_points = depots + [{"lat": s["lat"], "lng": s["lng"]} for s in old_stops]
+    new_points = depots + [{"lat": s["lat"], "lng": s["lng"]} for s in stops]
+
+    old_ids = [s["id"] for s in old_stops]
+    new_ids = [s["id"] for s in stops]
+    added = [i for i in new_ids if i not in set(old_ids)]
+    removed = [i for i in old_ids if i not in set(new_ids)]
+    if len(added) + len(removed) != 1:
+        return False
+
+    try:
+        stored, source = load_route_matrices(
+            r.id, old_points, max_osrm_age=current_app.config.get("OSRM_CACHE_TTL")
+        )
+        if source != "osrm" or "duration" not in stored or "distance" not in stored:
+            return False
+
+        durations, distances = stored["duration"], stored["distance"]
+        if added:
+            k = w + new_ids.index(added[0])
+            rc = _osrm_row_col(new_points, k)
+            durations = _insert_row_col(durations, k, *rc["durations"])
+            distances = _insert_row_col(distances, k, *rc["distances"])
+        else:
+            k = w + old_ids.index(removed[0])
+            durations = _drop_row_col(durations, k)
+            distances = _drop_row_col(distances, k)
+
+        wh_index = next(i for i, wh in enumerate(WAREHOUSES) if wh["id"] == best["warehouse_id"])
+        idx = [wh_index] + list(range(w, w + len(stops)))
+        sub_durations = _submatrix(durations, idx)
+        sub_distances = _submatrix(distances, idx)
+
+        node_of = {cid: i + 1 for i, cid in enumerate(new_ids)}
+        order = [0] + [node_of[cid] for cid in best["order"] if cid in node_of]
+        if added:
+            order = cheapest_insertion(sub_durations, order, node_of[added[0]])
+        if sorted(order) != list(range(len(stops) + 1)):
+            return False
+
+        with span("solve"):
+            order = improve_open_path(
+                sub_durations,
+                order,
+                time_limit=float(current_app.config.get("INCREMENTAL_TIME_LIMIT", 1)),
+            )
+        duration = _order_cost(order, sub_durations)
+        distance = _order_cost(order, sub_distances)
+        if duration == float("inf") or distance == float("inf"):
+            return False
+
+        for kind, matrix in (("duration", durations), ("distance", distances)):
+            save_route_matrix(r.id, kind, matrix, new_points, "osrm", keep_uploads=True)
+
+        updated = dict(best)
+        updated.update(
+            {
+                "order": [new_ids[i - 1] for i in order[1:]],
+                "distance": distance,
+                "duration": duration,
+                "matrix_source": "osrm",
+                "incremental": True,
+            }
+        )
+        # the Google ETA of the new order is a slow external request; a
+        # background "traffic" job fills it in (_run_traffic_job)
+        _store_optimized(r, updated, None)
+        db.session.commit()
+    except Exception:
+        # the edit itself is already committed; a full /optimize still works
+        current_app.logger.exception("incremental re-optimization of route %s failed", r.id)
+        db.session.rollback()
+        return False
+
+    if os.getenv("GOOGLE_MAPS_API_KEY"):
+        job_runner.enqueue("traffic", r.user_id, r.id)
+    return True
 
 
 @routes_bp.post("/<int:route_id>/matrix")
+@query_budget(8)
 @jwt_required()
 def upload_distance_matrix(route_id):
     uid = get_jwt_identity()
@@ -534,49 +1395,325 @@ def upload_distance_matrix(route_id):
 
     data = request.get_json() or {}
     matrix = data.get("matrix")
+    kind = data.get("kind", "distance")
+
+    if kind not in ("distance", "duration"):
+        return {"error": "kind must be distance or duration"}, 400
 
     if not matrix or not isinstance(matrix, list):
         return {"error": "invalid matrix"}, 400
 
-    r.parameters = r.parameters or {}
-    r.parameters["distance_matrix"] = matrix
+    n = len(matrix)
+    if any(not isinstance(row, list) or len(row) != n for row in matrix):
+        return {"error": "matrix must be square"}, 400
+    if any(v is not None and not isinstance(v, (int, float)) for row in matrix for v in row):
+        return {"error": "matrix values must be numbers or null"}, 400
+
+    # rows are either WAREHOUSES followed by the clients (the layout optimize
+    # uses), or the clients only; optimize completes those with the warehouse
+    # rows/columns (_complete_upload) the first time it loads them
+    client_points = [{"lat": c.lat, "lng": c.lon} for c in r.clients]
+    if n == len(WAREHOUSES) + len(client_points):
+        points = [{"lat": wh["lat"], "lng": wh["lng"]} for wh in WAREHOUSES] + client_points
+    elif n == len(client_points):
+        points = client_points
+    else:
+        return {
+            "error": "matrix must be NxN for the route's clients or (W+N)x(W+N) "
+            "with the warehouses first"
+        }, 400
+
+    stored = save_route_matrix(r.id, kind, matrix, points, source="upload")
+
+    if r.parameters and "distance_matrix" in r.parameters:
+        del r.parameters["distance_matrix"]
     db.session.commit()
 
-    return {"message": "Matrix uploaded successfully", "route": route_to_dict(r)}
+    return {
+        "message": "Matrix uploaded successfully",
+        "matrix": stored.to_dict(),
+        "route": route_to_dict(r),
+    }
 
 
-@routes_bp.post("/<int:route_id>/baseline")
+@routes_bp.get("/<int:route_id>/matrix")
+@query_budget(2)
 @jwt_required()
-def compute_baseline(route_id):
+def get_distance_matrix(route_id):
     uid = get_jwt_identity()
     r = Route.query.filter_by(id=route_id, user_id=uid).first()
     if not r:
         return {"error": "route not found"}, 404
 
-    if getattr(r, "is_deleted", False):
-        return {"error": "route is archived"}, 400
+    kind = request.args.get("kind", "distance")
+    row = (
+        RouteMatrix.query.options(undefer(RouteMatrix.data))
+        .filter_by(route_id=r.id, kind=kind)
+        .first()
+    )
+    if not row:
+        return {"error": "matrix not found"}, 404
 
-    if not r.clients or len(r.clients) == 0:
-        return {"error": "route has no clients"}, 400
+    return {**row.to_dict(), "matrix": decode_matrix(row.data)}
 
-    wh = WAREHOUSES[0]  # baseline uses warehouse #1
-    points = [{"lat": wh["lat"], "lng": wh["lng"]}] + [
-        {"lat": float(c.lat), "lng": float(c.lon)} for c in r.clients
-    ]
 
+def _geometry_paths(r):
+    """
+    {"baseline": paths, "optimized": paths}: the stops of each drawn path
+    in order, starting at the depot; one path per vehicle. None where the
+    route has no such order yet.
+    """
+    clients = list(r.clients)
+    if not clients:
+        return {"baseline": None, "optimized": None}
+
+    def point(p):
+        return {"lat": float(p["lat"]), "lng": float(p["lng"])}
+
+    by_id = {c.id: point({"lat": c.lat, "lng": c.lon}) for c in clients}
+    paths = {
+        "baseline": [[point(WAREHOUSES[0])] + [by_id[c.id] for c in clients]],
+        "optimized": None,
+    }
+
+    opt = (r.parameters or {}).get("optimized") or {}
+    wh = next((w for w in WAREHOUSES if w["id"] == opt.get("warehouse_id")), None)
+    if wh is not None and opt.get("order"):
+        orders = [v.get("order") or [] for v in opt.get("vehicles") or []] or [opt["order"]]
+        paths["optimized"] = [
+            [point(wh)] + [by_id[cid] for cid in order if cid in by_id]
+            for order in orders
+        ]
+    return paths
+
+
+def _paths_hash(paths):
+    return hashlib.sha1("|".join(points_hash(p) for p in paths).encode()).hexdigest()
+
+
+def _geometry_level(zoom):
+    """
+    Stored level serving `zoom`: the coarsest one that is at least as
+    detailed. None (full detail) past the last level or without a zoom.
+    """
+    if zoom is None:
+        return None
+    for level in sorted(current_app.config.get("GEOMETRY_ZOOM_LEVELS", ())):
+        if level >= zoom:
+            return level
+    return None
+
+
+def _simplified(polylines, level):
+    tolerance = float(current_app.config.get("GEOMETRY_TOLERANCE_PX", 1.0))
+    return [simplify_levels(decode_polyline(p), [level], tolerance)[level] for p in polylines]
+
+
+def _fetch_geometry(paths):
+    """
+    Road geometry for `paths` from the routing backend, encoded and
+    simplified for every GEOMETRY_ZOOM_LEVELS entry. While the upstream is
+    down (DEGRADED_MODE), straight lines between the stops, marked estimated.
+    """
+    zooms = current_app.config.get("GEOMETRY_ZOOM_LEVELS", ())
+    tolerance = float(current_app.config.get("GEOMETRY_TOLERANCE_PX", 1.0))
+
+    result = {"paths": [], "levels": {str(z): [] for z in zooms}, "distance": 0.0,
+              "duration": 0.0}
+    for points in paths:
+        try:
+            route = _osrm_route_metrics(points, profile="driving", geometry=True)
+        except requests.RequestException:
+            if not current_app.config.get("DEGRADED_MODE", True):
+                raise
+            route = estimate_route_metrics(points, **_estimate_settings())
+            route["geometry"] = _line_string(points)
+            result["estimated"] = True
+
+        coords = [(lat, lon) for lon, lat in route["geometry"]["coordinates"]]
+        result["paths"].append(encode_polyline(coords))
+        for zoom, polyline in simplify_levels(coords, zooms, tolerance).items():
+            result["levels"][str(zoom)].append(polyline)
+        result["distance"] += route["distance"]
+        result["duration"] += route["duration"]
+    return result
+
+
+def _cached_response(body, etag, max_age):
+    """
+    Per-user data, so private; an ETag lets the browser revalidate with
+    If-None-Match. `body` None is the 304 for a matching ETag. max_age 0
+    revalidates every time: the URL stays the same when the order changes.
+    """
+    resp = make_response(body if body is not None else ("", 304))
+    resp.cache_control.private = True
+    if etag is None:
+        resp.cache_control.no_store = True
+        return resp
+    resp.set_etag(etag)
+    if max_age > 0:
+        resp.cache_control.max_age = max_age
+    else:
+        resp.cache_control.no_cache = True
+    return resp
+
+
+@routes_bp.get("/<int:route_id>/geometry")
+@query_budget(5)
+@jwt_required()
+def get_route_geometry(route_id):
+    """
+    Query args:
+      zoom=0..22   map zoom to simplify for; omit for full detail
+    Road path of the baseline and optimized order as encoded polylines
+    (precision 5, one per vehicle). Fetched from the routing backend once
+    per order and stored with its Douglas-Peucker levels, so showing a
+    route needs no routing call; a matching If-None-Match is a 304 without
+    reading the stored paths.
+    """
+    uid = get_jwt_identity()
+    r = (
+        Route.query.options(selectinload(Route.clients))
+        .filter_by(id=route_id, user_id=uid)
+        .first()
+    )
+    if not r:
+        return {"error": "route not found"}, 404
+
+    zoom = request.args.get("zoom")
+    if zoom is not None:
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            zoom = -1
+        if not 0 <= zoom <= 22:
+            return {"error": "zoom must be an integer between 0 and 22"}, 400
+
+    level = _geometry_level(zoom)
+    max_age = int(current_app.config.get("GEOMETRY_MAX_AGE", 0))
+    paths = _geometry_paths(r)
+    hashes = {kind: _paths_hash(p) for kind, p in paths.items() if p}
+    etag = hashlib.sha1(json.dumps([hashes, level], sort_keys=True).encode()).hexdigest()
+    if etag in request.if_none_match:
+        return _cached_response(None, etag, max_age)
+
+    column = RouteGeometry.paths if level is None else RouteGeometry.levels
+    stored = {
+        g.kind: g
+        for g in RouteGeometry.query.options(undefer(column)).filter_by(route_id=r.id).all()
+    }
+
+    body = {"route_id": r.id, "zoom": level, "baseline": None, "optimized": None}
+    estimated = False
+    changed = False
     try:
-        metrics = _osrm_route_metrics(points, profile="driving", timeout=12)
+        for kind, h in hashes.items():
+            row = stored.get(kind)
+            if row is not None and row.points_hash == h:
+                if level is None:
+                    polylines = row.paths
+                else:
+                    # GEOMETRY_ZOOM_LEVELS changed since the row was stored
+                    polylines = row.levels.get(str(level)) or _simplified(row.paths, level)
+                body[kind] = {"paths": polylines, "distance": row.distance,
+                              "duration": row.duration}
+                continue
+
+            fetched = _fetch_geometry(paths[kind])
+            polylines = fetched["paths"] if level is None else fetched["levels"][str(level)]
+            body[kind] = {"paths": polylines, "distance": fetched["distance"],
+                          "duration": fetched["duration"]}
+            if fetched.get("estimated"):
+                # straight lines: not stored, and not cached by the browser
+                body[kind]["estimated"] = True
+                estimated = True
+                continue
+
+            if row is None:
+                row = RouteGeometry(route_id=r.id, kind=kind)
+                db.session.add(row)
+            row.points_hash = h
+            row.paths = fetched["paths"]
+            row.levels = fetched["levels"]
+            row.distance = fetched["distance"]
+            row.duration = fetched["duration"]
+            row.created_at = datetime.now(timezone.utc)
+            changed = True
     except requests.RequestException as e:
         return {"error": f"OSRM request failed: {str(e)}"}, 502
     except Exception as e:
-        return {"error": f"Baseline computation failed: {str(e)}"}, 500
+        return {"error": f"Geometry failed: {str(e)}"}, 500
+
+    if changed:
+        # only a cache: a concurrent request that stored it first is fine
+        try:
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+
+    return _cached_response(body, None if estimated else etag, max_age)
+
+
+def _check_computable(r):
+    """Returns None if baseline/optimize can run on `r`, else (error_body, status_code)."""
+    if not r:
+        return {"error": "route not found"}, 404
+
+    if getattr(r, "is_deleted", False):
+        return {"error": "route is archived"}, 400
+
+    if not r.clients or len(r.clients) == 0:
+        return {"error": "route has no clients"}, 400
+
+    return None
+
+
+def _route_for_compute(route_id, uid):
+    """
+    Loads a route that baseline/optimize can run on.
+    Returns (route, None) or (None, (error_body, status_code)).
+    """
+    r = Route.query.filter_by(id=route_id, user_id=uid).first()
+    err = _check_computable(r)
+    if err:
+        return None, err
+    return r, None
 
-    traffic = None
-    try:
-        traffic = _google_traffic_eta(points, timeout=12)
-    except Exception as e:
-        traffic = {"error": str(e)}
 
+def _wants_async():
+    return request.args.get("async", "0").lower() in ("1", "true", "yes")
+
+
+def _enqueue(kind, uid, r):
+    job = job_runner.enqueue(kind, user_id=int(uid), route_id=r.id)
+    return {"message": "queued", "job": job.to_dict()}, 202
+
+
+def _run_route_job(job):
+    r, err = _route_for_compute(job.route_id, job.user_id)
+    if err:
+        return err
+    if job.kind == "baseline":
+        return _baseline(r)
+    return _optimize(r)
+
+
+@routes_bp.post("/<int:route_id>/baseline")
+@query_budget(7)
+@jwt_required()
+def compute_baseline(route_id):
+    uid = get_jwt_identity()
+    r, err = _route_for_compute(route_id, uid)
+    if err:
+        return err
+
+    if _wants_async():
+        return _enqueue("baseline", uid, r)
+
+    return _baseline(r)
+
+
+def _store_baseline(r, wh, metrics, traffic, estimated=False, defer=True):
     r.parameters = r.parameters or {}
     r.parameters["baseline"] = {
         "warehouse_id": wh["id"],
@@ -586,88 +1723,669 @@ def compute_baseline(route_id):
         "traffic": traffic,
         "traffic_updated_at": datetime.now(timezone.utc).isoformat(),
     }
+    if estimated:
+        # recomputed from OSRM once the upstream recovers
+        r.parameters["baseline"]["estimated"] = True
+        if defer:
+            job_runner.defer("baseline", r.user_id, r.id)
+    r.sync_metrics()
+
 
+def _baseline(r):
+    wh = WAREHOUSES[0]  # baseline uses warehouse #1
+    points = [{"lat": wh["lat"], "lng": wh["lng"]}] + [
+        {"lat": float(c.lat), "lng": float(c.lon)} for c in r.clients
+    ]
+
+    try:
+        metrics, estimated = _route_metrics_or_estimate(points)
+    except requests.RequestException as e:
+        return {"error": f"OSRM request failed: {str(e)}"}, 502
+    except Exception as e:
+        return {"error": f"Baseline computation failed: {str(e)}"}, 500
+
+    _store_baseline(r, wh, metrics, _safe_traffic(_google_traffic_eta, points), estimated)
     db.session.commit()
-    return {"message": "baseline computed", "route": route_to_dict(r)}
+    return {"message": "baseline computed", "route": route_to_dict(r)}, 200
 
 
 @routes_bp.post("/<int:route_id>/optimize")
+@query_budget(14)
 @jwt_required()
 def optimize_route(route_id):
     uid = get_jwt_identity()
-    r = Route.query.filter_by(id=route_id, user_id=uid).first()
-    if not r:
-        return {"error": "route not found"}, 404
+    r, err = _route_for_compute(route_id, uid)
+    if err:
+        return err
 
-    if getattr(r, "is_deleted", False):
-        return {"error": "route is archived"}, 400
+    if _wants_async():
+        return _enqueue("optimize", uid, r)
+
+    return _optimize(r)
 
-    if not r.clients or len(r.clients) == 0:
-        return {"error": "route has no clients"}, 400
 
-    stops = [{"id": c.id, "lat": float(c.lat), "lng": float(c.lon)} for c in r.clients]
+def _route_stops(r):
+    return _client_stops(r.clients)
+
+
+def _client_stops(clients):
+    return [
+        {
+            "id": c.id,
+            "lat": float(c.lat),
+            "lng": float(c.lon),
+            "demand": c.demand,
+            "tw_from": parse_clock(c.time_window_from),
+            "tw_to": parse_clock(c.time_window_to),
+        }
+        for c in clients
+    ]
+
+
+@timed("solve")
+def _solve_candidates(stops, durations, distances, vrp=None, max_workers=1, time_limit=None):
+    """
+    durations/distances: (W+N)x(W+N), WAREHOUSES first, then `stops`.
+    Evaluates every depot and reduces to the best candidate.
+    Returns (best, None) or (None, (error_body, status_code)).
+    Top-level and free of Flask state so batch solves can run in a
+    process pool.
+    """
+    results = _evaluate_warehouses(
+        stops,
+        durations,
+        distances,
+        max_workers=max_workers,
+        time_limit=time_limit,
+        vrp=vrp,
+    )
 
     best = None
+    errors = []
+    for wh, candidate, err in results:
+        if err is not None:
+            errors.append((wh, err))
+            continue
+        if best is None or _candidate_key(candidate) < _candidate_key(best):
+            best = candidate
 
-    for wh in WAREHOUSES:
-        points = [{"lat": wh["lat"], "lng": wh["lng"]}] + [
-            {"lat": s["lat"], "lng": s["lng"]} for s in stops
+    if best is None:
+        # every depot failed: report the first failure in WAREHOUSES order
+        _, err = errors[0]
+        return None, err
+
+    if errors:
+        best["warehouse_errors"] = [
+            {"warehouse_id": wh["id"], "error": body["error"]}
+            for wh, (body, _) in errors
         ]
 
+    return best, None
+
+
+def _safe_traffic(fn, *args):
+    """Google ETA failures never fail the computation itself."""
+    try:
+        return fn(*args)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _store_optimized(r, best, traffic, defer=True):
+    best["traffic"] = traffic
+    best["traffic_updated_at"] = (
+        datetime.now(timezone.utc).isoformat() if traffic is not None else None
+    )
+    if best.get("estimated") and defer:
+        # recomputed from OSRM once the upstream recovers
+        job_runner.defer("optimize", r.user_id, r.id)
+
+    r.parameters = r.parameters or {}
+    r.parameters["optimized"] = best
+    r.sync_metrics()
+
+
+def _optimization_matrices(r, points, vrp):
+    """
+    Stored (uploaded or previously fetched) matrices matching `points`, else
+    one OSRM table (or, while OSRM is down, a haversine estimate).
+    Returns (durations, distances, source, cost_metric, fetched); `fetched`
+    tables are for _store_fetched_matrices. An uploaded distance-only
+    matrix is used as the cost for single-path optimization.
+    """
+    max_age = current_app.config.get("OSRM_CACHE_TTL")
+    stored, source = load_route_matrices(
+        r.id, points, max_osrm_age=max_age, depots=len(WAREHOUSES), complete=_complete_upload
+    )
+    chosen = _stored_choice(stored, source, distance_cost=vrp is None)
+    if chosen is not None:
+        return chosen
+
+    matrices, estimated = _matrices_or_estimate(points)
+    if estimated:
+        return matrices["durations"], matrices["distances"], "estimate", "duration", False
+
+    return matrices["durations"], matrices["distances"], "osrm", "duration", True
+
+
+def _complete_upload(points, kind, matrix):
+    """
+    A client-only (NxN) upload extended to `points` (WAREHOUSES first):
+    only the warehouse rows/columns are fetched (_osrm_row_col), not a
+    full table. Returns (matrix, final), final=False when
+    those legs had to be estimated, or None when they are unavailable.
+    """
+    w = len(WAREHOUSES)
+    full = [[None] * len(points) for _ in points]
+    for i, row in enumerate(matrix):
+        full[w + i][w:] = row
+
+    key = f"{kind}s"
+    try:
+        for k in range(w):
+            row, col = _osrm_row_col(points, k, annotations=(kind,))[key]
+            full[k] = list(row)
+            for j, v in enumerate(col):
+                full[j][k] = v
+        return full, True
+    except requests.RequestException:
+        if not current_app.config.get("DEGRADED_MODE", True):
+            return None
+
+    estimate = estimate_matrices(points, **_estimate_settings())[key]
+    for k in range(w):
+        full[k] = list(estimate[k])
+        for j in range(len(points)):
+            full[j][k] = estimate[j][k]
+    return full, False
+
+
+def _stored_choice(stored, source, distance_cost):
+    """
+    _optimization_matrices' result from stored {kind: matrix}, or None if
+    they are not usable; distance_cost allows a distance-only upload.
+    """
+    if "duration" in stored and "distance" in stored:
+        return stored["duration"], stored["distance"], source, "duration", False
+    if "distance" in stored and distance_cost:
+        return stored["distance"], stored["distance"], source, "distance", False
+    return None
+
+
+def _store_fetched_matrices(fetched):
+    """
+    Keeps fetched OSRM tables, [(route_id, points, durations, distances)],
+    in their own short transaction, after the results themselves are
+    committed. The tables are only a cache: a concurrent request that
+    stored them first, or a busy database, is not an error for the request.
+    """
+    if not fetched:
+        return
+    try:
+        save_route_matrices(
+            [
+                (route_id, kind, matrix, points)
+                for route_id, points, durations, distances in fetched
+                for kind, matrix in (("duration", durations), ("distance", distances))
+            ],
+            "osrm",
+            keep_uploads=True,
+        )
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+
+
+def _mark_source(best, source, cost_metric):
+    best["matrix_source"] = source
+    if source == "estimate":
+        best["estimated"] = True
+    if cost_metric == "distance":
+        # optimized on an uploaded distance matrix: no duration is known
+        best["duration"] = None
+        best["cost_metric"] = "distance"
+
+
+def _optimize(r):
+    stops = _route_stops(r)
+    vrp = _vrp_settings(r.parameters, stops)
+
+    # one (W+N)x(W+N) matrix for all depots; candidates are costed locally
+    points = _matrix_points(stops)
+
+    try:
+        durations, distances, source, cost_metric, fetched = _optimization_matrices(
+            r, points, vrp
+        )
+    except requests.RequestException as e:
+        return {"error": f"OSRM table failed: {str(e)}"}, 502
+    except Exception as e:
+        return {"error": f"Optimization failed: {str(e)}"}, 500
+
+    best, err = _solve_candidates(
+        stops,
+        durations,
+        distances,
+        vrp=vrp,
+        max_workers=int(current_app.config.get("OPTIMIZE_MAX_WORKERS", 4)),
+        time_limit=current_app.config.get("OPTIMIZE_TIME_LIMIT"),
+    )
+    if err:
+        return err
+
+    _mark_source(best, source, cost_metric)
+    _store_optimized(r, best, _safe_traffic(_traffic_for_candidate, best, stops))
+    db.session.commit()
+
+    body = {"message": "optimized", "route": route_to_dict(r)}
+    if fetched:
+        _store_fetched_matrices([(r.id, points, durations, distances)])
+    return body, 200
+
+
+def _run_traffic_job(job):
+    """Google ETA for the route's current optimized order."""
+    r, err = _route_for_compute(job.route_id, job.user_id)
+    if err:
+        return err
+
+    best = (r.parameters or {}).get("optimized")
+    if not best:
+        return {"error": "route is not optimized"}, 400
+
+    best = dict(best)
+    _store_optimized(r, best, _safe_traffic(_traffic_for_candidate, best, _route_stops(r)))
+    db.session.commit()
+    return {"message": "traffic updated", "route": route_to_dict(r)}, 200
+
+
+def _release_deferred(host):
+    # results are only estimated (and deferred) after an OSRM request failed,
+    # whether or not that opened its circuit, so any later OSRM answer
+    # releases them; the offline router raises instead of estimating
+    if job_runner.has_deferred and host == urlsplit(OSRM_BASE).hostname:
+        job_runner.release_deferred()
+
+
+job_runner.register("baseline", _run_route_job)
+job_runner.register("optimize", _run_route_job)
+job_runner.register("traffic", _run_traffic_job)
+http_client.on_success(_release_deferred)
+
+
+@routes_bp.get("/jobs/<job_id>")
+@query_budget(1)
+@jwt_required()
+def get_job(job_id):
+    uid = get_jwt_identity()
+    job = Job.query.filter_by(id=job_id, user_id=int(uid)).first()
+    if not job:
+        return {"error": "job not found"}, 404
+
+    return job.to_dict()
+
+
+_batch_pool = None
+_batch_pool_pid = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool(processes):
+    """Per-process solver pool; spawned children never inherit our threads."""
+    global _batch_pool, _batch_pool_pid
+
+    pid = os.getpid()
+    if _batch_pool is None or _batch_pool_pid != pid:
+        with _batch_pool_lock:
+            if _batch_pool is None or _batch_pool_pid != pid:
+                _batch_pool = ProcessPoolExecutor(
+                    max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+                )
+                _batch_pool_pid = pid
+    return _batch_pool
+
+
+def _reset_batch_pool(pool):
+    """Drops a broken pool (a child crashed or was killed); the next batch starts a new one."""
+    global _batch_pool
+
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _solve_batch(jobs, processes):
+    """
+    _solve_candidates for every job, on the process pool when it pays off.
+    A job whose child process failed fails on its own as
+    (None, (error_body, 500)); the rest of the batch is unaffected.
+    """
+    if processes <= 1 or len(jobs) <= 1:
+        return [_solve_candidates(*j) for j in jobs]
+
+    pool = _get_batch_pool(processes)
+    try:
+        futures = [pool.submit(_solve_candidates, *j) for j in jobs]
+    except BrokenProcessPool:
+        _reset_batch_pool(pool)
+        pool = _get_batch_pool(processes)
+        futures = [pool.submit(_solve_candidates, *j) for j in jobs]
+
+    solved = []
+    broken = False
+    for f in futures:
         try:
-            durations = _osrm_table(points, profile="driving", timeout=12)
-        except requests.RequestException as e:
-            return {"error": f"OSRM table failed: {str(e)}"}, 502
+            solved.append(f.result())
+        except BrokenProcessPool as e:
+            broken = True
+            solved.append((None, ({"error": f"solver process failed: {str(e)}"}, 500)))
         except Exception as e:
-            return {"error": f"Optimization failed: {str(e)}"}, 500
+            solved.append((None, ({"error": f"Optimization failed: {str(e)}"}, 500)))
 
-        order_nodes = _nearest_neighbor_order(durations)
-        order_nodes = _two_opt(order_nodes, durations)
+    if broken:
+        _reset_batch_pool(pool)
+    return solved
 
-        ordered_client_ids = [stops[i - 1]["id"] for i in order_nodes if i != 0]
 
-        id_to_stop = {s["id"]: s for s in stops}
-        ordered_stops = [id_to_stop[cid] for cid in ordered_client_ids]
+def _batch_routes(uid):
+    """
+    Parses {"route_ids": [...]} and loads the user's routes in one query.
+    Returns (routes, failures, None) or (None, None, (error_body, status_code)).
+    """
+    data = request.get_json() or {}
+    ids = data.get("route_ids")
+    if not isinstance(ids, list) or not ids:
+        return None, None, ({"error": "route_ids must be a non-empty list"}, 400)
+
+    try:
+        ids = list(dict.fromkeys(int(i) for i in ids))
+    except (TypeError, ValueError):
+        return None, None, ({"error": "route_ids must be integers"}, 400)
+
+    limit = int(current_app.config.get("BATCH_MAX_ROUTES", 200))
+    if len(ids) > limit:
+        return None, None, ({"error": f"at most {limit} routes per batch"}, 400)
+
+    found = {
+        r.id: r
+        for r in Route.query.options(selectinload(Route.clients))
+        .filter(Route.user_id == uid, Route.id.in_(ids))
+        .all()
+    }
+
+    routes = []
+    failures = []
+    for rid in ids:
+        r = found.get(rid)
+        err = _check_computable(r)
+        if err:
+            body, code = err
+            failures.append({"route_id": rid, "status": code, "error": body["error"]})
+        else:
+            routes.append(r)
+
+    return routes, failures, None
+
+
+def _reload_routes(ids):
+    """Refreshes routes expired by a commit, with their clients, in two queries."""
+    if ids:
+        Route.query.options(selectinload(Route.clients)).filter(Route.id.in_(ids)).all()
 
-        ordered_points = [{"lat": wh["lat"], "lng": wh["lng"]}] + [
-            {"lat": s["lat"], "lng": s["lng"]} for s in ordered_stops
-        ]
 
+def _matrix_points(stops):
+    """WAREHOUSES, then `stops`: the rows/columns of a route's matrices."""
+    return [{"lat": wh["lat"], "lng": wh["lng"]} for wh in WAREHOUSES] + [
+        {"lat": s["lat"], "lng": s["lng"]} for s in stops
+    ]
+
+
+def _point_groups(stop_lists, limit):
+    """
+    Packs routes, in order, into groups whose deduplicated stops plus
+    WAREHOUSES fit one OSRM table of `limit` coordinates, so no cells
+    between far-apart groups are requested; a route larger than that is a
+    group of its own (and tiled).
+    Returns [(points, {position in stop_lists: indices})]: points start
+    with WAREHOUSES and each index list is [0..W-1] + the point index of
+    every stop.
+    """
+    w = len(WAREHOUSES)
+    groups = []
+    points = None
+    for pos, stops in enumerate(stop_lists):
+        keys = [(round(s["lat"], 6), round(s["lng"], 6)) for s in stops]
+        if points is not None and len(points) + len(set(keys) - seen.keys()) > limit:
+            points = None
+        if points is None:
+            points = [{"lat": wh["lat"], "lng": wh["lng"]} for wh in WAREHOUSES]
+            seen = {}
+            members = {}
+            groups.append((points, members))
+
+        idx = list(range(w))
+        for key, s in zip(keys, stops):
+            if key not in seen:
+                seen[key] = len(points)
+                points.append({"lat": s["lat"], "lng": s["lng"]})
+            idx.append(seen[key])
+        members[pos] = idx
+
+    return groups
+
+
+def _batch_matrices(routes, stop_lists, distance_cost):
+    """
+    _optimization_matrices for a batch: stored matrices for all routes in
+    two queries, the rest from one OSRM table per _point_groups group.
+    distance_cost[i] lets route i use a distance-only upload as its cost.
+    Returns, per route, (matrices, None) with matrices shaped like
+    _optimization_matrices' result, or (None, (error_body, status_code))
+    when its group's table failed.
+    """
+    if not routes:
+        return []
+
+    stored = load_route_matrices_many(
+        {r.id: _matrix_points(stops) for r, stops in zip(routes, stop_lists)},
+        max_osrm_age=current_app.config.get("OSRM_CACHE_TTL"),
+        depots=len(WAREHOUSES),
+        complete=_complete_upload,
+    )
+
+    results = [None] * len(routes)
+    missing = []
+    for i, r in enumerate(routes):
+        matrices, source = stored[r.id]
+        chosen = _stored_choice(matrices, source, distance_cost=distance_cost[i])
+        if chosen is not None:
+            results[i] = (chosen, None)
+        else:
+            missing.append(i)
+
+    limit = max(len(WAREHOUSES) + 1, int(current_app.config.get("OSRM_MAX_TABLE_COORDS", 100)))
+    for points, members in _point_groups([stop_lists[i] for i in missing], limit):
         try:
-            metrics = _osrm_route_metrics(ordered_points, profile="driving", timeout=12)
+            matrices, estimated = _matrices_or_estimate(points)
         except requests.RequestException as e:
-            return {"error": f"OSRM route failed: {str(e)}"}, 502
+            err = ({"error": f"OSRM table failed: {str(e)}"}, 502)
+            for pos in members:
+                results[missing[pos]] = (None, err)
+            continue
         except Exception as e:
-            return {"error": f"Optimization metrics failed: {str(e)}"}, 500
-
-        candidate = {
-            "warehouse_id": wh["id"],
-            "warehouse_name": wh["name"],
-            "order": ordered_client_ids,
-            "distance": metrics["distance"],
-            "duration": metrics["duration"],
-        }
+            err = ({"error": f"Routing table failed: {str(e)}"}, 500)
+            for pos in members:
+                results[missing[pos]] = (None, err)
+            continue
+
+        source = "estimate" if estimated else "osrm"
+        for pos, idx in members.items():
+            results[missing[pos]] = (
+                (
+                    _submatrix(matrices["durations"], idx),
+                    _submatrix(matrices["distances"], idx),
+                    source,
+                    "duration",
+                    not estimated,
+                ),
+                None,
+            )
 
-        if best is None or candidate["duration"] < best["duration"]:
-            best = candidate
+    return results
 
-    traffic = None
-    try:
-        wh_best = next(w for w in WAREHOUSES if w["id"] == best["warehouse_id"])
-        id_to_stop = {s["id"]: s for s in stops}
-        ordered_points_best = [{"lat": wh_best["lat"], "lng": wh_best["lng"]}] + [
-            {"lat": id_to_stop[cid]["lat"], "lng": id_to_stop[cid]["lng"]}
-            for cid in best["order"]
+
+def _error_result(route_id, err):
+    body, code = err
+    return {"route_id": route_id, "status": code, "error": body["error"]}
+
+
+def _batch_response(results, failures):
+    results = sorted(results + failures, key=lambda x: x["route_id"])
+    return {
+        "results": results,
+        "succeeded": sum(1 for x in results if x["status"] < 400),
+        "failed": sum(1 for x in results if x["status"] >= 400),
+    }
+
+
+@routes_bp.post("/batch/optimize")
+@query_budget(12)
+@jwt_required()
+def batch_optimize():
+    uid = get_jwt_identity()
+    routes, failures, err = _batch_routes(uid)
+    if err:
+        return err
+
+    stop_lists = [_route_stops(r) for r in routes]
+    vrps = [_vrp_settings(r.parameters, stops) for r, stops in zip(routes, stop_lists)]
+    tables = _batch_matrices(routes, stop_lists, [vrp is None for vrp in vrps])
+
+    time_limit = current_app.config.get("OPTIMIZE_TIME_LIMIT")
+    processes = int(current_app.config.get("BATCH_PROCESSES", os.cpu_count() or 1))
+
+    ready = [i for i, (table, _) in enumerate(tables) if table is not None]
+    jobs = [
+        (stop_lists[i], tables[i][0][0], tables[i][0][1], vrps[i], 1, time_limit)
+        for i in ready
+    ]
+    solved = [(None, e) for _, e in tables]
+    for i, result in zip(ready, _solve_batch(jobs, processes)):
+        solved[i] = result
+
+    done = [
+        (r, stops, best, table)
+        for r, stops, (best, _), (table, _) in zip(routes, stop_lists, solved, tables)
+        if best
+    ]
+
+    workers = max(1, int(current_app.config.get("OPTIMIZE_MAX_WORKERS", 4)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            submit(pool, _safe_traffic, _traffic_for_candidate, best, stops)
+            for _, stops, best, _ in done
         ]
-        traffic = _google_traffic_eta(ordered_points_best, timeout=12)
-    except Exception as e:
-        traffic = {"error": str(e)}
+        traffic = [f.result() for f in futures]
+
+    fetched = []
+    estimated = []
+    for (r, stops, best, table), t in zip(done, traffic):
+        durations, distances, source, cost_metric, was_fetched = table
+        _mark_source(best, source, cost_metric)
+        _store_optimized(r, best, t, defer=False)
+        if best.get("estimated"):
+            estimated.append(r.id)
+        if was_fetched:
+            fetched.append((r.id, _matrix_points(stops), durations, distances))
+    if estimated:
+        # recomputed from OSRM once the upstream recovers
+        job_runner.defer_many("optimize", int(uid), estimated)
+    ids = [r.id for r, _, _, _ in done]
+    db.session.commit()
+    _reload_routes(ids)
 
-    best["traffic"] = traffic
-    best["traffic_updated_at"] = datetime.now(timezone.utc).isoformat()
+    results = []
+    for r, (best, e) in zip(routes, solved):
+        if best:
+            results.append({"route_id": r.id, "status": 200, "route": route_to_dict(r)})
+        else:
+            results.append(_error_result(r.id, e))
 
-    r.parameters = r.parameters or {}
-    r.parameters["optimized"] = best
+    body = _batch_response(results, failures)
+    _store_fetched_matrices(fetched)
+    return body
+
+
+@routes_bp.post("/batch/baseline")
+@query_budget(12)
+@jwt_required()
+def batch_baseline():
+    uid = get_jwt_identity()
+    routes, failures, err = _batch_routes(uid)
+    if err:
+        return err
+
+    stop_lists = [_route_stops(r) for r in routes]
+    tables = _batch_matrices(routes, stop_lists, [False] * len(routes))
+
+    # baseline = warehouse #1 then clients in stored order, costed on the
+    # route's matrix instead of one /route call per route
+    wh = WAREHOUSES[0]
+    w = len(WAREHOUSES)
+    results = []
+    done = []
+    for r, stops, (table, e) in zip(routes, stop_lists, tables):
+        if table is None:
+            results.append(_error_result(r.id, e))
+            continue
+
+        durations, distances, source = table[0], table[1], table[2]
+        path = [0] + list(range(w, w + len(stops)))
+        order = list(range(len(path)))
+        metrics = {
+            "distance": _order_cost(order, _submatrix(distances, path)),
+            "duration": _order_cost(order, _submatrix(durations, path)),
+        }
+        if metrics["duration"] == float("inf") or metrics["distance"] == float("inf"):
+            results.append(
+                {"route_id": r.id, "status": 500, "error": "some stops are unreachable"}
+            )
+            continue
+        route_points = [{"lat": wh["lat"], "lng": wh["lng"]}] + [
+            {"lat": s["lat"], "lng": s["lng"]} for s in stops
+        ]
+        done.append((r, metrics, route_points, stops, table))
+
+    workers = max(1, int(current_app.config.get("OPTIMIZE_MAX_WORKERS", 4)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            submit(pool, _safe_traffic, _google_traffic_eta, points)
+            for _, _, points, _, _ in done
+        ]
+        traffic = [f.result() for f in futures]
+
+    fetched = []
+    estimated = []
+    for (r, metrics, _, stops, table), t in zip(done, traffic):
+        durations, distances, source, _, was_fetched = table
+        _store_baseline(r, wh, metrics, t, source == "estimate", defer=False)
+        results.append({"route_id": r.id, "status": 200, "route": None})
+        if source == "estimate":
+            estimated.append(r.id)
+        if was_fetched:
+            fetched.append((r.id, _matrix_points(stops), durations, distances))
+    if estimated:
+        job_runner.defer_many("baseline", int(uid), estimated)
+    ids = [r.id for r, _, _, _, _ in done]
     db.session.commit()
+    _reload_routes(ids)
+
+    by_id = {r.id: r for r, _, _, _, _ in done}
+    for x in results:
+        if x["status"] == 200:
+            x["route"] = route_to_dict(by_id[x["route_id"]])
 
-    return {"message": "optimized", "route": route_to_dict(r)}
+    body = _batch_response(results, failures)
+    _store_fetched_matrices(fetched)
+    return body
@@ -0,0 +1,284 @@
+import time
+
+import numpy as np
+
+from .instrumentation import span
+
+# cost used for None / unreachable matrix cells, large but finite so that
+# prefix sums and deltas stay well defined
+UNREACHABLE = 1e9
+
+EPS = 1e-9
+
+
+def to_cost_matrix(matrix):
+    """
+    matrix: NxN nested list (OSRM durations/distances), None = unreachable
+    Returns: float64 ndarray with None/inf/nan replaced by UNREACHABLE
+    """
+    a = np.array(
+        [[np.nan if v is None else v for v in row] for row in matrix], dtype=float
+    )
+    a[~np.isfinite(a)] = UNREACHABLE
+    return a
+
+
+def neighbor_lists(cost, k):
+    """
+    cost: NxN ndarray
+    Returns (out_nb, in_nb): for every node the k cheapest successors and
+    the k cheapest predecessors. Both are needed because OSRM durations
+    are asymmetric.
+    """
+    n = cost.shape[0]
+    k = max(0, min(k, n - 1))
+    c = cost.copy()
+    np.fill_diagonal(c, np.inf)
+
+    out_nb = np.argsort(c, axis=1, kind="stable")[:, :k]
+    in_nb = np.argsort(c, axis=0, kind="stable")[:k, :].T
+    return out_nb.tolist(), in_nb.tolist()
+
+
+def nearest_neighbor(cost, start=0):
+    """
+    cost: NxN ndarray
+    Returns a visit order starting at `start` that visits every node once.
+    """
+    n = cost.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    order = [start]
+    cur = start
+
+    for _ in range(n - 1):
+        nxt = int(np.argmin(np.where(visited, np.inf, cost[cur])))
+        order.append(nxt)
+        visited[nxt] = True
+        cur = nxt
+
+    return order
+
+
+def _index(tour, c):
+    """
+    Position of every node plus forward/backward prefix costs, so that the
+    cost of any sub-path (or of the same sub-path reversed) is O(1).
+    """
+    pos = [0] * len(c)
+    fwd = [0.0] * len(tour)
+    bwd = [0.0] * len(tour)
+    for p, node in enumerate(tour):
+        pos[node] = p
+        if p > 0:
+            prev = tour[p - 1]
+            fwd[p] = fwd[p - 1] + c[prev][node]
+            bwd[p] = bwd[p - 1] + c[node][prev]
+    return pos, fwd, bwd
+
+
+def _try_two_opt(tour, c, i, k, fwd, bwd):
+    """Delta of reversing tour[i..k] (both ends have neighbours)."""
+    a, b, e, f = tour[i - 1], tour[i], tour[k], tour[k + 1]
+    return (
+        c[a][e] + c[b][f] - c[a][b] - c[e][f]
+        + (bwd[k] - bwd[i]) - (fwd[k] - fwd[i])
+    )
+
+
+def _best_or_opt(tour, c, i, seg_len, pos, fwd, bwd, out_nb, in_nb):
+    """
+    Best move of segment tour[i..i+seg_len-1] to another gap, optionally
+    reversed. Returns (delta, q, reversed) where the segment goes after
+    tour[q], or None.
+    """
+    n = len(tour)
+    j = i + seg_len - 1
+    if j > n - 2:
+        return None
+
+    s, e = tour[i], tour[j]
+    p, nx = tour[i - 1], tour[j + 1]
+    removal = c[p][nx] - c[p][s] - c[e][nx]
+    internal_rev = (bwd[j] - bwd[i]) - (fwd[j] - fwd[i])
+
+    gaps = set()
+    for a in in_nb[s]:
+        gaps.add(pos[a])
+    for a in in_nb[e]:
+        gaps.add(pos[a])
+    for b in out_nb[e]:
+        gaps.add(pos[b] - 1)
+    for b in out_nb[s]:
+        gaps.add(pos[b] - 1)
+
+    best = None
+    for q in gaps:
+        if q < 0 or q > n - 2 or i - 1 <= q <= j:
+            continue
+        a, b = tour[q], tour[q + 1]
+        base = removal - c[a][b]
+
+        delta = base + c[a][s] + c[e][b]
+        if delta < -EPS and (best is None or delta < best[0]):
+            best = (delta, q, False)
+
+        if seg_len > 1:
+            delta = base + c[a][e] + c[s][b] + internal_rev
+            if delta < -EPS and (best is None or delta < best[0]):
+                best = (delta, q, True)
+
+    return best
+
+
+def _apply_or_opt(tour, i, seg_len, q, rev):
+    seg = tour[i : i + seg_len]
+    if rev:
+        seg.reverse()
+    rest = tour[:i] + tour[i + seg_len :]
+    at = q + 1 if q < i else q + 1 - seg_len
+    rest[at:at] = seg
+    return rest
+
+
+def local_search(tour, c, out_nb, in_nb, max_passes=100, deadline=None, or_opt_max=3):
+    """
+    tour: node list whose first and last node stay fixed
+    c: cost matrix as nested lists (fast scalar access)
+    Neighbour-list driven 2-opt, relocate and Or-opt (segments up to
+    `or_opt_max`) with O(1) delta evaluation; first-improvement, repeated
+    until a full pass finds nothing or the deadline passes.
+    """
+    tour = list(tour)
+    n = len(tour)
+    if n < 4:
+        return tour
+
+    for _ in range(max_passes):
+        improved = False
+        pos, fwd, bwd = _index(tour, c)
+
+        for i in range(1, n - 1):
+            if deadline is not None and time.perf_counter() > deadline:
+                return tour
+
+            # 2-opt: new edge tour[i-1] -> e  (reverse tour[i..pos[e]])
+            # or new edge b -> tour[k+1]    (reverse tour[pos[b]..k])
+            a = tour[i - 1]
+            moved = False
+            for e in out_nb[a]:
+                k = pos[e]
+                if i < k <= n - 2 and _try_two_opt(tour, c, i, k, fwd, bwd) < -EPS:
+                    tour[i : k + 1] = tour[i : k + 1][::-1]
+                    moved = True
+                    break
+
+            if not moved:
+                f = tour[i + 1] if i + 1 < n else None
+                if f is not None:
+                    for b in in_nb[f]:
+                        j = pos[b]
+                        if 1 <= j < i and _try_two_opt(tour, c, j, i, fwd, bwd) < -EPS:
+                            tour[j : i + 1] = tour[j : i + 1][::-1]
+                            moved = True
+                            break
+
+            if not moved:
+                for seg_len in range(1, or_opt_max + 1):
+                    best = _best_or_opt(tour, c, i, seg_len, pos, fwd, bwd, out_nb, in_nb)
+                    if best is not None:
+                        _, q, rev = best
+                        tour = _apply_or_opt(tour, i, seg_len, q, rev)
+                        moved = True
+                        break
+
+            if moved:
+                improved = True
+                pos, fwd, bwd = _index(tour, c)
+
+        if not improved:
+            break
+
+    return tour
+
+
+def _open_path_problem(matrix, neighbors):
+    """
+    Open path as a fixed-end tour: a dummy end node n is reached from
+    anywhere for free, so both ends of the tour are fixed and every move
+    has neighbours on both sides.
+    Returns (cost, aug_nested, out_nb, in_nb).
+    """
+    cost = to_cost_matrix(matrix)
+    n = cost.shape[0]
+    aug = np.full((n + 1, n + 1), UNREACHABLE)
+    aug[:n, :n] = cost
+    aug[:, n] = 0.0
+    aug[n, n] = 0.0
+
+    out_nb, in_nb = neighbor_lists(aug, neighbors + 1)
+    return cost, aug.tolist(), out_nb, in_nb
+
+
+def solve_open_path(matrix, start=0, neighbors=10, max_passes=100, time_limit=None):
+    """
+    matrix: NxN durations (nested list, None = unreachable)
+    Returns a visit order starting at `start` that visits every node once,
+    without returning (same contract as _nearest_neighbor_order + _two_opt).
+    """
+    n = len(matrix)
+    if n <= 2:
+        return [start] + [i for i in range(n) if i != start]
+
+    with span("solve_construct"):
+        cost, aug, out_nb, in_nb = _open_path_problem(matrix, neighbors)
+        tour = nearest_neighbor(cost, start=start) + [n]
+
+    deadline = None
+    if time_limit is not None:
+        deadline = time.perf_counter() + time_limit
+
+    with span("solve_local_search"):
+        tour = local_search(tour, aug, out_nb, in_nb, max_passes=max_passes, deadline=deadline)
+    return tour[:-1]
+
+
+def cheapest_insertion(matrix, order, node):
+    """
+    order: open path (first node fixed), matrix: NxN nested list / ndarray
+    Returns `order` with `node` spliced in where it adds the least cost
+    (anywhere after the first node, including the end).
+    """
+    def c(a, b):
+        v = matrix[a][b]
+        return UNREACHABLE if v is None or not np.isfinite(v) else v
+
+    best_k, best_delta = len(order), c(order[-1], node)
+    for k in range(1, len(order)):
+        a, b = order[k - 1], order[k]
+        delta = c(a, node) + c(node, b) - c(a, b)
+        if delta < best_delta - EPS:
+            best_k, best_delta = k, delta
+    return order[:best_k] + [node] + order[best_k:]
+
+
+def improve_open_path(matrix, order, neighbors=10, max_passes=100, time_limit=None):
+    """
+    Local search on an existing open path (e.g. after an insertion or a
+    removal); order[0] stays first.
+    """
+    n = len(matrix)
+    if n <= 3:
+        return list(order)
+
+    _, aug, out_nb, in_nb = _open_path_problem(matrix, neighbors)
+
+    deadline = None
+    if time_limit is not None:
+        deadline = time.perf_counter() + time_limit
+
+    with span("solve_local_search"):
+        tour = local_search(
+            list(order) + [n], aug, out_nb, in_nb, max_passes=max_passes, deadline=deadline
+        )
+    return tour[:-1]
@@ -0,0 +1,278 @@
+import time
+
+import numpy as np
+
+from .instrumentation import span
+from .solver import UNREACHABLE, EPS, to_cost_matrix, neighbor_lists, local_search
+
+
+def parse_clock(value):
+    """
+    "HH:MM" / "HH:MM:SS" -> seconds after midnight, None if empty/invalid.
+    """
+    if value is None:
+        return None
+    try:
+        parts = [int(x) for x in str(value).strip().split(":")]
+    except ValueError:
+        return None
+    if not 2 <= len(parts) <= 3:
+        return None
+    h, m = parts[0], parts[1]
+    sec = parts[2] if len(parts) == 3 else 0
+    if not (0 <= h < 24 and 0 <= m < 60 and 0 <= sec < 60):
+        return None
+    return h * 3600 + m * 60 + sec
+
+
+def format_clock(seconds):
+    seconds = int(round(seconds))
+    return f"{(seconds // 3600) % 24:02d}:{(seconds // 60) % 60:02d}"
+
+
+class VrpProblem:
+    """
+    Open-route CVRPTW on a duration matrix with the depot at node 0.
+
+    demands: per node (node 0 ignored), None -> 0
+    windows: per node (earliest, latest) seconds after midnight, None = open
+    Vehicles leave the depot at `start` and do not return.
+    """
+
+    def __init__(self, durations, demands, windows, vehicles=1, capacity=None,
+                 start=0, service=0):
+        self.n = len(durations)
+        self.cost = to_cost_matrix(durations)
+        self.c = self.cost.tolist()
+        self.demands = [float(d or 0.0) for d in demands]
+        self.windows = list(windows)
+        self.vehicles = max(1, int(vehicles))
+        self.capacity = float(capacity) if capacity else None
+        self.start = float(start)
+        self.service = float(service)
+
+    def load(self, route):
+        return sum(self.demands[u] for u in route)
+
+    def fits(self, load):
+        return self.capacity is None or load <= self.capacity + EPS
+
+    def schedule(self, route):
+        """
+        route: stop nodes (no depot)
+        Returns arrival times per stop, or None if a time window is missed
+        or a leg is unreachable.
+        """
+        t = self.start
+        prev = 0
+        etas = []
+        for u in route:
+            leg = self.c[prev][u]
+            if leg >= UNREACHABLE:
+                return None
+            t += leg
+            earliest, latest = self.windows[u]
+            if earliest is not None and t < earliest:
+                t = earliest
+            if latest is not None and t > latest:
+                return None
+            etas.append(t)
+            t += self.service
+            prev = u
+        return etas
+
+    def route_cost(self, route):
+        total = 0.0
+        prev = 0
+        for u in route:
+            total += self.c[prev][u]
+            prev = u
+        return total
+
+    def feasible(self, route):
+        return self.fits(self.load(route)) and self.schedule(route) is not None
+
+
+def _savings(p, neighbors):
+    """
+    Clarke-Wright savings for open routes: merging a route ending in i with
+    one starting in j saves c[0][j] - c[i][j]. Only k-nearest pairs are
+    considered so construction stays near-linear for large instances.
+    """
+    n = p.n
+    out_nb, _ = neighbor_lists(p.cost, neighbors)
+
+    pairs = []
+    for i in range(1, n):
+        for j in out_nb[i]:
+            if j == 0 or j == i:
+                continue
+            s = p.c[0][j] - p.c[i][j]
+            if s > EPS:
+                pairs.append((s, i, j))
+    pairs.sort(key=lambda x: (-x[0], x[1], x[2]))
+
+    routes = {u: [u] for u in range(1, n) if p.feasible([u])}
+    unassigned = [u for u in range(1, n) if u not in routes]
+    route_of = {u: u for u in routes}
+
+    for _, i, j in pairs:
+        if i not in route_of or j not in route_of:
+            continue
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj:
+            continue
+        a, b = routes[ri], routes[rj]
+        if a[-1] != i or b[0] != j:
+            continue
+
+        merged = a + b
+        if not p.fits(p.load(merged)) or p.schedule(merged) is None:
+            continue
+
+        routes[ri] = merged
+        del routes[rj]
+        for u in b:
+            route_of[u] = ri
+
+    return list(routes.values()), unassigned
+
+
+def _best_insertion(p, routes, u, skip=None):
+    """
+    Cheapest feasible (delta, route_index, position) for node u, or None.
+    """
+    best = None
+    for r, route in enumerate(routes):
+        if r == skip or not p.fits(p.load(route) + p.demands[u]):
+            continue
+        for k in range(len(route) + 1):
+            prev = route[k - 1] if k > 0 else 0
+            nxt = route[k] if k < len(route) else None
+            delta = p.c[prev][u] - (p.c[prev][nxt] if nxt is not None else 0.0)
+            if nxt is not None:
+                delta += p.c[u][nxt]
+            if best is not None and delta >= best[0]:
+                continue
+            if p.schedule(route[:k] + [u] + route[k:]) is None:
+                continue
+            best = (delta, r, k)
+    return best
+
+
+def _fit_fleet(p, routes, unassigned):
+    """
+    Keeps at most p.vehicles routes (the heaviest ones) and re-inserts the
+    stops of dropped routes where they still fit.
+    """
+    routes = sorted(routes, key=lambda r: (-p.load(r), -len(r), r[0]))
+    dropped = [u for r in routes[p.vehicles:] for u in r]
+    routes = routes[: p.vehicles]
+
+    leftover = []
+    for u in sorted(unassigned + dropped):
+        ins = _best_insertion(p, routes, u) if routes else None
+        if ins is None and len(routes) < p.vehicles and p.feasible([u]):
+            routes.append([u])
+            continue
+        if ins is None:
+            leftover.append(u)
+            continue
+        _, r, k = ins
+        routes[r].insert(k, u)
+
+    return routes, leftover
+
+
+def _relocate_between_routes(p, routes, deadline):
+    """
+    Moves single stops to the cheapest feasible position in another route
+    while that lowers the total duration.
+    """
+    improved = True
+    while improved:
+        improved = False
+        for r, route in enumerate(routes):
+            k = 0
+            while k < len(route):
+                if deadline is not None and time.perf_counter() > deadline:
+                    return routes
+
+                u = route[k]
+                prev = route[k - 1] if k > 0 else 0
+                nxt = route[k + 1] if k + 1 < len(route) else None
+                gain = p.c[prev][u]
+                if nxt is not None:
+                    gain += p.c[u][nxt] - p.c[prev][nxt]
+
+                reduced = route[:k] + route[k + 1:]
+                ins = _best_insertion(p, routes, u, skip=r)
+                if ins is not None and ins[0] - gain < -EPS and p.schedule(reduced) is not None:
+                    _, r2, k2 = ins
+                    routes[r2].insert(k2, u)
+                    route[:] = reduced
+                    improved = True
+                    continue
+                k += 1
+    return routes
+
+
+def _polish_route(p, route, neighbors, deadline):
+    """
+    Intra-route 2-opt/Or-opt from solver.local_search, accepted only if the
+    result still meets every time window.
+    """
+    if len(route) < 3:
+        return route
+
+    nodes = [0] + route
+    m = len(nodes)
+    sub = np.full((m + 1, m + 1), UNREACHABLE)
+    sub[:m, :m] = p.cost[np.ix_(nodes, nodes)]
+    sub[:, m] = 0.0
+
+    out_nb, in_nb = neighbor_lists(sub, neighbors + 1)
+    tour = local_search(list(range(m + 1)), sub.tolist(), out_nb, in_nb, deadline=deadline)
+    candidate = [nodes[i] for i in tour[1:-1]]
+
+    if p.route_cost(candidate) < p.route_cost(route) - EPS and p.schedule(candidate) is not None:
+        return candidate
+    return route
+
+
+def solve_vrp(durations, demands, windows, vehicles=1, capacity=None, start=0,
+              service=0, neighbors=20, time_limit=None):
+    """
+    durations: (1+N)x(1+N) with the depot at 0 (nested list, None = unreachable)
+    demands/windows: per node, see VrpProblem
+    Returns {"routes": [[node, ...], ...], "unassigned": [node, ...],
+             "etas": [[seconds, ...], ...], "loads": [...], "durations": [...]}
+    Savings construction, fleet-size repair, then inter-route relocate and
+    intra-route local search.
+    """
+    p = VrpProblem(durations, demands, windows, vehicles, capacity, start, service)
+
+    deadline = None
+    if time_limit is not None:
+        deadline = time.perf_counter() + time_limit
+
+    if p.n <= 1:
+        return {"routes": [], "unassigned": [], "etas": [], "loads": [], "durations": []}
+
+    with span("vrp_construct"):
+        routes, unassigned = _savings(p, neighbors)
+    with span("vrp_repair"):
+        routes, unassigned = _fit_fleet(p, routes, unassigned)
+    with span("vrp_relocate"):
+        routes = _relocate_between_routes(p, routes, deadline)
+    with span("vrp_polish"):
+        routes = [_polish_route(p, r, neighbors, deadline) for r in routes if r]
+
+    routes.sort(key=lambda r: r[0])
+    return {
+        "routes": routes,
+        "unassigned": sorted(unassigned),
+        "etas": [p.schedule(r) for r in routes],
+        "loads": [p.load(r) for r in routes],
+        "durations": [p.route_cost(r) for r in routes],
+    }
@@ -0,0 +1,351 @@
+"""
+Offline benchmark for the route heuristics.
+
+Runs the legacy `_nearest_neighbor_order` + `_two_opt` pair and
+`solver.solve_open_path` on reproducible instances around the Riga
+WAREHOUSES (uniform and clustered stops, asymmetric durations, some
+unreachable `None` cells) and reports solve time, peak memory, path cost
+and the gap to the exact optimum (small instances) or the best known cost.
+
+Usage (from backend/):
+    python -m benchmarks.solver_bench                       # full suite
+    python -m benchmarks.solver_bench --quick               # 10..200 stops
+    python -m benchmarks.solver_bench --out results.json \\
+        --baseline benchmarks/baseline.json                 # regression check
+    python -m benchmarks.solver_bench --update-baseline    # full suite
+    python -m benchmarks.solver_bench --save-instances DIR  # store instances
+    python -m benchmarks.solver_bench --instances DIR       # run stored ones
+
+Exits with status 1 when a result is worse than the baseline or has no
+baseline entry.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.routes_api import WAREHOUSES, _nearest_neighbor_order, _two_opt
+from app.solver import UNREACHABLE, solve_open_path, to_cost_matrix
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+
+SIZES = [10, 50, 200, 500, 1000, 2000]
+QUICK_SIZES = [10, 50, 200]
+KINDS = ["uniform", "clustered"]
+
+EARTH_RADIUS_M = 6371000.0
+EXACT_MAX_N = 12
+
+
+# --- instances ---------------------------------------------------------------
+
+def _points(kind, n, rng):
+    """n stops around the warehouses, as (lat, lng) arrays."""
+    lats = np.array([w["lat"] for w in WAREHOUSES])
+    lngs = np.array([w["lng"] for w in WAREHOUSES])
+    lat0, lat1 = lats.min() - 0.05, lats.max() + 0.05
+    lng0, lng1 = lngs.min() - 0.08, lngs.max() + 0.08
+
+    if kind == "uniform":
+        return rng.uniform(lat0, lat1, n), rng.uniform(lng0, lng1, n)
+
+    centers = max(2, n // 40)
+    c_lat = rng.uniform(lat0, lat1, centers)
+    c_lng = rng.uniform(lng0, lng1, centers)
+    which = rng.integers(0, centers, n)
+    return (
+        c_lat[which] + rng.normal(0, 0.006, n),
+        c_lng[which] + rng.normal(0, 0.010, n),
+    )
+
+
+def make_instance(kind, n, seed, unreachable=0.002):
+    """
+    Depot (one of WAREHOUSES) at node 0 followed by n stops.
+    Durations: haversine x detour / speed with per-direction noise, so the
+    matrix is asymmetric; a few stop->stop cells are None.
+    """
+    rng = np.random.default_rng(seed)
+    wh = WAREHOUSES[seed % len(WAREHOUSES)]
+    lat, lng = _points(kind, n, rng)
+    lat = np.radians(np.concatenate([[wh["lat"]], lat]))
+    lng = np.radians(np.concatenate([[wh["lng"]], lng]))
+
+    h = (
+        np.sin((lat[None, :] - lat[:, None]) / 2) ** 2
+        + np.cos(lat[:, None]) * np.cos(lat[None, :])
+        * np.sin((lng[None, :] - lng[:, None]) / 2) ** 2
+    )
+    meters = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+    durations = meters * 1.3 / (35 / 3.6) * rng.uniform(1.0, 1.25, meters.shape)
+    np.fill_diagonal(durations, 0.0)
+
+    matrix = durations.round(1).tolist()
+    if n > 2:
+        cells = rng.random(durations.shape) < unreachable
+        cells[0, :] = False
+        cells[:, 0] = False
+        np.fill_diagonal(cells, False)
+        for a, b in zip(*np.nonzero(cells)):
+            matrix[a][b] = None
+
+    return {"name": f"{kind}-{n}-s{seed}", "kind": kind, "n": n, "seed": seed, "durations": matrix}
+
+
+def suite(sizes, seeds):
+    return [make_instance(kind, n, seed) for n in sizes for kind in KINDS for seed in seeds]
+
+
+def save_instances(instances, folder):
+    os.makedirs(folder, exist_ok=True)
+    for inst in instances:
+        with open(os.path.join(folder, inst["name"] + ".json"), "w") as f:
+            json.dump(inst, f)
+
+
+def load_instances(folder):
+    out = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".json"):
+            with open(os.path.join(folder, name)) as f:
+                out.append(json.load(f))
+    return out
+
+
+# --- algorithms --------------------------------------------------------------
+
+def legacy(durations, time_limit):
+    return _two_opt(_nearest_neighbor_order(durations), durations)
+
+
+def solver(durations, time_limit):
+    return solve_open_path(durations, time_limit=time_limit)
+
+
+ALGORITHMS = {"legacy": legacy, "solver": solver}
+
+
+def exact_open_path(durations):
+    """Held-Karp optimum of the open path from node 0 (small n only)."""
+    c = to_cost_matrix(durations)
+    n = c.shape[0]
+    if n <= 2:
+        return float(c[0, 1:].sum())
+
+    m = n - 1
+    full = 1 << m
+    dp = np.full((full, m), np.inf)
+    for j in range(m):
+        dp[1 << j, j] = c[0, j + 1]
+
+    for mask in range(1, full):
+        row = dp[mask]
+        if not np.isfinite(row).any():
+            continue
+        for j in range(m):
+            if not mask & (1 << j) or not math.isfinite(row[j]):
+                continue
+            base = row[j]
+            for k in range(m):
+                if mask & (1 << k):
+                    continue
+                nxt = mask | (1 << k)
+                val = base + c[j + 1, k + 1]
+                if val < dp[nxt, k]:
+                    dp[nxt, k] = val
+    return float(dp[full - 1].min())
+
+
+def path_cost(order, durations):
+    """(cost with unreachable legs at solver.UNREACHABLE, unreachable legs)."""
+    total = 0.0
+    missing = 0
+    for a, b in zip(order, order[1:]):
+        w = durations[a][b]
+        if w is None:
+            missing += 1
+            total += UNREACHABLE
+        else:
+            total += float(w)
+    return total, missing
+
+
+def run_one(inst, name, time_limit, memory=True):
+    """
+    Times one solve; peak memory comes from a second, traced solve because
+    tracemalloc slows pure-Python code down too much to time it.
+    """
+    durations = inst["durations"]
+    t0 = time.perf_counter()
+    order = ALGORITHMS[name](durations, time_limit)
+    elapsed = time.perf_counter() - t0
+
+    if sorted(order) != list(range(len(durations))) or order[0] != 0:
+        raise AssertionError(f"{name} returned an invalid order on {inst['name']}")
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        ALGORITHMS[name](durations, time_limit)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    cost, missing = path_cost(order, durations)
+    return {
+        "instance": inst["name"],
+        "kind": inst["kind"],
+        "n": inst["n"],
+        "algorithm": name,
+        "time_s": round(elapsed, 4),
+        "peak_kib": round(peak / 1024, 1) if peak is not None else None,
+        "cost": round(cost, 1),
+        "unreachable_legs": missing,
+    }
+
+
+def run(instances, algorithms, time_limit, legacy_max_n, best_known=None, memory=True):
+    best_known = dict(best_known or {})
+    results = []
+
+    for inst in instances:
+        rows = []
+        for name in algorithms:
+            if name == "legacy" and inst["n"] > legacy_max_n:
+                continue
+            rows.append(run_one(inst, name, time_limit, memory=memory))
+
+        exact = exact_open_path(inst["durations"]) if inst["n"] + 1 <= EXACT_MAX_N else None
+        costs = [r["cost"] for r in rows]
+        if inst["name"] in best_known:
+            costs.append(best_known[inst["name"]])
+        best = min(costs)
+        reference = exact if exact is not None else best
+        reference = round(reference, 1)
+        best_known[inst["name"]] = reference
+
+        for r in rows:
+            r["reference"] = "exact" if exact is not None else "best_known"
+            r["reference_cost"] = reference
+            r["gap_pct"] = round(100.0 * (r["cost"] - reference) / reference, 3) if reference else 0.0
+            peak = f'{r["peak_kib"]:>10.0f} KiB' if r["peak_kib"] is not None else f'{"-":>14}'
+            print(
+                f'{r["instance"]:<22} {r["algorithm"]:<7} {r["time_s"]:>9.3f}s '
+                f'{peak}  cost {r["cost"]:>12.1f}  gap {r["gap_pct"]:>7.2f}%'
+                + (f'  unreachable {r["unreachable_legs"]}' if r["unreachable_legs"] else "")
+            )
+            results.append(r)
+
+    return results, best_known
+
+
+# --- baseline ----------------------------------------------------------------
+
+def compare(results, baseline, cost_tol, time_tol):
+    """
+    Returns a list of human-readable regressions against `baseline`; a
+    result the baseline has no entry for counts as one, so a size that was
+    never baselined cannot pass unchecked.
+    """
+    base = {(r["instance"], r["algorithm"]): r for r in baseline.get("results", [])}
+    problems = []
+    for r in results:
+        b = base.get((r["instance"], r["algorithm"]))
+        if b is None:
+            problems.append(
+                f'{r["instance"]} {r["algorithm"]}: no baseline (rerun with --update-baseline)'
+            )
+            continue
+        if r["cost"] > b["cost"] * (1 + cost_tol) + 1e-6:
+            problems.append(
+                f'{r["instance"]} {r["algorithm"]}: cost {r["cost"]} > baseline {b["cost"]}'
+            )
+        # time only counts when it is large enough to be measurable
+        if r["time_s"] > 0.05 and r["time_s"] > b["time_s"] * time_tol:
+            problems.append(
+                f'{r["instance"]} {r["algorithm"]}: time {r["time_s"]}s > '
+                f'{time_tol}x baseline {b["time_s"]}s'
+            )
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quick", action="store_true", help="sizes 10..200 only")
+    parser.add_argument("--sizes", type=int, nargs="*", help="override instance sizes")
+    parser.add_argument("--seeds", type=int, nargs="*", default=[1, 2])
+    parser.add_argument("--algorithms", nargs="*", default=list(ALGORITHMS))
+    parser.add_argument("--time-limit", type=float, default=10.0)
+    parser.add_argument("--legacy-max-n", type=int, default=100,
+                        help="skip the O(n^3) legacy 2-opt above this size")
+    parser.add_argument("--instances", help="run stored instances from this folder")
+    parser.add_argument("--save-instances", help="write the generated instances here")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced memory run")
+    parser.add_argument("--out", help="write machine-readable results (JSON)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--cost-tolerance", type=float, default=0.01)
+    parser.add_argument("--time-tolerance", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    if args.instances:
+        instances = load_instances(args.instances)
+    else:
+        sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+        instances = suite(sizes, args.seeds)
+    if args.save_instances:
+        save_instances(instances, args.save_instances)
+
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results, best_known = run(
+        instances,
+        args.algorithms,
+        args.time_limit,
+        args.legacy_max_n,
+        best_known=baseline.get("best_known"),
+        memory=not args.no_memory,
+    )
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time_limit": args.time_limit,
+        "results": results,
+        "best_known": best_known,
+    }
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if baseline:
+        problems = compare(results, baseline, args.cost_tolerance, args.time_tolerance)
+        for p in problems:
+            print("REGRESSION", p)
+        if problems:
+            return 1
+        print("no regressions against", args.baseline)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
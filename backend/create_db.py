@@ -1,8 +1,8 @@
 from app import create_app, db
-from app.models import User 
+from app.migrations import upgrade
 
 app = create_app()
 
 with app.app_context():
-    db.create_all()
+    upgrade(db.engine)
     print("✔ Database tables created successfully!")
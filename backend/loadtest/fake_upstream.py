@@ -0,0 +1,175 @@
+"""
+Local stand-in for OSRM (/table, /route) and the Google Directions API.
+
+Answers with haversine-based durations/distances (app.estimates) after a
+configurable latency, and fails a configurable share of requests with
+503, so load tests never touch the real services.
+
+    python -m loadtest.fake_upstream --port 5100 --latency-ms 40 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from app.estimates import estimate_matrices, estimate_route_metrics
+
+
+class FakeUpstream:
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=30.0, jitter_ms=10.0,
+                 error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                upstream.handle(self)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _delay_and_fail(self):
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            fail = self.random.random() < self.error_rate
+        time.sleep(delay)
+        return fail
+
+    def handle(self, req):
+        url = urlsplit(req.path)
+        query = parse_qs(url.query)
+        parts = url.path.split("/")
+
+        if self._delay_and_fail():
+            return self._send(req, 503, {"code": "Unavailable"})
+
+        try:
+            if len(parts) > 4 and parts[1] in ("table", "route"):
+                points = [
+                    {"lng": float(lng), "lat": float(lat)}
+                    for lng, lat in (c.split(",") for c in parts[4].split(";"))
+                ]
+                body = (
+                    self._table(points, query)
+                    if parts[1] == "table"
+                    else self._route(points, query)
+                )
+            elif url.path.endswith("/directions/json"):
+                body = self._directions(query)
+            else:
+                return self._send(req, 404, {"error": "unknown endpoint"})
+        except (KeyError, ValueError) as e:
+            return self._send(req, 400, {"code": "InvalidQuery", "message": str(e)})
+
+        self._send(req, 200, body)
+
+    def _table(self, points, query):
+        m = estimate_matrices(points)
+        src = [int(i) for i in query["sources"][0].split(";")] if "sources" in query else None
+        dst = [int(i) for i in query["destinations"][0].split(";")] if "destinations" in query else None
+
+        body = {"code": "Ok"}
+        for key in ("durations", "distances"):
+            rows = m[key] if src is None else [m[key][i] for i in src]
+            body[key] = rows if dst is None else [[row[j] for j in dst] for row in rows]
+        return body
+
+    def _route(self, points, query):
+        route = estimate_route_metrics(points)
+        if query.get("overview", ["simplified"])[0] != "false":
+            route["geometry"] = {"type": "LineString", "coordinates": _road_like(points)}
+        return {"code": "Ok", "routes": [route]}
+
+    def _directions(self, query):
+        def point(value):
+            lat, lng = value.split(",")
+            return {"lat": float(lat), "lng": float(lng)}
+
+        waypoints = [w for w in query.get("waypoints", [""])[0].split("|") if w]
+        points = [point(query["origin"][0])] + [point(w) for w in waypoints] + [
+            point(query["destination"][0])
+        ]
+
+        legs = []
+        for a, b in zip(points, points[1:]):
+            leg = estimate_route_metrics([a, b])
+            legs.append(
+                {
+                    "distance": {"value": int(leg["distance"])},
+                    "duration": {"value": int(leg["duration"])},
+                    "duration_in_traffic": {"value": int(leg["duration"] * 1.2)},
+                }
+            )
+        return {"status": "OK", "routes": [{"legs": legs}]}
+
+    @staticmethod
+    def _send(req, status, body):
+        data = json.dumps(body).encode()
+        req.send_response(status)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(data)))
+        req.end_headers()
+        req.wfile.write(data)
+
+
+def _road_like(points, step_m=15.0):
+    """
+    A vertex every ~step_m meters along each leg, zig-zagging off the
+    straight line like a street grid, so geometry payloads have realistic
+    vertex counts.
+    """
+    coords = [[points[0]["lng"], points[0]["lat"]]]
+    for a, b in zip(points, points[1:]):
+        n = max(1, int(estimate_route_metrics([a, b], detour_factor=1.0)["distance"] / step_m))
+        for i in range(1, n + 1):
+            t = i / n
+            wiggle = 0.00005 * ((i % 7) - 3) if i < n else 0.0
+            coords.append(
+                [a["lng"] + (b["lng"] - a["lng"]) * t + wiggle, a["lat"] + (b["lat"] - a["lat"]) * t]
+            )
+    return coords
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OSRM/Google server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(
+        args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate
+    )
+    print(f"fake upstream on {upstream.url}")
+    upstream.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
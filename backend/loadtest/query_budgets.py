@@ -0,0 +1,229 @@
+"""
+Query-budget check for every API endpoint.
+
+Seeds a small and a large account (few vs. many routes and stops), calls
+each endpoint of routes_api, bulk_api and auth against both through the test client
+with QUERY_BUDGET_MODE=raise, and reports the SQL statement count per
+request. Fails when an endpoint exceeds its `query_budget`, repeats a
+statement (N+1), has no budget, or runs more statements for the large
+account than for the small one. Exports are counted up to the streamed
+body; imports (`query_budget(None)`) only for growth with account size.
+
+    cd backend
+    python -m loadtest.query_budgets
+
+A manual tool for the per-endpoint table; tests/test_query_budgets.py
+runs the same check as part of the test suite.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+import numpy as np
+
+from loadtest.fake_upstream import FakeUpstream
+
+SIZES = {"small": (3, 3), "large": (40, 30)}  # routes, stops per route
+
+_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+# NDJSON body for the import endpoints; the same for both accounts, since
+# imports commit per batch and are exempt from a fixed budget
+_IMPORT_ROWS = "".join(
+    f'{{"route": "imported", "name": "i{i}", "lat": 56.9{i}, "lon": 24.1{i}}}\n' for i in range(5)
+)
+
+
+def seed_account(client, email, routes, stops, rng):
+    res = client.post(
+        "/api/auth/register", json={"name": email, "email": email, "password": "secret"}
+    )
+    headers = {"Authorization": f"Bearer {res.get_json()['token']}"}
+
+    ids = []
+    for k in range(routes):
+        clients = [
+            {
+                "name": f"c{i}",
+                "lat": float(56.95 + rng.normal(0, 0.02)),
+                "lon": float(24.11 + rng.normal(0, 0.04)),
+            }
+            for i in range(stops)
+        ]
+        res = client.post("/api/routes/", json={"name": f"r{k}", "clients": clients}, headers=headers)
+        ids.append(res.get_json()["id"])
+
+    # every route gets a baseline and an optimized result, so list/stats
+    # serialize the full parameters
+    client.post("/api/routes/batch/baseline", json={"route_ids": ids}, headers=headers)
+    client.post("/api/routes/batch/optimize", json={"route_ids": ids}, headers=headers)
+    return headers, ids
+
+
+def _calls(headers, ids, email):
+    """(name, method, url, json) in an order that leaves each step valid."""
+    rid, other = ids[0], ids[1]
+    return [
+        ("register", "POST", "/api/auth/register",
+         {"name": "x", "email": "new-" + email, "password": "secret"}),
+        ("login", "POST", "/api/auth/login", {"email": email, "password": "secret"}),
+        ("list", "GET", "/api/routes/", None),
+        ("list_page", "GET", "/api/routes/?limit=50", None),
+        ("list_summary", "GET", "/api/routes/?view=summary&limit=50", None),
+        ("stats", "GET", "/api/routes/stats", None),
+        ("cache_stats", "GET", "/api/routes/cache/stats", None),
+        ("warehouses", "GET", "/api/routes/warehouses", None),
+        ("create", "POST", "/api/routes/",
+         {"name": "new", "clients": [{"lat": 56.95, "lon": 24.1}, {"lat": 56.96, "lon": 24.2}]}),
+        ("update", "PUT", f"/api/routes/{rid}", {"name": "renamed"}),
+        ("update_clients", "PUT", f"/api/routes/{rid}",
+         {"clients": [{"lat": 56.95, "lon": 24.1}, {"lat": 56.96, "lon": 24.2}]}),
+        ("baseline", "POST", f"/api/routes/{rid}/baseline", None),
+        ("optimize", "POST", f"/api/routes/{rid}/optimize", None),
+        ("add_client", "POST", f"/api/routes/{rid}/clients", {"lat": 56.97, "lon": 24.12}),
+        ("get_matrix", "GET", f"/api/routes/{rid}/matrix?kind=duration", None),
+        ("geometry", "GET", f"/api/routes/{rid}/geometry?zoom=14", None),
+        ("geometry_cached", "GET", f"/api/routes/{rid}/geometry?zoom=14", None),
+        ("upload_matrix", "POST", f"/api/routes/{other}/matrix",
+         {"kind": "distance", "matrix": None}),
+        ("batch_baseline", "POST", "/api/routes/batch/baseline", {"route_ids": ids}),
+        ("batch_optimize", "POST", "/api/routes/batch/optimize", {"route_ids": ids}),
+        ("import_clients", "POST", f"/api/routes/{rid}/clients/import", _IMPORT_ROWS),
+        ("import_routes", "POST", "/api/routes/import", _IMPORT_ROWS),
+        ("export_routes", "GET", "/api/routes/export", None),
+        ("export_clients", "GET", f"/api/routes/{rid}/clients/export?format=csv", None),
+        ("archive", "DELETE", f"/api/routes/{other}", None),
+        ("delete_permanent", "DELETE", f"/api/routes/{other}/permanent", None),
+    ]
+
+
+def measure(client, headers, ids, email, stops):
+    counts = {}
+    for name, method, url, body in _calls(headers, ids, email):
+        if name == "upload_matrix":
+            n = stops
+            body = {**body, "matrix": [[0.0 if i == j else 100.0 for j in range(n)] for i in range(n)]}
+        if isinstance(body, str):
+            res = client.open(url, method=method, data=body, headers=headers,
+                              content_type="application/x-ndjson")
+        else:
+            res = client.open(url, method=method, json=body, headers=headers)
+        res.get_data()  # drain streamed bodies inside their request context
+        counts[name] = _count(name, res)
+
+    cid = client.open(f"/api/routes/{ids[0]}/clients", method="POST",
+                      json={"lat": 56.98, "lon": 24.13}, headers=headers).get_json()["client"]["id"]
+    res = client.open(f"/api/routes/{ids[0]}/clients/{cid}", method="DELETE", headers=headers)
+    counts["delete_client"] = _count("delete_client", res)
+
+    res = client.open(f"/api/routes/{ids[0]}/optimize?async=1", method="POST", headers=headers)
+    counts["enqueue"] = _count("enqueue", res)
+    res = client.open(f"/api/routes/jobs/{res.get_json()['job']['id']}", headers=headers)
+    counts["job"] = _count("job", res)
+    return counts
+
+
+def _count(name, res):
+    if res.status_code >= 400:
+        raise AssertionError(f"{name}: {res.status_code} {res.get_data(as_text=True)[:200]}")
+    match = _QUERIES.search(res.headers.get("Server-Timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query budgets per endpoint")
+    parser.parse_args(argv)
+
+    upstream = FakeUpstream(latency_ms=0, jitter_ms=0).start()
+    tmp = tempfile.mkdtemp(prefix="query-budgets-")
+    os.environ.update(
+        {
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'budget.db')}",
+            "OSRM_CACHE_PATH": os.path.join(tmp, "osrm_cache.db"),
+            "OSRM_BASE_URL": upstream.url,
+            "GOOGLE_DIRECTIONS_URL": f"{upstream.url}/maps/api/directions/json",
+            "GOOGLE_MAPS_API_KEY": "query-budgets",
+            "JWT_SECRET_KEY": "query-budgets-secret-key-of-sufficient-length",
+            "METRICS_ENABLED": "1",
+            "SERVER_TIMING": "1",
+            "QUERY_BUDGET_MODE": "raise",
+            "BATCH_PROCESSES": "1",
+        }
+    )
+
+    from app import create_app, db
+    from app.migrations import upgrade
+
+    app = create_app()
+    app.testing = True
+    with app.app_context():
+        upgrade(db.engine, log=lambda line: None)
+
+    client = app.test_client()
+    rng = np.random.default_rng(1)
+    results = {}
+    for size, (routes, stops) in SIZES.items():
+        email = f"{size}@example.com"
+        with app.app_context():
+            headers, ids = seed_account(client, email, routes, stops, rng)
+        results[size] = measure(client, headers, ids, email, stops)
+
+    problems = []
+    print(f'{"endpoint":<18}{"small":>7}{"large":>7}{"budget":>8}')
+    for name in results["small"]:
+        view = view_for(app, name)
+        budget = getattr(view, "query_budget", None)
+        small, large = results["small"][name], results["large"][name]
+        print(f'{name:<18}{small:>7}{large:>7}{budget if budget is not None else "-":>8}')
+        if not hasattr(view, "query_budget"):
+            problems.append(f"{name}: no query_budget")
+        if large > small:
+            problems.append(f"{name}: {small} -> {large} queries as data grows")
+
+    upstream.stop()
+    for p in problems:
+        print("FAIL", p)
+    return 1 if problems else 0
+
+
+_ENDPOINTS = {
+    "register": "auth.register",
+    "login": "auth.login",
+    "list": "routes.list_routes",
+    "list_page": "routes.list_routes",
+    "list_summary": "routes.list_routes",
+    "stats": "routes.routes_stats",
+    "cache_stats": "routes.osrm_cache_stats",
+    "warehouses": "routes.list_warehouses",
+    "create": "routes.create_route",
+    "update": "routes.update_route",
+    "update_clients": "routes.update_route",
+    "baseline": "routes.compute_baseline",
+    "optimize": "routes.optimize_route",
+    "add_client": "routes.add_client",
+    "delete_client": "routes.delete_client",
+    "get_matrix": "routes.get_distance_matrix",
+    "geometry": "routes.get_route_geometry",
+    "geometry_cached": "routes.get_route_geometry",
+    "upload_matrix": "routes.upload_distance_matrix",
+    "batch_baseline": "routes.batch_baseline",
+    "batch_optimize": "routes.batch_optimize",
+    "import_routes": "bulk.import_routes",
+    "import_clients": "bulk.import_clients",
+    "export_routes": "bulk.export_routes",
+    "export_clients": "bulk.export_clients",
+    "archive": "routes.delete_route",
+    "delete_permanent": "routes.delete_route_permanently",
+    "enqueue": "routes.optimize_route",
+    "job": "routes.get_job",
+}
+
+
+def view_for(app, name):
+    return app.view_functions.get(_ENDPOINTS[name])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
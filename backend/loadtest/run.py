@@ -0,0 +1,303 @@
+"""
+End-to-end load test: gunicorn + create_app() on a seeded SQLite database,
+talking to a local fake OSRM/Google server (loadtest.fake_upstream).
+
+Seeds `--users` users with `--routes-per-user` routes each, mints JWTs for
+them, then drives a weighted mix of list / stats / geometry / baseline / optimize
+requests from `--concurrency` client threads for `--duration` seconds and
+reports throughput, latency percentiles and error rates per endpoint.
+
+    cd backend
+    python -m loadtest.run --workers 4 --concurrency 32 --duration 60 \\
+        --latency-ms 40 --error-rate 0.01 --out loadtest.json
+
+--server werkzeug runs the threaded dev server instead of gunicorn.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from loadtest.fake_upstream import FakeUpstream
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "list=5,summary=3,stats=3,geometry=3,baseline=1,optimize=1"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(env, users, routes_per_user, stops, rng):
+    """
+    Creates the schema and the users/routes/clients in the database named
+    by env["DATABASE_URL"]. Returns [(token, [route_id, ...]), ...].
+    """
+    os.environ.update(env)
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+
+    from app import create_app, db
+    from app.migrations import upgrade
+    from app.models import Client, Route, User
+    from app.routes_api import WAREHOUSES
+
+    app = create_app()
+    out = []
+    with app.app_context():
+        upgrade(db.engine, log=lambda line: None)
+        for u in range(users):
+            user = User(name=f"load{u}", email=f"load{u}@example.com")
+            user.password_hash = "-"  # never logs in, gets a minted token
+            db.session.add(user)
+            db.session.flush()
+
+            route_ids = []
+            for k in range(routes_per_user):
+                r = Route(name=f"load {u}/{k}", user_id=user.id, parameters={})
+                db.session.add(r)
+                db.session.flush()
+                route_ids.append(r.id)
+
+                wh = WAREHOUSES[rng.integers(len(WAREHOUSES))]
+                n = int(rng.integers(max(2, stops // 2), stops + 1))
+                db.session.execute(
+                    insert(Client),
+                    [
+                        {
+                            "name": f"c{i}",
+                            "lat": float(wh["lat"] + rng.normal(0, 0.02)),
+                            "lon": float(wh["lng"] + rng.normal(0, 0.04)),
+                            "route_id": r.id,
+                        }
+                        for i in range(n)
+                    ],
+                )
+
+            out.append((create_access_token(identity=str(user.id)), route_ids))
+        db.session.commit()
+    return out
+
+
+def start_server(args, env, port):
+    if args.server == "gunicorn":
+        cmd = [
+            sys.executable, "-m", "gunicorn",
+            "-w", str(args.workers),
+            "--threads", str(args.threads),
+            "-b", f"127.0.0.1:{port}",
+            "--timeout", "120",
+            "--log-level", "warning",
+            "app:create_app()",
+        ]
+    else:
+        cmd = [
+            sys.executable, "-c",
+            "from app import create_app; "
+            f"create_app().run(host='127.0.0.1', port={port}, threaded=True)",
+        ]
+
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env={**os.environ, **env})
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/routes/warehouses", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("server did not start")
+
+
+def endpoints(base, route_id):
+    """name -> (method, url) for one request against `route_id`."""
+    return {
+        "list": ("GET", f"{base}/api/routes/?limit=50"),
+        "summary": ("GET", f"{base}/api/routes/?view=summary&limit=50"),
+        "stats": ("GET", f"{base}/api/routes/stats?limit=100"),
+        "baseline": ("POST", f"{base}/api/routes/{route_id}/baseline"),
+        "optimize": ("POST", f"{base}/api/routes/{route_id}/optimize"),
+        "geometry": ("GET", f"{base}/api/routes/{route_id}/geometry?zoom=16"),
+    }
+
+
+def drive(base, accounts, mix, concurrency, duration, seed_value):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples = {n: [] for n in names}
+    statuses = {n: {} for n in names}
+    failures = {n: {} for n in names}  # first 5xx body per status code
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(k):
+        rng = random.Random(seed_value + k)
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            token, route_ids = rng.choice(accounts)
+            name = rng.choices(names, weights)[0]
+            method, url = endpoints(base, rng.choice(route_ids))[name]
+
+            t0 = time.perf_counter()
+            try:
+                res = session.request(
+                    method, url, headers={"Authorization": f"Bearer {token}"}, timeout=120
+                )
+                code, body = res.status_code, res.text
+            except requests.RequestException as e:
+                code, body = "exception", str(e)
+            elapsed = time.perf_counter() - t0
+
+            with lock:
+                samples[name].append(elapsed)
+                statuses[name][code] = statuses[name].get(code, 0) + 1
+                if (code == "exception" or code >= 500) and code not in failures[name]:
+                    failures[name][code] = body[:300]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - t0
+
+    return samples, statuses, failures, wall
+
+
+def report(samples, statuses, failures, wall):
+    rows = {}
+    total = 0
+    for name, values in samples.items():
+        if not values:
+            continue
+        a = np.array(values) * 1000
+        errors = sum(
+            n for code, n in statuses[name].items() if code == "exception" or code >= 500
+        )
+        total += len(values)
+        rows[name] = {
+            "requests": len(values),
+            "rps": round(len(values) / wall, 2),
+            "p50_ms": round(float(np.percentile(a, 50)), 1),
+            "p90_ms": round(float(np.percentile(a, 90)), 1),
+            "p95_ms": round(float(np.percentile(a, 95)), 1),
+            "p99_ms": round(float(np.percentile(a, 99)), 1),
+            "max_ms": round(float(a.max()), 1),
+            "error_rate": round(errors / len(values), 4),
+            "status": {str(k): v for k, v in sorted(statuses[name].items(), key=str)},
+            "failures": {str(k): v for k, v in failures[name].items()},
+        }
+
+    print(f'{"endpoint":<10}{"req":>7}{"rps":>9}{"p50":>9}{"p90":>9}{"p95":>9}{"p99":>9}{"max":>9}{"err%":>8}')
+    for name, r in rows.items():
+        print(
+            f'{name:<10}{r["requests"]:>7}{r["rps"]:>9.1f}{r["p50_ms"]:>9.1f}{r["p90_ms"]:>9.1f}'
+            f'{r["p95_ms"]:>9.1f}{r["p99_ms"]:>9.1f}{r["max_ms"]:>9.1f}{100 * r["error_rate"]:>8.2f}'
+        )
+    for name, r in rows.items():
+        for code, body in r["failures"].items():
+            print(f"  {name} {code}: {body.strip()}")
+    print(f"total {total} requests in {wall:.1f}s = {total / wall:.1f} req/s")
+    return {"wall_s": round(wall, 2), "total_rps": round(total / wall, 2), "endpoints": rows}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(endpoints("", 0))
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="create_app() load test")
+    parser.add_argument("--server", choices=["gunicorn", "werkzeug"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--routes-per-user", type=int, default=5)
+    parser.add_argument("--stops", type=int, default=20, help="max stops per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the report as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database")
+    args = parser.parse_args(argv)
+
+    upstream = FakeUpstream(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ).start()
+
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'load.db')}",
+        "OSRM_CACHE_PATH": os.path.join(tmp, "osrm_cache.db"),
+        "OSRM_BASE_URL": upstream.url,
+        "GOOGLE_DIRECTIONS_URL": f"{upstream.url}/maps/api/directions/json",
+        "GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAPS_API_KEY", "load-test"),
+        "JWT_SECRET_KEY": "load-test-secret-key-of-sufficient-length",
+        "ROUTING_BACKEND": "osrm",
+    }
+
+    proc = None
+    try:
+        print(f"seeding {args.users} users x {args.routes_per_user} routes ...")
+        accounts = seed(env, args.users, args.routes_per_user, args.stops, np.random.default_rng(args.seed))
+
+        port = _free_port()
+        proc = start_server(args, env, port)
+        print(
+            f"{args.server} on :{port}, upstream {upstream.url} "
+            f"({args.latency_ms:.0f}ms, {100 * args.error_rate:.1f}% errors), "
+            f"{args.concurrency} clients for {args.duration:.0f}s"
+        )
+
+        samples, statuses, failures, wall = drive(
+            f"http://127.0.0.1:{port}", accounts, args.mix, args.concurrency, args.duration, args.seed
+        )
+        result = report(samples, statuses, failures, wall)
+        result["upstream_requests"] = upstream.requests
+        result["config"] = {
+            k: v for k, v in vars(args).items() if k not in ("out", "keep")
+        }
+
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(result, f, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        upstream.stop()
+        if not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
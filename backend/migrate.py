@@ -0,0 +1,22 @@
+"""
+Brings the database schema up to date (see app/migrations.py).
+
+    python migrate.py            apply pending migrations
+    python migrate.py --status   list pending migrations
+"""
+import sys
+
+from app import create_app, db
+from app.migrations import pending, upgrade
+
+app = create_app()
+
+with app.app_context():
+    if "--status" in sys.argv[1:]:
+        todo = pending(db.engine)
+        for version, name in todo:
+            print(f"  {version:03d} {name}")
+        print(f"{len(todo)} pending migration(s)")
+    else:
+        applied = upgrade(db.engine)
+        print(f"✔ Schema up to date ({len(applied)} migration(s) applied)")
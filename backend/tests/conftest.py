@@ -0,0 +1,61 @@
+import pytest
+
+from loadtest.fake_upstream import FakeUpstream
+
+
+@pytest.fixture(scope="session")
+def upstream():
+    """Local OSRM/Google stand-in; tests may change its error_rate."""
+    server = FakeUpstream(latency_ms=0, jitter_ms=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch, upstream):
+    """
+    make_app(**env) -> app on a fresh SQLite database and OSRM cache, with
+    the routing upstreams pointed at `upstream`; env overrides the config.
+    """
+
+    def make(**env):
+        upstream.error_rate = 0.0
+        values = {
+            "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}",
+            "OSRM_CACHE_PATH": str(tmp_path / "osrm_cache.db"),
+            "OSRM_BASE_URL": upstream.url,
+            "GOOGLE_DIRECTIONS_URL": f"{upstream.url}/maps/api/directions/json",
+            "JWT_SECRET_KEY": "test-secret-key-of-sufficient-length",
+            "BATCH_PROCESSES": "1",
+            **env,
+        }
+        monkeypatch.delenv("GOOGLE_MAPS_API_KEY", raising=False)
+        for key, value in values.items():
+            monkeypatch.setenv(key, str(value))
+
+        from app import create_app, db, routes_api
+        from app.migrations import upgrade
+
+        monkeypatch.setattr(routes_api, "OSRM_BASE", values["OSRM_BASE_URL"])
+        monkeypatch.setattr(routes_api, "GOOGLE_DIRECTIONS_URL", values["GOOGLE_DIRECTIONS_URL"])
+
+        app = create_app()
+        app.testing = True
+        with app.app_context():
+            upgrade(db.engine, log=lambda line: None)
+        return app
+
+    return make
+
+
+@pytest.fixture
+def register():
+    """register(client, email) -> auth headers for a new user."""
+
+    def register(client, email="user@example.com"):
+        res = client.post(
+            "/api/auth/register", json={"name": email, "email": email, "password": "secret"}
+        )
+        return {"Authorization": f"Bearer {res.get_json()['token']}"}
+
+    return register
@@ -0,0 +1,65 @@
+import time
+
+from app import db
+from app.jobs import job_runner
+from app.models import Job, Route
+
+CLIENTS = [
+    {"name": f"c{i}", "lat": 56.94 + i * 0.004, "lon": 24.09 + i * 0.007} for i in range(5)
+]
+
+
+def _wait_for(app, route_id, status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            statuses = {j.status for j in Job.query.filter_by(route_id=route_id)}
+            if statuses == {status}:
+                return
+        time.sleep(0.05)
+    raise AssertionError(f"jobs of route {route_id}: {statuses}, expected {status}")
+
+
+def _create(client, headers, name, offset=0.0):
+    clients = [{**c, "lat": c["lat"] + offset} for c in CLIENTS]
+    res = client.post("/api/routes/", json={"name": name, "clients": clients}, headers=headers)
+    return res.get_json()["id"]
+
+
+def test_failure_below_breaker_threshold_is_released(make_app, upstream, register):
+    # one failed request does not open the circuit (threshold 5), so there is
+    # no breaker recovery; the next OSRM answer must still release the job
+    app = make_app(HTTP_RETRIES=0, HTTP_BREAKER_THRESHOLD=5)
+    client = app.test_client()
+    headers = register(client)
+    estimated_id = _create(client, headers, "estimated")
+    other_id = _create(client, headers, "other", offset=0.01)
+
+    upstream.error_rate = 1.0
+    res = client.post(f"/api/routes/{estimated_id}/optimize", headers=headers)
+    assert res.status_code == 200
+    assert res.get_json()["route"]["parameters"]["optimized"]["estimated"] is True
+    _wait_for(app, estimated_id, "deferred")
+    assert job_runner.has_deferred
+
+    upstream.error_rate = 0.0
+    assert client.post(f"/api/routes/{other_id}/optimize", headers=headers).status_code == 200
+    _wait_for(app, estimated_id, "done")
+
+    with app.app_context():
+        optimized = db.session.get(Route, estimated_id).parameters["optimized"]
+    assert not optimized.get("estimated")
+    assert optimized["matrix_source"] == "osrm"
+
+
+def test_recover_resubmits_deferred_jobs(make_app, register):
+    app = make_app()
+    client = app.test_client()
+    headers = register(client)
+    route_id = _create(client, headers, "r")
+
+    with app.app_context():
+        job_runner.defer("baseline", db.session.get(Route, route_id).user_id, route_id)
+        db.session.commit()
+        job_runner.recover()
+    _wait_for(app, route_id, "done")
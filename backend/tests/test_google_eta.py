@@ -0,0 +1,36 @@
+import pytest
+
+from app import db
+from app.models import Route
+
+CLIENTS = [
+    {"name": f"c{i}", "lat": 56.94 + i * 0.004, "lon": 24.09 + i * 0.007} for i in range(4)
+]
+
+
+def test_bad_setting_fails_at_startup(make_app):
+    with pytest.raises(ValueError):
+        make_app(GOOGLE_MAX_WAYPOINTS="many")
+
+
+def test_batch_traffic_reads_settings_in_workers(make_app, register):
+    # the traffic requests of a batch run on a thread pool; the settings come
+    # from current_app, so the workers need the request's app context
+    app = make_app(GOOGLE_MAPS_API_KEY="test", GOOGLE_MAX_WAYPOINTS=1)
+    client = app.test_client()
+    headers = register(client)
+    ids = [
+        client.post(
+            "/api/routes/", json={"name": f"r{i}", "clients": CLIENTS}, headers=headers
+        ).get_json()["id"]
+        for i in range(2)
+    ]
+
+    for endpoint, key in (("baseline", "baseline"), ("optimize", "optimized")):
+        res = client.post(f"/api/routes/batch/{endpoint}", json={"route_ids": ids}, headers=headers)
+        assert res.status_code == 200
+        with app.app_context():
+            for route_id in ids:
+                traffic = db.session.get(Route, route_id).parameters[key]["traffic"]
+                assert "error" not in traffic
+                assert traffic["traffic_duration"] > 0
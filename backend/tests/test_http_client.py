@@ -0,0 +1,14 @@
+from app.http_client import http_client
+
+
+def test_host_timeouts_follow_the_configured_urls(make_app, upstream):
+    make_app(
+        OSRM_BASE_URL="http://osrm.internal:5000",
+        OSRM_TIMEOUT=4,
+        GOOGLE_TIMEOUT=7,
+        HTTP_CONNECT_TIMEOUT=2,
+        HTTP_DEFAULT_TIMEOUT=12,
+    )
+    assert http_client.timeout_for("http://osrm.internal:5000/table/v1/driving/1,2") == (2.0, 4.0)
+    assert http_client.timeout_for(f"{upstream.url}/maps/api/directions/json") == (2.0, 7.0)
+    assert http_client.timeout_for("https://router.project-osrm.org/route/v1") == (2.0, 12.0)
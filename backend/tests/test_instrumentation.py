@@ -0,0 +1,40 @@
+import pytest
+
+CLIENTS = [
+    {"name": f"c{i}", "lat": 56.94 + i * 0.004, "lon": 24.09 + i * 0.007} for i in range(6)
+]
+
+
+def _spans(response):
+    header = response.headers["Server-Timing"]
+    return {part.split(";")[0].strip() for part in header.split(",")}
+
+
+@pytest.mark.parametrize(
+    "parameters, phases",
+    [
+        ({}, {"solve_construct", "solve_local_search"}),
+        ({"couriers": 2}, {"vrp_construct", "vrp_repair", "vrp_relocate", "vrp_polish"}),
+    ],
+)
+def test_pool_work_counts_toward_the_request(make_app, register, parameters, phases):
+    # the warehouses are evaluated and the OSRM tiles fetched on thread
+    # pools; their spans must still show up in the request's Server-Timing
+    app = make_app(
+        METRICS_ENABLED=1, SERVER_TIMING=1, OPTIMIZE_MAX_WORKERS=3, OSRM_MAX_TABLE_COORDS=4
+    )
+    client = app.test_client()
+    headers = register(client)
+    route_id = client.post(
+        "/api/routes/",
+        json={"name": "r", "clients": CLIENTS, "parameters": parameters},
+        headers=headers,
+    ).get_json()["id"]
+
+    res = client.post(f"/api/routes/{route_id}/optimize", headers=headers)
+    assert res.status_code == 200
+    assert phases | {"solve", "osrm_table"} <= _spans(res)
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    for phase in phases:
+        assert f'span="{phase}"' in metrics
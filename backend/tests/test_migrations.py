@@ -0,0 +1,98 @@
+from sqlalchemy import create_engine, event, inspect, text
+
+from app import db
+from app.migrations import MIGRATIONS, schema_migrations, upgrade
+from app.models import Job, Route
+
+
+def _engine(tmp_path, foreign_keys=False):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    if foreign_keys:
+        event.listen(engine, "connect", lambda c, _: c.execute("PRAGMA foreign_keys=ON"))
+    return engine
+
+
+def _apply(engine, versions):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        for version, name, step in MIGRATIONS:
+            if version in versions:
+                step(conn)
+                conn.execute(
+                    schema_migrations.insert().values(
+                        version=version, name=name, applied_at=text("CURRENT_TIMESTAMP")
+                    )
+                )
+
+
+def _route_fk(engine):
+    fks = inspect(engine).get_foreign_keys("jobs")
+    return next(fk for fk in fks if fk["constrained_columns"] == ["route_id"])
+
+
+def test_initial_schema_is_the_baseline(tmp_path):
+    engine = _engine(tmp_path)
+    _apply(engine, {1})
+    insp = inspect(engine)
+    assert "route_geometries" not in insp.get_table_names()
+    assert "baseline_time" not in {c["name"] for c in insp.get_columns("routes")}
+
+    upgrade(engine, log=lambda _: None)
+    insp = inspect(engine)
+    for name, model_table in db.metadata.tables.items():
+        columns = {c["name"] for c in insp.get_columns(name)}
+        assert columns == {c.name for c in model_table.columns}, name
+        indexes = {ix["name"] for ix in insp.get_indexes(name)}
+        assert {ix.name for ix in model_table.indexes} <= indexes, name
+    assert _route_fk(engine)["options"].get("ondelete") == "CASCADE"
+
+
+def test_job_cascade_rebuild_keeps_rows(tmp_path):
+    engine = _engine(tmp_path, foreign_keys=True)
+    _apply(engine, {1, 2, 3, 4, 5})
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, email, password_hash, name) VALUES (1, 'a@b.c', 'x', 'a')"
+        ))
+        for route_id in (1, 2):
+            conn.execute(text(
+                f"INSERT INTO routes (id, name, is_deleted, user_id) VALUES ({route_id}, 'r', 1, 1)"
+            ))
+            conn.execute(text(
+                f"INSERT INTO jobs (id, kind, status, user_id, route_id, result) "
+                f"VALUES ('job-{route_id}', 'optimize', 'done', 1, {route_id}, '{{\"ok\": 1}}')"
+            ))
+    assert "ondelete" not in _route_fk(engine)["options"]
+
+    assert upgrade(engine, log=lambda _: None) == [6]
+    assert _route_fk(engine)["options"].get("ondelete") == "CASCADE"
+    assert {ix["name"] for ix in inspect(engine).get_indexes("jobs")} >= {
+        "ix_jobs_status",
+        "ix_jobs_route_id",
+    }
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM routes WHERE id = 1"))
+        rows = conn.execute(text("SELECT id, route_id, result FROM jobs")).all()
+    assert [(job_id, route_id) for job_id, route_id, _ in rows] == [("job-2", 2)]
+    assert rows[0][2] == '{"ok": 1}'
+
+
+def test_permanent_delete_removes_jobs(make_app, register):
+    app = make_app()
+    client = app.test_client()
+    headers = register(client)
+    clients = [{"name": "c", "lat": 56.95, "lon": 24.1}]
+    route_id = client.post(
+        "/api/routes/", json={"name": "r", "clients": clients}, headers=headers
+    ).get_json()["id"]
+    with app.app_context():
+        route = db.session.get(Route, route_id)
+        db.session.add(
+            Job(id="job-1", kind="optimize", status="done", user_id=route.user_id, route_id=route_id)
+        )
+        db.session.commit()
+
+    assert client.delete(f"/api/routes/{route_id}", headers=headers).status_code == 200
+    assert client.delete(f"/api/routes/{route_id}/permanent", headers=headers).status_code == 200
+    with app.app_context():
+        assert Job.query.filter_by(route_id=route_id).count() == 0
@@ -0,0 +1,137 @@
+import heapq
+import math
+import os
+import random
+import shutil
+
+import pytest
+
+from app.offline_router import ContractedGraph, OfflineRouter, load_edges_csv
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "app", "data", "riga_sample_edges.csv")
+
+# a two-node island away from the sample grid plus a one-way spur into it
+ISLAND = [
+    "57.1,24.3,57.1,24.31,50,0",
+    "56.925,24.03,57.1,24.3,50,1",
+]
+
+
+def _dijkstra(g, source):
+    adj = {}
+    for (a, b), (dur, dist) in g.edges.items():
+        adj.setdefault(a, []).append((b, dur, dist))
+    best = {source: (0.0, 0.0)}
+    heap = [(0.0, source)]
+    done = set()
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for w, dur, dist in adj.get(u, ()):
+            if w not in best or d + dur < best[w][0]:
+                best[w] = (d + dur, best[u][1] + dist)
+                heapq.heappush(heap, (d + dur, w))
+    return best
+
+
+def _write_graph(tmp_path, extra=()):
+    path = tmp_path / "edges.csv"
+    shutil.copy(SAMPLE, path)
+    with open(path, "a") as f:
+        for row in extra:
+            f.write(row + "\n")
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def sample():
+    builder = load_edges_csv(SAMPLE)
+    return builder, ContractedGraph.build(builder)
+
+
+def _check_path(builder, result, s, t, expected):
+    duration, _, nodes = result
+    assert nodes[0] == s and nodes[-1] == t
+    total = 0.0
+    for a, b in zip(nodes, nodes[1:]):
+        assert (a, b) in builder.edges
+        total += builder.edges[(a, b)][0]
+    assert total == pytest.approx(expected, rel=1e-4)
+    assert duration == pytest.approx(expected, rel=1e-4)
+
+
+def test_table_and_paths_match_dijkstra(sample):
+    builder, graph = sample
+    rng = random.Random(7)
+    nodes = rng.sample(range(len(builder.lat)), 12)
+    durations, distances = graph.table(nodes, nodes)
+
+    for i, s in enumerate(nodes):
+        ref = _dijkstra(builder, s)
+        for j, t in enumerate(nodes):
+            assert durations[i][j] == pytest.approx(ref[t][0], rel=1e-4, abs=1e-3)
+            assert distances[i][j] == pytest.approx(ref[t][1], rel=1e-3, abs=1e-2)
+            result = graph.path(s, t)
+            assert result is not None
+            _check_path(builder, result, s, t, ref[t][0])
+
+
+def test_cache_round_trip(sample, tmp_path):
+    builder, graph = sample
+    path = tmp_path / "graph.ch.npz"
+    graph.save(str(path))
+    loaded = ContractedGraph.load(str(path))
+
+    nodes = list(range(0, len(builder.lat), max(len(builder.lat) // 10, 1)))
+    assert loaded.table(nodes, nodes) == graph.table(nodes, nodes)
+    for s, t in zip(nodes, reversed(nodes)):
+        assert loaded.path(s, t) == graph.path(s, t)
+
+
+def test_router_uses_cached_contraction(tmp_path, monkeypatch):
+    path = _write_graph(tmp_path)
+    router = OfflineRouter()
+    router.path = path
+    first = router._graph()
+    cache = tmp_path / "edges.ch.npz"
+    assert cache.exists()
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("graph contracted again despite a fresh cache")
+
+    monkeypatch.setattr(ContractedGraph, "build", classmethod(no_build))
+    router.graph = None
+    second = router._graph()
+    nodes = list(range(0, first.n, 40))
+    assert second.table(nodes, nodes) == first.table(nodes, nodes)
+
+
+def test_unreachable_pairs(tmp_path):
+    builder = load_edges_csv(_write_graph(tmp_path, ISLAND))
+    graph = ContractedGraph.build(builder)
+    corner = builder.node_ids[(56.925, 24.03)]
+    island = builder.node_ids[(57.1, 24.3)]
+    far = builder.node_ids[(57.1, 24.31)]
+    inland = builder.node_ids[(56.925, 24.036739)]
+
+    durations, distances = graph.table([island, far, inland], [corner, inland, far])
+    ref = _dijkstra(builder, inland)
+    assert durations[0][0] is None and distances[0][0] is None
+    assert durations[1][1] is None and distances[1][1] is None
+    assert durations[2][2] == pytest.approx(ref[far][0], rel=1e-4)
+    assert graph.path(island, corner) is None
+    assert graph.path(far, inland) is None
+    assert graph.path(inland, far) is not None
+
+    router = OfflineRouter()
+    router.path = str(tmp_path / "edges.csv")
+    points = [
+        {"lat": 57.1, "lng": 24.31},
+        {"lat": float(builder.lat[inland]), "lng": float(builder.lon[inland])},
+    ]
+    assert router.table(points)["durations"][0][1] is None
+    assert math.isfinite(router.table(points)["durations"][1][0])
+    with pytest.raises(ValueError):
+        router.route(points)
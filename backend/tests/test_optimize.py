@@ -0,0 +1,33 @@
+import pytest
+
+CLIENTS = [
+    {"name": f"c{i}", "lat": 56.94 + i * 0.004, "lon": 24.09 + i * 0.007} for i in range(4)
+]
+
+
+@pytest.mark.parametrize("couriers", ["nan", "inf", "-inf", 1e308, -3, "2"])
+def test_malformed_couriers_do_not_fail_optimize(make_app, register, couriers):
+    app = make_app()
+    client = app.test_client()
+    headers = register(client)
+    res = client.post(
+        "/api/routes/",
+        json={"name": "r", "clients": CLIENTS, "parameters": {"couriers": couriers}},
+        headers=headers,
+    )
+    route_id = res.get_json()["id"]
+
+    res = client.post(f"/api/routes/{route_id}/optimize", headers=headers)
+    assert res.status_code == 200
+    route = res.get_json()["route"]
+    optimized = route["parameters"]["optimized"]
+    if "vehicles" in optimized:
+        order = [cid for vehicle in optimized["vehicles"] for cid in vehicle["order"]]
+    else:
+        order = optimized["order"]
+    assert sorted(order) == sorted(c["id"] for c in route["clients"])
+
+    res = client.post(
+        f"/api/routes/{route_id}/clients", json={"lat": 56.97, "lon": 24.12}, headers=headers
+    )
+    assert res.status_code == 201
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import osrm_cache as module
+from app.osrm_cache import OsrmCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(module.time, "time", lambda: now[0])
+    return now
+
+
+def _cache(tmp_path, **config):
+    config = {
+        "OSRM_CACHE_PATH": str(tmp_path / "cache.db"),
+        "OSRM_CACHE_TTL": 1000,
+        "OSRM_CACHE_MAX_ENTRIES": 100,
+        **config,
+    }
+    cache = OsrmCache(SimpleNamespace(config=config))
+    statements = []
+    cache._connect().set_trace_callback(statements.append)
+    return cache, statements
+
+
+def _writes(statements):
+    return [s for s in statements if s.lstrip().upper().startswith(("UPDATE", "DELETE"))]
+
+
+def test_hits_touch_last_used_lazily(tmp_path, clock):
+    cache, statements = _cache(tmp_path)
+    cache.set("k", {"v": 1})
+    statements.clear()
+
+    clock[0] += 50
+    assert cache.get("k") == {"v": 1}
+    assert _writes(statements) == []
+
+    clock[0] += 100  # last_used is now older than TOUCH_FRACTION * TTL
+    assert cache.get("k") == {"v": 1}
+    assert len(_writes(statements)) == 1
+    last_used = cache._connect().execute("SELECT last_used FROM osrm_cache").fetchone()[0]
+    assert last_used == clock[0]
+
+    clock[0] += 1000
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_eviction_is_amortized_and_keeps_recent_entries(tmp_path, clock):
+    cache, statements = _cache(tmp_path, OSRM_CACHE_MAX_ENTRIES=20)
+    for i in range(100):
+        clock[0] += 1
+        cache.set(f"k{i}", i)
+        assert cache.stats()["size"] <= 20
+
+    evictions = [s for s in _writes(statements) if s.upper().startswith("DELETE")]
+    # once per (max_entries - EVICT_TO * max_entries) writes, not per write
+    assert 0 < len(evictions) <= 100 // (20 - int(20 * module.EVICT_TO)) + 1
+    assert cache.get("k99") == 99
+    assert cache.get("k0") is None
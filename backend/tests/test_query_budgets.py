@@ -0,0 +1,39 @@
+"""
+Every endpoint within its query_budget, with enforcement on (raise mode):
+a view over budget or repeating a statement (N+1) raises
+QueryBudgetExceeded through the test client. Both a small and a large
+account are measured; the count must not grow with the data.
+"""
+import numpy as np
+
+from loadtest.query_budgets import SIZES, measure, seed_account, view_for
+
+
+def test_query_budgets(make_app):
+    app = make_app(
+        QUERY_BUDGET_MODE="raise",
+        METRICS_ENABLED=1,
+        SERVER_TIMING=1,
+        GOOGLE_MAPS_API_KEY="query-budgets",
+    )
+    client = app.test_client()
+    rng = np.random.default_rng(1)
+
+    counts = {}
+    for size, (routes, stops) in SIZES.items():
+        email = f"{size}@example.com"
+        with app.app_context():
+            headers, ids = seed_account(client, email, routes, stops, rng)
+        counts[size] = measure(client, headers, ids, email, stops)
+
+    problems = []
+    for name, small in counts["small"].items():
+        view = view_for(app, name)
+        large = counts["large"][name]
+        if not hasattr(view, "query_budget"):
+            problems.append(f"{name}: no query_budget")
+        elif view.query_budget is not None and large > view.query_budget:
+            problems.append(f"{name}: {large} queries, budget {view.query_budget}")
+        if large > small:
+            problems.append(f"{name}: {small} -> {large} queries as data grows")
+    assert not problems, problems
@@ -0,0 +1,11 @@
+from benchmarks.solver_bench import compare, run, suite
+
+
+def test_sizes_without_baseline_fail_the_check():
+    results, _ = run(suite([10, 50], [1]), ["solver"], 1.0, 100, memory=False)
+    baseline = {"results": [r for r in results if r["n"] == 10]}
+
+    problems = compare(results, baseline, cost_tol=0.01, time_tol=3.0)
+    assert problems and all("no baseline" in p for p in problems)
+    assert {p.split()[0] for p in problems} == {r["instance"] for r in results if r["n"] == 50}
+    assert compare(results, {"results": results}, cost_tol=0.01, time_tol=3.0) == []
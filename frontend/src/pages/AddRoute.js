@@ -230,28 +230,29 @@ function AddRoute() {
         return;
       }
 
-      for (let i = 0; i < cleanedStops.length; i++) {
-        const stop = cleanedStops[i];
-
-        const clientPayload = {
-          name: stop.label?.trim() || `Stop ${i + 1}`,
-          lat: Number(stop.lat),
-          lon: Number(stop.lng),
-        };
-
-        const clientResp = await fetch(apiUrl(`/api/routes/${routeId}/clients`), {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-            Authorization: `Bearer ${token}`,
-          },
-          body: JSON.stringify(clientPayload),
-        });
+      const ndjson = cleanedStops
+        .map((stop, i) =>
+          JSON.stringify({
+            name: stop.label?.trim() || `Stop ${i + 1}`,
+            lat: Number(stop.lat),
+            lon: Number(stop.lng),
+          })
+        )
+        .join("\n");
 
-        if (!clientResp.ok) {
-          console.error("Failed to add client", i + 1, clientResp.status);
-          alert("Route saved but one of the stops failed to be added.");
-        }
+      const importResp = await fetch(apiUrl(`/api/routes/${routeId}/clients/import`), {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/x-ndjson",
+          Authorization: `Bearer ${token}`,
+        },
+        body: ndjson,
+      });
+
+      const importData = await importResp.json().catch(() => ({}));
+      if (!importResp.ok || importData.failed > 0) {
+        console.error("Failed to add stops", importResp.status, importData);
+        alert("Route saved but some of the stops failed to be added.");
       }
 
       alert("✅ Route saved!");
@@ -1,8 +1,18 @@
 import React, { useEffect, useState } from "react";
 import { useParams, useNavigate } from "react-router-dom";
-import { MapContainer, TileLayer, Marker, Popup, Polyline } from "react-leaflet";
+import { MapContainer, TileLayer, Marker, Popup, Polyline, useMapEvents } from "react-leaflet";
 import "leaflet/dist/leaflet.css";
 import L from "leaflet";
+import { toRoadRoute } from "../utils/geometry";
+
+const MAP_ZOOM = 8;
+
+function ZoomWatcher({ onZoom }) {
+  const map = useMapEvents({
+    zoomend: () => onZoom(map.getZoom()),
+  });
+  return null;
+}
 
 function RouteMap() {
   const { id } = useParams(); 
@@ -10,11 +20,20 @@ function RouteMap() {
   const [route, setRoute] = useState(null);
   const [error, setError] = useState("");
   const [osrmData, setOsrmData] = useState(null);
+  const [mapZoom, setMapZoom] = useState(MAP_ZOOM);
 
   useEffect(() => {
     fetchRoute();
   }, []);
 
+  // geometry simplified for a coarser zoom than the map's is fetched again
+  // in more detail; zoom null means full detail was served
+  useEffect(() => {
+    if (!route || route.clients.length < 2) return;
+    if (osrmData && !(osrmData.zoom != null && osrmData.zoom < mapZoom)) return;
+    fetchGeometry(route.id, localStorage.getItem("token"));
+  }, [route, mapZoom]);
+
   const fetchRoute = async () => {
     const token = localStorage.getItem("token");
     try {
@@ -26,33 +45,32 @@ function RouteMap() {
       const data = await response.json();
       const selected = data.items.find((r) => r.id === parseInt(id));
       setRoute(selected);
-
-      if (selected && selected.clients.length > 1) {
-        fetchOsrmRoute(selected.clients);
-      }
     } catch (err) {
       console.error(err);
       setError("❌ Neizdevās ielādēt maršrutu");
     }
   };
 
-  const fetchOsrmRoute = async (clients) => {
-    const coords = clients.map((c) => `${c.lon},${c.lat}`).join(";");
-    const url = `https://router.project-osrm.org/route/v1/driving/${coords}?overview=full&geometries=geojson`;
-
+  const fetchGeometry = async (routeId, token) => {
     try {
-      const response = await fetch(url);
+      const response = await fetch(
+        `http://127.0.0.1:5000/api/routes/${routeId}/geometry?zoom=${mapZoom}`,
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      if (!response.ok) throw new Error(`geometry failed (${response.status})`);
+
       const data = await response.json();
-      if (data.routes && data.routes.length > 0) {
-        const routeInfo = data.routes[0];
+      const road = toRoadRoute(data.baseline);
+      if (road) {
         setOsrmData({
-          coordinates: routeInfo.geometry.coordinates.map((p) => [p[1], p[0]]),
-          distance: (routeInfo.distance / 1000).toFixed(2), 
-          duration: (routeInfo.duration / 60).toFixed(1), 
+          coordinates: road.latlngs,
+          distance: (road.distance / 1000).toFixed(2),
+          duration: (road.duration / 60).toFixed(1),
+          zoom: data.zoom,
         });
       }
     } catch (err) {
-      console.error("OSRM error:", err);
+      console.error("Geometry error:", err);
     }
   };
 
@@ -88,9 +106,10 @@ function RouteMap() {
         <div style={styles.mapWrapper}>
           <MapContainer
             center={center}
-            zoom={8}
+            zoom={MAP_ZOOM}
             style={{ height: "500px", width: "100%", borderRadius: "8px", zIndex: 0 }}
           >
+            <ZoomWatcher onZoom={setMapZoom} />
             <TileLayer
               url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
               attribution='&copy; <a href="http://osm.org/copyright">OpenStreetMap</a>'
@@ -1,9 +1,9 @@
 import React, { useEffect, useMemo, useRef, useState } from "react";
-import { buildRoadRoute } from "../utils/osrm";
+import { flattenLatLngs, toRoadRoute } from "../utils/geometry";
 import { useNavigate } from "react-router-dom";
 import "./Dashboard.css";
 import "./Routes.css";
-import { MapContainer, TileLayer, Polyline, Marker, Tooltip, useMap } from "react-leaflet";
+import { MapContainer, TileLayer, Polyline, Marker, Tooltip, useMap, useMapEvents } from "react-leaflet";
 import L from "leaflet";
 import markerIcon2x from "leaflet/dist/images/marker-icon-2x.png";
 import markerIcon from "leaflet/dist/images/marker-icon.png";
@@ -34,6 +34,8 @@ function apiUrl(path) {
   return path;
 }
 
+const MAP_ZOOM = 12;
+
 const WAREHOUSES = [
   { id: 1, name: "Warehouse 1", lat: 56.969109, lng: 24.112366 },
   { id: 2, name: "Warehouse 2", lat: 56.939166, lng: 24.055983 },
@@ -134,7 +136,7 @@ function FitToRoute({ baselineLatLngs, optimizedLatLngs }) {
   const map = useMap();
 
   useEffect(() => {
-    const pts = [...(baselineLatLngs || []), ...(optimizedLatLngs || [])];
+    const pts = [...flattenLatLngs(baselineLatLngs), ...flattenLatLngs(optimizedLatLngs)];
     if (!pts || pts.length < 2) return;
     map.fitBounds(L.latLngBounds(pts), { padding: [30, 30] });
   }, [baselineLatLngs, optimizedLatLngs, map]);
@@ -142,6 +144,13 @@ function FitToRoute({ baselineLatLngs, optimizedLatLngs }) {
   return null;
 }
 
+function ZoomWatcher({ onZoom }) {
+  const map = useMapEvents({
+    zoomend: () => onZoom(map.getZoom()),
+  });
+  return null;
+}
+
 function Routes() {
   const navigate = useNavigate();
   const userName = localStorage.getItem("userName") || "user";
@@ -154,6 +163,7 @@ function Routes() {
 
   const [routeGeometries, setRouteGeometries] = useState({});
   const [routingLoading, setRoutingLoading] = useState({});
+  const [mapZoom, setMapZoom] = useState(MAP_ZOOM);
 
   const baselineInFlightRef = useRef(new Set());
   const optimizeInFlightRef = useRef(new Set());
@@ -325,7 +335,10 @@ function Routes() {
     const buildForRoute = async (route) => {
       const routeId = route.id;
 
-      if (routeGeometries[routeId]) return;
+      // geometry simplified for a coarser zoom than the map's is fetched
+      // again in more detail; zoom null means full detail was served
+      const current = routeGeometries[routeId];
+      if (current && !(current.zoom != null && current.zoom < mapZoom)) return;
       if (inFlightRef.current.has(routeId)) return;
       if (!route.clients || route.clients.length < 1) return;
 
@@ -340,38 +353,37 @@ function Routes() {
         const optimizedStops = buildOptimizedStops(route);
         const optimizedFallback = optimizedStops ? optimizedStops.map((s) => [s.lat, s.lng]) : null;
 
-        setRouteGeometries((prev) => ({
-          ...prev,
-          [routeId]: {
-            baseline: { latlngs: baselineFallback, distance: 0, duration: 0 },
-            optimized: optimizedFallback
-              ? { latlngs: optimizedFallback, distance: 0, duration: 0 }
-              : null,
-          },
-        }));
+        setRouteGeometries((prev) =>
+          prev[routeId]
+            ? prev
+            : {
+                ...prev,
+                [routeId]: {
+                  baseline: { latlngs: baselineFallback, distance: 0, duration: 0 },
+                  optimized: optimizedFallback
+                    ? { latlngs: optimizedFallback, distance: 0, duration: 0 }
+                    : null,
+                },
+              }
+        );
         setRoutingLoading((prev) => ({ ...prev, [routeId]: false }));
         inFlightRef.current.delete(routeId);
       }, 20000);
 
       try {
-        const baselineStops = buildBaselineStops(route);
-        const baselineGeo = await buildRoadRoute(
-          baselineStops.map((s) => ({ lat: s.lat, lng: s.lng })),
-          { timeoutMs: 12000 }
-        );
+        // road paths are fetched and stored by the backend, simplified to
+        // within a pixel at the map's current zoom
+        const res = await authedFetch(`/api/routes/${routeId}/geometry?zoom=${mapZoom}`);
+        if (!res.ok) throw new Error(`geometry failed (${res.status})`);
+        const data = await res.json();
 
-        const optimizedStops = buildOptimizedStops(route);
-        let optimizedGeo = null;
-        if (optimizedStops && optimizedStops.length >= 2) {
-          optimizedGeo = await buildRoadRoute(
-            optimizedStops.map((s) => ({ lat: s.lat, lng: s.lng })),
-            { timeoutMs: 12000 }
-          );
-        }
+        const baselineGeo = toRoadRoute(data.baseline);
+        if (!baselineGeo) throw new Error("no baseline geometry");
+        const optimizedGeo = toRoadRoute(data.optimized);
 
         setRouteGeometries((prev) => ({
           ...prev,
-          [routeId]: { baseline: baselineGeo, optimized: optimizedGeo },
+          [routeId]: { baseline: baselineGeo, optimized: optimizedGeo, zoom: data.zoom },
         }));
       } catch {
         const baselineStops = buildBaselineStops(route);
@@ -380,15 +392,19 @@ function Routes() {
         const optimizedStops = buildOptimizedStops(route);
         const optimizedFallback = optimizedStops ? optimizedStops.map((s) => [s.lat, s.lng]) : null;
 
-        setRouteGeometries((prev) => ({
-          ...prev,
-          [routeId]: {
-            baseline: { latlngs: baselineFallback, distance: 0, duration: 0 },
-            optimized: optimizedFallback
-              ? { latlngs: optimizedFallback, distance: 0, duration: 0 }
-              : null,
-          },
-        }));
+        setRouteGeometries((prev) =>
+          prev[routeId]
+            ? prev
+            : {
+                ...prev,
+                [routeId]: {
+                  baseline: { latlngs: baselineFallback, distance: 0, duration: 0 },
+                  optimized: optimizedFallback
+                    ? { latlngs: optimizedFallback, distance: 0, duration: 0 }
+                    : null,
+                },
+              }
+        );
       } finally {
         if (watchdogRef.current[routeId]) {
           clearTimeout(watchdogRef.current[routeId]);
@@ -400,7 +416,7 @@ function Routes() {
     };
 
     visibleRoutes.forEach((r) => buildForRoute(r));
-  }, [visibleRoutes, loading, error, routeGeometries]);
+  }, [visibleRoutes, loading, error, routeGeometries, mapZoom]);
 
   const fixStuckRoutes = () => {
     const idsToRetry = visibleRoutes
@@ -674,7 +690,8 @@ function Routes() {
                   </button>
                 </div>
 
-                <MapContainer center={defaultCenter} zoom={12} scrollWheelZoom={true} className="routes-map">
+                <MapContainer center={defaultCenter} zoom={MAP_ZOOM} scrollWheelZoom={true} className="routes-map">
+                  <ZoomWatcher onZoom={setMapZoom} />
                   <TileLayer
                     attribution="&copy; OpenStreetMap contributors"
                     url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
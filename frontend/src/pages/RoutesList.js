@@ -7,6 +7,8 @@ function RoutesList() {
   const [editingId, setEditingId] = useState(null);
   const [editData, setEditData] = useState({ name: "", couriers: 1, distance: "" });
   const [newClient, setNewClient] = useState({ name: "", lat: "", lon: "" });
+  // stored distance matrices by route id, loaded on demand (null = none)
+  const [matrices, setMatrices] = useState({});
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -31,6 +33,25 @@ function RoutesList() {
     }
   };
 
+  const fetchMatrix = async (routeId) => {
+    const token = localStorage.getItem("token");
+    try {
+      const response = await fetch(
+        `http://127.0.0.1:5000/api/routes/${routeId}/matrix?kind=distance`,
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      if (response.status === 404) {
+        setMatrices((prev) => ({ ...prev, [routeId]: null }));
+        return;
+      }
+      if (!response.ok) throw new Error("Failed to fetch");
+      const data = await response.json();
+      setMatrices((prev) => ({ ...prev, [routeId]: data.matrix }));
+    } catch {
+      setError("❌ Neizdevās ielādēt matricu");
+    }
+  };
+
   const handleDelete = async (id) => {
     const token = localStorage.getItem("token");
     if (!window.confirm("Vai tiešām vēlaties dzēst šo maršrutu?")) return;
@@ -227,14 +248,15 @@ function RoutesList() {
 
 <textarea
   style={styles.textarea}
-  placeholder="Nav saglabātas matricas"
-  value={
-    r.parameters.distance_matrix
-      ? JSON.stringify(r.parameters.distance_matrix)
-      : ""
+  placeholder={
+    r.id in matrices ? "Nav saglabātas matricas" : "Matrica nav ielādēta"
   }
+  value={matrices[r.id] ? JSON.stringify(matrices[r.id]) : ""}
   readOnly
 ></textarea>
+<button style={styles.matrixBtn} onClick={() => fetchMatrix(r.id)}>
+  📥 Ielādēt saglabāto matricu
+</button>
 
 
 <div style={{ marginTop: "8px" }}>
@@ -263,7 +285,7 @@ function RoutesList() {
         );
         if (response.ok) {
           alert("✅ Matrica augšupielādēta!");
-          await fetchRoutes();
+          await fetchMatrix(r.id);
         } else {
           alert("❌ Kļūda augšupielādējot matricu!");
         }
@@ -0,0 +1,53 @@
+// src/utils/geometry.js
+
+/**
+ * Decode a Google encoded polyline (precision 5, as served by
+ * GET /api/routes/<id>/geometry) into [[lat, lng], ...].
+ */
+export function decodePolyline(str, precision = 5) {
+  const factor = 10 ** precision;
+  const coords = [];
+  let index = 0;
+  let lat = 0;
+  let lng = 0;
+
+  const next = () => {
+    let result = 0;
+    let shift = 0;
+    let b;
+    do {
+      b = str.charCodeAt(index++) - 63;
+      result |= (b & 0x1f) << shift;
+      shift += 5;
+    } while (b >= 0x20);
+    return result & 1 ? ~(result >> 1) : result >> 1;
+  };
+
+  while (index < str.length) {
+    lat += next();
+    lng += next();
+    coords.push([lat / factor, lng / factor]);
+  }
+  return coords;
+}
+
+/**
+ * One stored geometry ({paths, distance, duration}) as the map draws it:
+ * latlngs is a single path, or one path per vehicle.
+ */
+export function toRoadRoute(geo) {
+  if (!geo?.paths?.length) return null;
+
+  const paths = geo.paths.map((p) => decodePolyline(p));
+  return {
+    latlngs: paths.length === 1 ? paths[0] : paths,
+    distance: geo.distance ?? 0,
+    duration: geo.duration ?? 0,
+  };
+}
+
+/** [[lat, lng], ...] of a single path or a list of paths, e.g. for bounds. */
+export function flattenLatLngs(latlngs) {
+  if (!latlngs?.length) return [];
+  return Array.isArray(latlngs[0]?.[0]) ? latlngs.flat() : latlngs;
+}